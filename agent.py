@@ -4,45 +4,272 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.chrome.service import Service
 import time
 import json
+import threading
 import requests
-from bs4 import BeautifulSoup
 import os # For accessing environment variables for API keys if preferred
+from page_snapshot import take_snapshot, take_incremental_snapshot
+from page_text import extract_text, extract_text_in_browser
+from page_settle import PageSettleWaiter
+from browser_profile import ResourceBlocker, chrome_options, get_profile
+from llm_client import DEFAULT_API_BASES, get_llm_client
+from llm_stream import JsonStreamParser, stream_text
+from decision_cache import decode_action, element_signature, encode_action, url_pattern
+from prompt_budget import compact_page_context, estimate_tokens, to_json
+from tracing import STATUS_ERROR, get_tracer
+
+def create_driver(driver_path=None, headless=None, profile='default'):
+    """
+    Launches a Chrome WebDriver configured for the agent.
+    :param driver_path: Path to your WebDriver executable. If None, assumes it is in your system's PATH.
+    :param headless: Run Chrome without a window, useful for server environments and browser pools.
+                     None uses the profile's setting.
+    :param profile: Browser profile name or dictionary (see browser_profile.py) for the launch options.
+                    Its resource blocking is set up per task by the agent.
+    """
+    options = chrome_options(profile, headless)
+
+    if driver_path:
+        driver = webdriver.Chrome(service=Service(executable_path=driver_path), options=options)
+    else:
+        driver = webdriver.Chrome(options=options)
+    driver.set_page_load_timeout(30)
+    return driver
+
+# Static part of the prompt. Kept short because it is resent on every step.
+PROMPT_INSTRUCTIONS = """You are an AI web navigation agent completing a task on a website.
+Your task is: "{task_description}"
+
+The page context lists interactive elements. Use an element's 'id' (e.g. 'llm_elem_0') for click_element and type_text; 'original_html_id' is only a hint.
+Boolean flags are present only when true: is_visible_in_viewport, is_cookie_consent_button, is_skip_ad_button, is_video_link (links to a video).
+Only the most relevant elements are listed.
+
+RULES (priority order):
+1. If an element has is_cookie_consent_button and is_visible_in_viewport, click it first (text like 'Accept', 'Agree', 'OK', 'Continue').
+2. Otherwise, if an element has is_skip_ad_button and is_visible_in_viewport, click it next (text like 'Skip Ads', 'Skip').
+3. Prefer elements with is_visible_in_viewport.
+4. When the task involves playing a video, prefer elements with is_video_link.
+
+Respond with a JSON object with keys "action" and "params". Actions:
+- "navigate_to": {{"url": "https://example.com"}} to open a new URL.
+- "click_element": {{"id": "llm_elem_N"}} to click a button, link or other element.
+- "type_text": {{"id": "llm_elem_N", "text": "query"}} to type into an input or textarea; Enter is pressed after typing.
+- "task_complete": {{"message": "..."}} when the task is done.
+"""
+
+# Gemini response schema of a single action
+ACTION_PROPERTIES = {
+    "action": {
+        "type": "STRING",
+        "description": "The action to perform.",
+        "enum": ["navigate_to", "click_element", "type_text", "task_complete"]
+    },
+    "params": {
+        "type": "OBJECT",
+        "description": "Parameters for the action.",
+        "properties": {
+            "url": {"type": "STRING", "description": "URL for navigate_to action."},
+            "id": {"type": "STRING", "description": "ID of the element for click_element or type_text action. This should be the 'id' from the interactive_elements list."},
+            "text": {"type": "STRING", "description": "Text to type for type_text action."},
+            "message": {"type": "STRING", "description": "Completion message for task_complete action."}
+        }
+    }
+}
+
+# Parameters an action needs before a streamed response can be acted on
+REQUIRED_ACTION_PARAMS = {
+    "navigate_to": ["url"],
+    "click_element": ["id"],
+    "type_text": ["id", "text"],
+    "task_complete": ["message"]
+}
+
+ACTION_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": ACTION_PROPERTIES,
+    "required": ["action", "params"]
+}
+
+# Gemini response schema in plan mode: an ordered list of actions with optional post-conditions
+PLAN_STEP_PROPERTIES = dict(ACTION_PROPERTIES)
+PLAN_STEP_PROPERTIES["params"] = {
+    "type": "OBJECT",
+    "description": "Parameters for the action.",
+    "properties": dict(ACTION_PROPERTIES["params"]["properties"], target={
+        "type": "STRING",
+        "description": "Visible text of an element that only appears after earlier plan steps. Use instead of 'id'."
+    })
+}
+PLAN_STEP_PROPERTIES["expect"] = {
+    "type": "OBJECT",
+    "description": "Optional post-condition checked after the action.",
+    "properties": {
+        "url_contains": {"type": "STRING", "description": "Text the URL must contain after the action."},
+        "text_appears": {"type": "STRING", "description": "Text that must be visible on the page after the action."}
+    }
+}
+
+PLAN_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "plan": {
+            "type": "ARRAY",
+            "description": "Actions to run in order.",
+            "items": {"type": "OBJECT", "properties": PLAN_STEP_PROPERTIES, "required": ["action", "params"]}
+        }
+    },
+    "required": ["plan"]
+}
+
+PLAN_INSTRUCTIONS = """
+PLAN MODE: respond with {{"plan": [...]}} instead, listing the actions to run back to back without looking at the page in between, e.g.
+{{"plan": [{{"action": "type_text", "params": {{"id": "llm_elem_3", "text": "query"}}, "expect": {{"url_contains": "search"}}}},
+           {{"action": "click_element", "params": {{"target": "visible text of the first result"}}}}]}}
+- Use "id" for elements in the current page context. For elements that only appear after earlier steps, use "target" with their visible text instead.
+- "expect" is optional: {{"url_contains": "..."}} and/or {{"text_appears": "..."}} are checked after the action. If a check fails, the rest of the plan is dropped and you are asked again.
+- Stop the plan where you need to see the page before deciding. Only include task_complete when you are certain.
+"""
+
+# Appended to the instructions when site memory knows elements of the current page
+SITE_MEMORY_HINT = """
+Earlier successful tasks on this site used these elements of this page: {elements}. Prefer them if they fit the task.
+"""
+
+# Follow-up message in incremental mode; the full context was sent earlier in the same conversation
+DELTA_PROMPT = """After your last action the page changed. Changes to the page context (elements not listed are unchanged; "removed" ids are no longer listed):
+{delta}
+
+Provide only the JSON response."""
 
 class AIAgent:
-    def __init__(self, driver_path=None, llm_config=None):
+    def __init__(self, driver_path=None, llm_config=None, driver=None, snapshot_mode='script', on_log=None, cancel_event=None,
+                 settle_config=None, prompt_config=None, llm_client=None, decision_cache=None, fast_path=None,
+                 plan_mode=False, text_mode='parser', tracer=None, stream_mode='off', browser_profile='default',
+                 resource_allowlist=None, site_memory=None):
         """
         Initializes the AI Agent with a Selenium WebDriver and LLM configuration.
         :param driver_path: Path to your WebDriver executable (e.g., 'chromedriver').
                             If None, assumes WebDriver is in your system's PATH.
-        :param llm_config: Dictionary containing 'provider', 'model', 'api_key', 'temperature'.
+        :param llm_config: Dictionary containing 'provider', 'model', 'api_key', 'temperature' and optionally 'api_base'.
+        :param driver: An already started WebDriver to use instead of launching a new Chrome.
+                       The agent does not quit a driver it was given.
+        :param snapshot_mode: 'script' collects interactive elements with one injected script,
+                              'webdriver' queries every element property with its own WebDriver call,
+                              'incremental' only re-describes elements whose DOM changed since the last step
+                              and sends the LLM what changed instead of the whole page context.
+        :param on_log: Optional callable receiving every log message as soon as it is produced.
+        :param cancel_event: Optional threading.Event; once set, run_task stops before its next step.
+        :param settle_config: Keyword arguments for PageSettleWaiter (dom_idle_ms, network_idle_ms, timeout,
+                              poll_interval, site_overrides) controlling how long to wait for pages to settle.
+        :param prompt_config: Dictionary with 'max_tokens' (page context token budget, default 4000) and
+                              'max_elements' (default 80) limiting what is sent to the LLM each step, and
+                              'max_delta_turns' (default 4) follow-up delta messages per conversation in
+                              incremental mode before the full context is sent again.
+        :param llm_client: LLMClient used for provider calls. Defaults to the process-wide shared client.
+        :param decision_cache: Optional DecisionCache shared between agents to reuse LLM decisions
+                               on structurally identical pages for the same task and model.
+        :param fast_path: Optional FastPathPolicy that clicks unambiguous cookie-consent and skip-ad
+                          buttons without an LLM call.
+        :param plan_mode: Let the LLM return an ordered plan of several actions with optional post-conditions,
+                          executed back to back and checked locally before the LLM is asked again.
+        :param text_mode: 'parser' extracts the page text from page_source with a streaming parser (lxml when
+                          installed), 'browser' collects it from the live DOM without transferring page_source.
+        :param tracer: Tracer recording timing spans of every stage (see tracing.py). Defaults to the process-wide one.
+        :param stream_mode: 'off' waits for the whole LLM response. 'early' uses the provider's streaming endpoint and
+                            acts as soon as the action and the parameters it needs are complete, closing the rest
+                            of the stream. 'measure' acts as early but reads the rest in the background to report
+                            how much time that saved (the task waits for those reads before it ends).
+        :param browser_profile: Profile name or dictionary from browser_profile.py: 'default' loads pages as Chrome
+                                does, 'lean' launches headless with page_load_strategy 'eager' and blocks images,
+                                media, fonts and trackers. Launch options only apply when the agent starts Chrome;
+                                blocking and the profile's settle settings apply to given drivers too.
+        :param resource_allowlist: Blocked categories ('images', 'media', 'fonts', 'trackers') or tracker domains this
+                                   task needs anyway, e.g. ['media'] to play a video.
+        :param site_memory: Optional SiteMemory shared between agents. Completed tasks are remembered per site, and
+                            later tasks like them open remembered URLs directly, replay remembered steps without
+                            the LLM and get prompt hints (see site_memory.py).
         """
         self.logs = [] # List to store logs to be returned to the web interface
         self.llm_config = llm_config if llm_config else {}
+        self.snapshot_mode = snapshot_mode
+        self.text_mode = text_mode
+        self.tracer = tracer if tracer else get_tracer()
+        self.on_log = on_log
+        self.cancel_event = cancel_event if cancel_event is not None else threading.Event()
+        self.browser_profile = get_profile(browser_profile)
+        self.resource_allowlist = list(resource_allowlist) if resource_allowlist else []
+        self.settle_config = dict(self.browser_profile['settle_config'], **(settle_config if settle_config else {}))
+        self.settle_timings = [] # SettleResult of every wait in the current task
+        self.prompt_config = prompt_config if prompt_config else {}
+        self.prompt_stats = [] # Prompt size and element counts of every LLM call in the current task
+        self._prompt_element_ids = [] # Element ids the LLM could choose from in the last call
+        self._raw_snapshot = None # {index: raw element} of the last incremental snapshot
+        self._snapshot_was_full = True
+        self._conversation = None # Messages sent so far on the current page in incremental mode
+        self.incremental_stats = {'snapshots': 0, 'full_snapshots': 0, 'elements_reextracted': 0, 'elements_reused': 0,
+                                  'delta_prompts': 0, 'prompt_chars_full': 0, 'prompt_chars_sent': 0}
+        self.llm_client = llm_client if llm_client else get_llm_client()
+        self.decision_cache = decision_cache
+        self._served_cache_keys = set()
+        self.fast_path = fast_path
+        self._fast_path_clicked = set()
+        self.fast_path_stats = {'actions': 0, 'llm_calls_saved': 0, 'seconds_saved': 0.0}
+        self._llm_seconds = [] # Durations of LLM calls made by this agent, used to estimate savings
+        self.plan_mode = plan_mode
+        self.task_llm_calls = 0 # LLM calls made in the current task
+        self.task_completed = False # Whether the last task ended with a successful task_complete
+        self.stream_mode = stream_mode
+        self.stream_stats = {'calls': 0, 'early': 0, 'first_token_seconds': 0.0, 'action_seconds': 0.0,
+                             'measured': 0, 'saved_seconds': 0.0, 'mismatches': 0}
+        self._stream_drains = [] # Threads reading the rest of streams in 'measure' mode
+        self._stream_lock = threading.Lock()
+        self.site_memory = site_memory
+        self._route = None # Remembered way to do the current task, from site memory
+        self._replay_step = 0 # Index of the next remembered step to replay
+        self._trajectory = [] # Executed steps of the current task, remembered if it completes
+        self._trajectory_open = True # False after a step that cannot be remembered; the steps before it still are
+        self.site_memory_stats = {'url_jump': 0, 'replayed_steps': 0, 'hinted_prompts': 0}
+        self.owns_driver = driver is None
 
-        options = webdriver.ChromeOptions()
-        # Optional: Run in headless mode for no UI, useful for server environments
-        # options.add_argument('--headless')
-        # options.add_argument('--disable-gpu')
-        # options.add_argument('--no-sandbox')
-        # options.add_argument('--window-size=1920,1080')
+        if driver is not None:
+            self.driver = driver
+        else:
+            try:
+                self.driver = create_driver(driver_path, profile=self.browser_profile)
+                self._log("Selenium WebDriver initialized.")
+            except Exception as e:
+                self._log(f"Error initializing WebDriver: {e}")
+                self.driver = None # Set driver to None if initialization fails
 
-        try:
-            if driver_path:
-                self.driver = webdriver.Chrome(executable_path=driver_path, options=options)
-            else:
-                self.driver = webdriver.Chrome(options=options)
-            self.driver.set_page_load_timeout(30)
-            self._log("Selenium WebDriver initialized.")
-        except Exception as e:
-            self._log(f"Error initializing WebDriver: {e}")
-            self.driver = None # Set driver to None if initialization fails
+        self.settle_waiter = PageSettleWaiter(self.driver, **self.settle_config) if self.driver else None
+        self.resource_blocker = None
+        if self.driver and self.browser_profile['block']:
+            self.resource_blocker = ResourceBlocker(self.driver, self.browser_profile['block'], self.resource_allowlist)
 
     def _log(self, message):
         """Appends a message to the internal log list."""
         print(message) # Also print to console for real-time debugging
         self.logs.append(message)
+        if self.on_log:
+            self.on_log(message)
+
+    def cancel(self):
+        """Asks a running task to stop before its next step."""
+        self.cancel_event.set()
+
+    def _wait_for_settle(self, label):
+        """Waits until the page has settled (see page_settle.py) and records how long it took."""
+        with self.tracer.start_span('settle', label=label) as span:
+            result = self.settle_waiter.wait(label)
+            span.set_attributes(settled=result.settled, polls=result.polls, reason=result.reason)
+        self.settle_timings.append(result)
+        if result.settled:
+            self._log(f"Page settled in {result.seconds:.2f}s.")
+        else:
+            self._log(f"Page did not settle within {result.seconds:.2f}s ({result.reason}). Continuing anyway.")
+        return result
 
     def _get_page_context(self):
         """
@@ -59,110 +286,22 @@ class AIAgent:
             }
 
         try:
-            page_source = self.driver.page_source
-            soup = BeautifulSoup(page_source, 'html.parser')
-
-            for script_or_style in soup(["script", "style"]):
-                script_or_style.extract()
-            
-            text_content = soup.get_text(separator=' ', strip=True)
-            if len(text_content) > 2000:
-                text_content = text_content[:2000] + "..."
-            
-            interactive_elements = []
-            elements = self.driver.find_elements(By.XPATH, "//button | //a | //input[not(@type='hidden')] | //textarea | //select")
+            # Both stop once the first 2000 characters are collected (see page_text.py)
+            with self.tracer.start_span('page_text', mode=self.text_mode) as span:
+                if self.text_mode == 'browser':
+                    text_content = extract_text_in_browser(self.driver)
+                else:
+                    text_content = extract_text(self.driver.page_source)
+                span.set_attribute('chars', len(text_content))
             
-            viewport_width = self.driver.execute_script("return window.innerWidth;")
-            viewport_height = self.driver.execute_script("return window.innerHeight;")
-
-            for i, elem in enumerate(elements):
-                try:
-                    if not elem.is_displayed() or not elem.is_enabled():
-                        continue
-
-                    llm_identifier = f"llm_elem_{i}" 
-                    self.driver.execute_script(f"arguments[0].setAttribute('data-llm-id', '{llm_identifier}');", elem)
-
-                    tag = elem.tag_name
-                    elem_info = {'tag': tag, 'id': llm_identifier} 
-
-                    original_id = elem.get_attribute('id')
-                    if original_id:
-                        elem_info['original_html_id'] = original_id 
-                    
-                    name = elem.get_attribute('name')
-                    if name:
-                        elem_info['name'] = name
-                    
-                    text = elem.text.strip()
-                    if text:
-                        elem_info['text'] = text
-                    
-                    value = elem.get_attribute('value')
-                    if value and tag == 'input':
-                        elem_info['value'] = value
-                    
-                    placeholder = elem.get_attribute('placeholder')
-                    if placeholder:
-                        elem_info['placeholder'] = placeholder
-                    
-                    aria_label = elem.get_attribute('aria-label')
-                    if aria_label:
-                        elem_info['aria_label'] = aria_label
-                    
-                    if tag == 'input':
-                        elem_info['type'] = elem.get_attribute('type')
-
-                    location = elem.location
-                    size = elem.size
-                    
-                    elem_info['bounding_box'] = {
-                        'x': location['x'],
-                        'y': location['y'],
-                        'width': size['width'],
-                        'height': size['height']
-                    }
-
-                    is_visible_in_viewport = (
-                        location['x'] >= 0 and
-                        location['y'] >= 0 and
-                        (location['x'] + size['width']) <= viewport_width and
-                        (location['y'] + size['height']) <= viewport_height
-                    )
-                    elem_info['is_visible_in_viewport'] = is_visible_in_viewport
-                    
-                    lower_combined_text = (
-                        (text or '') + ' ' + 
-                        (value or '') + ' ' + 
-                        (placeholder or '') + ' ' + 
-                        (aria_label or '') + ' ' +
-                        (original_id or '')
-                    ).lower()
-
-                    if any(keyword in lower_combined_text for keyword in ['accept', 'agree', 'ok', 'continue', 'cookie', 'consent', 'privacy']):
-                        elem_info['is_cookie_consent_button'] = True
-
-                    if any(keyword in lower_combined_text for keyword in ['skip ads', 'skip ad', 'skip', 'advertisement', 'ad in']):
-                        elem_info['is_skip_ad_button'] = True
-                    if original_id in ['ytp-ad-skip-button', 'skip-button'] or \
-                       'ytp-ad-skip-button-container' in elem.get_attribute('class') or \
-                       'ytp-skip-ad-button' in elem.get_attribute('class') or \
-                       'ytp-ad-overlay-close-button' in elem.get_attribute('class') or \
-                       (aria_label and 'skip' in aria_label.lower()):
-                        elem_info['is_skip_ad_button'] = True
-
-                    if tag == 'a':
-                        href = elem.get_attribute('href')
-                        if href and ('/watch?v=' in href or 'youtube.com/video/' in href):
-                            elem_info['is_video_link'] = True
-
-                    if text or value or name or placeholder or aria_label or tag in ['button', 'a'] or original_id:
-                        interactive_elements.append(elem_info)
-                except selenium.common.exceptions.StaleElementReferenceException:
-                    continue
-                except Exception as e:
-                    self._log(f"Warning: Could not process element due to: {e}")
-                    continue
+            with self.tracer.start_span('elements', mode=self.snapshot_mode) as span:
+                if self.snapshot_mode == 'script':
+                    interactive_elements = self._collect_elements_script()
+                elif self.snapshot_mode == 'incremental':
+                    interactive_elements = self._collect_elements_incremental()
+                else:
+                    interactive_elements = self._collect_elements_webdriver()
+                span.set_attribute('count', len(interactive_elements))
             
             return {
                 "current_url": self.driver.current_url,
@@ -171,14 +310,304 @@ class AIAgent:
             }
         except Exception as e:
             self._log(f"Error getting page context: {e}")
+            self._raw_snapshot = None
             return {
                 "current_url": self.driver.current_url,
                 "text_content": "Could not retrieve full page content.",
                 "interactive_elements": []
             }
 
+    def _collect_elements_script(self):
+        """
+        Collects interactive elements with a single injected script (see page_snapshot.py).
+        Produces the same schema as _collect_elements_webdriver.
+        """
+        viewport_width, viewport_height, raw_elements = take_snapshot(self.driver)
+        interactive_elements = []
+        for raw in raw_elements:
+            elem_info = self._build_element_info(raw, viewport_width, viewport_height)
+            if elem_info:
+                interactive_elements.append(elem_info)
+        return interactive_elements
+
+    def _collect_elements_incremental(self):
+        """
+        Collects interactive elements like _collect_elements_script, but elements outside the DOM subtrees
+        that changed since the previous call are taken over from the previous snapshot (see page_snapshot.py).
+        """
+        viewport_width, viewport_height, raw_elements, info = take_incremental_snapshot(self.driver, self._raw_snapshot)
+        self._raw_snapshot = {raw['index']: raw for raw in raw_elements}
+        self._snapshot_was_full = info['full']
+        stats = self.incremental_stats
+        stats['snapshots'] += 1
+        stats['full_snapshots'] += 1 if info['full'] else 0
+        stats['elements_reextracted'] += info['reextracted']
+        stats['elements_reused'] += info['reused']
+        if not info['full']:
+            self._log(f"Incremental snapshot: {info['reextracted']} elements re-extracted, {info['reused']} reused.")
+
+        interactive_elements = []
+        for raw in raw_elements:
+            elem_info = self._build_element_info(raw, viewport_width, viewport_height)
+            if elem_info:
+                interactive_elements.append(elem_info)
+        return interactive_elements
+
+    def _collect_elements_webdriver(self):
+        """
+        Collects interactive elements with one WebDriver call per element property.
+        Kept as a reference implementation for the script snapshot.
+        """
+        interactive_elements = []
+        elements = self.driver.find_elements(By.XPATH, "//button | //a | //input[not(@type='hidden')] | //textarea | //select")
+        
+        viewport_width = self.driver.execute_script("return window.innerWidth;")
+        viewport_height = self.driver.execute_script("return window.innerHeight;")
+
+        for i, elem in enumerate(elements):
+            try:
+                if not elem.is_displayed() or not elem.is_enabled():
+                    continue
+
+                self.driver.execute_script(f"arguments[0].setAttribute('data-llm-id', 'llm_elem_{i}');", elem)
+
+                tag = elem.tag_name
+                location = elem.location
+                size = elem.size
+                raw = {
+                    'index': i,
+                    'tag': tag,
+                    'id': elem.get_attribute('id'),
+                    'name': elem.get_attribute('name'),
+                    'text': elem.text,
+                    'value': elem.get_attribute('value'),
+                    'placeholder': elem.get_attribute('placeholder'),
+                    'aria_label': elem.get_attribute('aria-label'),
+                    'type': elem.get_attribute('type') if tag == 'input' else None,
+                    'class': elem.get_attribute('class'),
+                    'href': elem.get_attribute('href') if tag == 'a' else None,
+                    'x': location['x'],
+                    'y': location['y'],
+                    'width': size['width'],
+                    'height': size['height']
+                }
+
+                elem_info = self._build_element_info(raw, viewport_width, viewport_height)
+                if elem_info:
+                    interactive_elements.append(elem_info)
+            except selenium.common.exceptions.StaleElementReferenceException:
+                continue
+            except Exception as e:
+                self._log(f"Warning: Could not process element due to: {e}")
+                continue
+        return interactive_elements
+
+    def _build_element_info(self, raw, viewport_width, viewport_height):
+        """
+        Turns the raw properties of one element into its 'interactive_elements' entry.
+        :param raw: Dictionary keyed by page_snapshot.SNAPSHOT_FIELDS.
+        :return: The element info dictionary, or None if the element carries nothing useful for the LLM.
+        """
+        tag = raw['tag']
+        llm_identifier = f"llm_elem_{raw['index']}"
+        elem_info = {'tag': tag, 'id': llm_identifier}
+
+        original_id = raw.get('id')
+        if original_id:
+            elem_info['original_html_id'] = original_id
+
+        name = raw.get('name')
+        if name:
+            elem_info['name'] = name
+
+        text = (raw.get('text') or '').strip()
+        if text:
+            elem_info['text'] = text
+
+        value = raw.get('value')
+        if value and tag == 'input':
+            elem_info['value'] = value
+
+        placeholder = raw.get('placeholder')
+        if placeholder:
+            elem_info['placeholder'] = placeholder
+
+        aria_label = raw.get('aria_label')
+        if aria_label:
+            elem_info['aria_label'] = aria_label
+
+        if tag == 'input':
+            elem_info['type'] = raw.get('type')
+
+        elem_info['bounding_box'] = {
+            'x': raw['x'],
+            'y': raw['y'],
+            'width': raw['width'],
+            'height': raw['height']
+        }
+
+        is_visible_in_viewport = (
+            raw['x'] >= 0 and
+            raw['y'] >= 0 and
+            (raw['x'] + raw['width']) <= viewport_width and
+            (raw['y'] + raw['height']) <= viewport_height
+        )
+        elem_info['is_visible_in_viewport'] = is_visible_in_viewport
+
+        lower_combined_text = (
+            (text or '') + ' ' + 
+            (value or '') + ' ' + 
+            (placeholder or '') + ' ' + 
+            (aria_label or '') + ' ' +
+            (original_id or '')
+        ).lower()
+
+        if any(keyword in lower_combined_text for keyword in ['accept', 'agree', 'ok', 'continue', 'cookie', 'consent', 'privacy']):
+            elem_info['is_cookie_consent_button'] = True
+
+        if any(keyword in lower_combined_text for keyword in ['skip ads', 'skip ad', 'skip', 'advertisement', 'ad in']):
+            elem_info['is_skip_ad_button'] = True
+        class_name = raw.get('class') or ''
+        if original_id in ['ytp-ad-skip-button', 'skip-button'] or \
+           'ytp-ad-skip-button-container' in class_name or \
+           'ytp-skip-ad-button' in class_name or \
+           'ytp-ad-overlay-close-button' in class_name or \
+           (aria_label and 'skip' in aria_label.lower()):
+            elem_info['is_skip_ad_button'] = True
+
+        if tag == 'a':
+            href = raw.get('href')
+            if href and ('/watch?v=' in href or 'youtube.com/video/' in href):
+                elem_info['is_video_link'] = True
+
+        if text or value or name or placeholder or aria_label or tag in ['button', 'a'] or original_id:
+            return elem_info
+        return None
+
     def _call_llm(self, prompt):
-        """Handles the API call to the selected LLM (Gemini or OpenAI)."""
+        """
+        Handles the API call to the selected LLM (Gemini or OpenAI).
+        :param prompt: The prompt text, or a list of {'role': 'user' | 'assistant', 'content': text} messages.
+        """
+        if self.stream_mode != 'off':
+            return self._call_llm_streaming(prompt)
+        provider, api_url, headers, payload, span = self._start_llm_call(prompt)
+        response = None
+        try:
+            response = self.llm_client.post_json(provider, api_url, headers, payload)
+            return self._read_llm_response(provider, response, span)
+        except Exception as e:
+            return self._llm_call_failed(provider, e, response, span)
+        finally:
+            span.end()
+
+    def _call_llm_streaming(self, prompt):
+        """
+        _call_llm on the provider's streaming endpoint: returns the action as soon as it is complete enough to act on
+        (see _streamed_action), while the rest of the stream is closed or, in 'measure' mode, read in the background.
+        """
+        provider, api_url, headers, payload, span = self._start_llm_call(prompt, stream=True)
+        response = None
+        parser = JsonStreamParser()
+        start = time.monotonic()
+        try:
+            response = self.llm_client.post_json(provider, api_url, headers, payload, stream=True)
+            span.set_attributes(http_status=response.status_code, retries=getattr(response, 'attempts', 1) - 1, streamed=True)
+            pieces = stream_text(provider, response)
+            first_token = None
+            action = None
+            early = False # Acted on before the stream ended
+            for piece in pieces:
+                if first_token is None:
+                    first_token = time.monotonic() - start
+                parser.feed(piece)
+                action = self._streamed_action(parser)
+                if action:
+                    early = True
+                    break
+            ready = time.monotonic() - start
+            if action is None:
+                response.close()
+                self._log(f"LLM stream from {provider} ended without a complete JSON response: {parser.text[:500]}")
+                span.set_status(STATUS_ERROR, "incomplete streamed response")
+                return {"action": "task_complete", "params": {"message": f"LLM failed to provide a valid action due to an incomplete streamed response from {provider}.", "error": True}}
+
+            span.set_attributes(first_token_ms=round((first_token or ready) * 1000, 1), action_ms=round(ready * 1000, 1),
+                                early_dispatch=early, response_chars=len(parser.text))
+            with self._stream_lock:
+                stats = self.stream_stats
+                stats['calls'] += 1
+                stats['early'] += 1 if early else 0
+                stats['first_token_seconds'] += first_token or ready
+                stats['action_seconds'] += ready
+            if early and self.stream_mode == 'measure':
+                drain = threading.Thread(target=self._drain_stream, args=(self.task_llm_calls, pieces, parser, response, start, ready, action),
+                                         daemon=True)
+                self._stream_drains.append(drain)
+                drain.start()
+            else:
+                response.close()
+            self._log(f"LLM stream: action ready after {ready:.2f}s (first token after {(first_token or ready):.2f}s)"
+                      + ("; not waiting for the rest of the response." if early else "."))
+            return action
+        except Exception as e:
+            if response is not None:
+                response.close()
+            return self._llm_call_failed(provider, e, response, span, raw_text=parser.text)
+        finally:
+            span.end()
+
+    def _streamed_action(self, parser):
+        """
+        The action of a partly streamed response, once it can be acted on: the action and the parameters it needs
+        (REQUIRED_ACTION_PARAMS) are complete. Plans and unknown actions wait for the whole JSON object, though
+        not for the end of the stream.
+        :return: The action dictionary, or None to keep reading.
+        """
+        if parser.complete:
+            return parser.get()
+        if self.plan_mode or not parser.has('action'):
+            return None
+        action = parser.get('action')
+        if parser.has('params'):
+            return {'action': action, 'params': parser.get('params')}
+        needed = REQUIRED_ACTION_PARAMS.get(action)
+        if needed is None or not all(parser.has('params', name) for name in needed):
+            return None
+        return {'action': action, 'params': {name: parser.get('params', name) for name in needed}}
+
+    def _drain_stream(self, call, pieces, parser, response, start, ready, action):
+        """Reads the rest of a stream whose action was already dispatched, to time and check the early dispatch."""
+        try:
+            for piece in pieces:
+                parser.feed(piece)
+            saved = time.monotonic() - start - ready
+        except Exception as e:
+            self._log(f"LLM stream (call {call}): reading the rest of the response failed: {e}")
+            return
+        finally:
+            response.close()
+        full = parser.get() or {}
+        matches = full.get('action') == action['action'] and all(
+            (full.get('params') or {}).get(name) == value for name, value in action['params'].items())
+        with self._stream_lock:
+            self.stream_stats['measured'] += 1
+            self.stream_stats['saved_seconds'] += saved
+            self.stream_stats['mismatches'] += 0 if matches else 1
+        self._log(f"LLM stream (call {call}): acting early saved {saved:.2f}s."
+                  + ("" if matches else f" The complete response differs from the dispatched action: {full}"))
+
+    def _wait_for_stream_drains(self, timeout=30):
+        for drain in self._stream_drains:
+            drain.join(timeout)
+        self._stream_drains = []
+
+    def _start_llm_call(self, prompt, stream=False):
+        """
+        Builds the provider request for a prompt and opens its 'llm_call' span.
+        :param stream: Build the request for the provider's streaming endpoint (server-sent events).
+        :return: Tuple of (provider, api_url, headers, payload, span).
+        """
         provider = self.llm_config.get('provider')
         model_name = self.llm_config.get('model')
         api_key = self.llm_config.get('api_key')
@@ -187,225 +616,651 @@ class AIAgent:
         if not api_key:
             raise ValueError("API Key is not provided.")
         
+        messages = [{"role": "user", "content": prompt}] if isinstance(prompt, str) else prompt
         headers = {'Content-Type': 'application/json'}
         payload = {
-            "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+            "contents": [
+                {"role": "model" if message["role"] == "assistant" else "user", "parts": [{"text": message["content"]}]}
+                for message in messages
+            ],
             "generationConfig": {
                 "temperature": temperature,
                 "responseMimeType": "application/json",
-                "responseSchema": {
-                    "type": "OBJECT",
-                    "properties": {
-                        "action": {
-                            "type": "STRING",
-                            "description": "The action to perform.",
-                            "enum": ["navigate_to", "click_element", "type_text", "task_complete"]
-                        },
-                        "params": {
-                            "type": "OBJECT",
-                            "description": "Parameters for the action.",
-                            "properties": {
-                                "url": {"type": "STRING", "description": "URL for navigate_to action."},
-                                "id": {"type": "STRING", "description": "ID of the element for click_element or type_text action. This should be the 'id' from the interactive_elements list."},
-                                "text": {"type": "STRING", "description": "Text to type for type_text action."},
-                                "message": {"type": "STRING", "description": "Completion message for task_complete action."}
-                            }
-                        }
-                    },
-                    "required": ["action", "params"]
-                }
+                "responseSchema": PLAN_RESPONSE_SCHEMA if self.plan_mode else ACTION_RESPONSE_SCHEMA
             }
         }
 
+        # 'api_base' lets the agent talk to a proxy or a local fake provider
+        api_base = self.llm_config.get('api_base') or DEFAULT_API_BASES.get(provider, '')
+        api_base = api_base.rstrip('/')
+
         if provider == 'gemini':
-            api_url = f"https://generativelanguage.googleapis.com/v1beta/models/{model_name}:generateContent?key={api_key}"
+            method = 'streamGenerateContent?alt=sse&' if stream else 'generateContent?'
+            api_url = f"{api_base}/v1beta/models/{model_name}:{method}key={api_key}"
         elif provider == 'openai':
             # OpenAI API structure is different
             headers['Authorization'] = f'Bearer {api_key}'
-            api_url = "https://api.openai.com/v1/chat/completions"
+            api_url = f"{api_base}/v1/chat/completions"
             payload = {
                 "model": model_name,
-                "messages": [{"role": "user", "content": prompt}],
+                "messages": messages,
                 "temperature": temperature,
                 "response_format": {"type": "json_object"} # For structured JSON output
             }
+            if stream:
+                payload["stream"] = True
         else:
             raise ValueError("Unsupported LLM provider specified.")
 
-        try:
-            response = requests.post(api_url, headers=headers, data=json.dumps(payload))
-            response.raise_for_status()
-            result = response.json()
-
-            if provider == 'gemini':
-                if result.get('candidates') and result['candidates'][0].get('content') and result['candidates'][0]['content'].get('parts'):
-                    json_text = result['candidates'][0].get('content').get('parts')[0].get('text')
-                    if json_text:
-                        return json.loads(json_text)
-            elif provider == 'openai':
-                if result.get('choices') and result['choices'][0].get('message') and result['choices'][0]['message'].get('content'):
-                    json_text = result['choices'][0]['message'].get('content')
-                    if json_text:
-                        # OpenAI might return JSON as a string, need to parse it
-                        return json.loads(json_text)
-            
-            self._log(f"LLM response structure unexpected or missing content for {provider}: {result}")
-            return {"action": "task_complete", "params": {"message": f"LLM failed to provide a valid action due to unexpected response structure from {provider}."}}
+        span = self.tracer.start_span(
+            'llm_call', provider=provider, model=model_name, messages=len(messages),
+            prompt_chars=sum(len(message['content']) for message in messages)
+        )
+        return provider, api_url, headers, payload, span
+
+    def _read_llm_response(self, provider, response, span):
+        """Extracts the action from a successful provider response."""
+        span.set_attributes(http_status=response.status_code, retries=getattr(response, 'attempts', 1) - 1,
+                            response_bytes=len(response.content))
+        result = response.json()
 
-        except requests.exceptions.RequestException as e:
+        if provider == 'gemini':
+            if result.get('candidates') and result['candidates'][0].get('content') and result['candidates'][0]['content'].get('parts'):
+                json_text = result['candidates'][0].get('content').get('parts')[0].get('text')
+                if json_text:
+                    return json.loads(json_text)
+        elif provider == 'openai':
+            if result.get('choices') and result['choices'][0].get('message') and result['choices'][0]['message'].get('content'):
+                json_text = result['choices'][0]['message'].get('content')
+                if json_text:
+                    # OpenAI might return JSON as a string, need to parse it
+                    return json.loads(json_text)
+        
+        self._log(f"LLM response structure unexpected or missing content for {provider}: {result}")
+        span.set_status(STATUS_ERROR, "unexpected response structure")
+        return {"action": "task_complete", "params": {"message": f"LLM failed to provide a valid action due to unexpected response structure from {provider}.", "error": True}}
+
+    def _llm_call_failed(self, provider, e, response, span, raw_text=None):
+        """
+        Logs a failed LLM call and returns the task_complete action that ends the task, flagged with an 'error' parameter.
+        :param raw_text: Response text already read from a stream, logged instead of the response body.
+        """
+        if isinstance(e, requests.exceptions.RequestException):
             self._log(f"API call failed for {provider}: {e}")
+            span.set_status(STATUS_ERROR, str(e))
             if hasattr(e, 'response') and e.response is not None:
+                span.set_attribute('http_status', e.response.status_code)
                 self._log(f"API Response Status Code: {e.response.status_code}")
                 self._log(f"API Response Body: {e.response.text}")
-            return {"action": "task_complete", "params": {"message": f"API call failed for {provider}: {e}"}}
-        except json.JSONDecodeError as e:
+            return {"action": "task_complete", "params": {"message": f"API call failed for {provider}: {e}", "error": True}}
+        if isinstance(e, json.JSONDecodeError):
             self._log(f"Failed to decode JSON from LLM response for {provider}: {e}")
-            self._log(f"Raw LLM response (if available): {response.text if 'response' in locals() else 'N/A'}")
-            return {"action": "task_complete", "params": {"message": f"Failed to decode LLM response: {e}"}}
-        except Exception as e:
-            self._log(f"An unexpected error occurred during LLM interaction for {provider}: {e}")
-            return {"action": "task_complete", "params": {"message": f"Unexpected error during LLM interaction for {provider}: {e}"}}
+            span.set_status(STATUS_ERROR, f"invalid JSON: {e}")
+            if raw_text is None:
+                raw_text = response.text if response is not None else 'N/A'
+            self._log(f"Raw LLM response (if available): {raw_text}")
+            return {"action": "task_complete", "params": {"message": f"Failed to decode LLM response: {e}", "error": True}}
+        self._log(f"An unexpected error occurred during LLM interaction for {provider}: {e}")
+        span.set_status(STATUS_ERROR, str(e))
+        return {"action": "task_complete", "params": {"message": f"Unexpected error during LLM interaction for {provider}: {e}", "error": True}}
 
 
     def _get_llm_action(self, page_context, task_description):
         """
         Sends the current page context and the task description to the LLM.
         The LLM is prompted to return a JSON string specifying the next action.
+        The page context is ranked and trimmed to the prompt budget first (see prompt_budget.py).
         """
-        prompt = f"""
-        You are an AI web navigation agent. Your goal is to help me complete a task on a website.
-        I will provide you with the current page's URL, visible text content, and a list of interactive elements.
-        Each interactive element will have a unique 'id' (e.g., 'llm_elem_0'). This 'id' is what you MUST use for 'click_element' or 'type_text' actions. Some elements might also have an 'original_html_id' for additional context, but use the 'id' for actions.
-        Each element will also have a 'bounding_box' (x, y, width, height) and an 'is_visible_in_viewport' flag.
+        messages = self._llm_messages(page_context, task_description)
+        start = time.monotonic()
+        response = self._call_llm(messages)
+        self._record_llm_response(response, time.monotonic() - start)
+        return response
+
+    def _llm_messages(self, page_context, task_description):
+        """Builds the prompt (or, in incremental mode, the conversation) for the next LLM call and records its size."""
+        instructions = PROMPT_INSTRUCTIONS.format(task_description=task_description)
+        if self.plan_mode:
+            instructions += PLAN_INSTRUCTIONS.format()
+        hints = self.site_memory.hints(page_context) if self.site_memory else []
+        compact_context, stats = compact_page_context(
+            page_context,
+            task_description,
+            max_tokens=self.prompt_config.get('max_tokens', 4000),
+            max_elements=self.prompt_config.get('max_elements', 80),
+            reserved_tokens=estimate_tokens(instructions + SITE_MEMORY_HINT) + 8 * len(hints),
+            preferred_ids=[element_id for element_id, _ in hints]
+        )
+        kept_ids = {elem['id'] for elem in compact_context['interactive_elements']}
+        hints = [(element_id, action) for element_id, action in hints if element_id in kept_ids]
+        if hints:
+            instructions += SITE_MEMORY_HINT.format(elements=', '.join(f"{element_id} ({action})" for element_id, action in hints))
+            self.site_memory.count('hinted_prompts')
+            self.site_memory_stats['hinted_prompts'] += 1
+        prompt = f"{instructions}\nCurrent Page Context:\n{to_json(compact_context)}\n\nProvide only the JSON response."
 
-        Some elements might also have an 'is_cookie_consent_button: true' flag if they appear to be related to cookie consent.
-        Some elements might also have an 'is_skip_ad_button: true' flag if they appear to be a button to skip an advertisement.
-        Some elements (links) might also have an 'is_video_link: true' flag if they lead to a video (e.g., on YouTube).
+        stats['prompt_chars'] = len(prompt)
+        stats['estimated_tokens'] = estimate_tokens(prompt)
+        self.prompt_stats.append(stats)
+        self._prompt_element_ids = [elem['id'] for elem in compact_context['interactive_elements']]
+        self._log(f"Prompt size: {stats['prompt_chars']} chars (~{stats['estimated_tokens']} tokens), "
+                  f"{stats['elements_kept']} of {stats['elements_total']} elements.")
+        self.task_llm_calls += 1
+        return self._conversation_messages(compact_context, prompt) if self.snapshot_mode == 'incremental' else prompt
 
-        Your task is: "{task_description}"
+    def _record_llm_response(self, response, seconds):
+        self._llm_seconds.append(seconds)
+        if self._conversation:
+            self._conversation['messages'].append({'role': 'assistant', 'content': to_json(response)})
 
-        **IMPORTANT RULES (Priority Order):**
-        1.  If any interactive element has `is_cookie_consent_button: true` AND `is_visible_in_viewport: true`, your ABSOLUTE HIGHEST PRIORITY is to click that button to dismiss the cookie consent. You MUST select one of these buttons if present, before attempting any other action related to the main task. Look for buttons with text like 'Accept', 'Agree', 'OK', 'Continue', or related to 'cookies' or 'consent'.
-        2.  If any interactive element has `is_skip_ad_button: true` AND `is_visible_in_viewport: true`, your NEXT HIGHEST PRIORITY is to click that button to skip the advertisement. You MUST select one of these buttons if present, before attempting any other action related to the main task (unless a cookie consent button is present and needs to be clicked first). Look for buttons with text like 'Skip Ads', 'Skip Ad', 'Skip', 'Advertisement'.
-        3.  When choosing an element to interact with (click or type), **always prefer elements where `is_visible_in_viewport` is `true`**. Elements with negative Y-coordinates or very large Y-coordinates in their `bounding_box` are likely off-screen and not immediately clickable.
-        4.  When the task involves playing a video (e.g., on YouTube), **always prioritize clicking elements where `is_video_link: true`**.
+    def _conversation_messages(self, compact_context, full_prompt):
+        """
+        In incremental mode, continues the conversation about the current page with a message listing only
+        the elements that were added, changed or removed since the previous call. The APIs are stateless,
+        so earlier messages are resent, but they form an unchanged prefix that providers cache.
+        A new conversation with the full prompt is started after navigation, a full snapshot, an action that
+        did not come from the LLM, max_delta_turns follow-ups, or when the delta is not much smaller.
+        :return: The list of messages to send.
+        """
+        elements = {entry['id']: entry for entry in compact_context['interactive_elements']}
+        conversation = self._conversation
+        stats = self.incremental_stats
+        stats['prompt_chars_full'] += len(full_prompt)
+        if (conversation and not self._snapshot_was_full
+                and conversation['url'] == compact_context['current_url']
+                and conversation['turns'] < self.prompt_config.get('max_delta_turns', 4)):
+            previous = conversation['elements']
+            delta = {
+                'added': [entry for element_id, entry in elements.items() if element_id not in previous],
+                'changed': [entry for element_id, entry in elements.items()
+                            if element_id in previous and previous[element_id] != entry],
+                'removed': [element_id for element_id in previous if element_id not in elements]
+            }
+            if compact_context['text_content'] != conversation['text']:
+                delta['text_content'] = compact_context['text_content']
+            message = DELTA_PROMPT.format(delta=to_json(delta))
+            if len(message) * 2 < len(full_prompt):
+                conversation['messages'].append({'role': 'user', 'content': message})
+                conversation.update(elements=elements, text=compact_context['text_content'], turns=conversation['turns'] + 1)
+                stats['delta_prompts'] += 1
+                stats['prompt_chars_sent'] += len(message)
+                self._log(f"Sending page changes only: {len(message)} new chars instead of {len(full_prompt)} "
+                          f"({len(delta['added'])} added, {len(delta['changed'])} changed, {len(delta['removed'])} removed).")
+                return list(conversation['messages'])
+
+        self._conversation = {
+            'url': compact_context['current_url'],
+            'elements': elements,
+            'text': compact_context['text_content'],
+            'turns': 0,
+            'messages': [{'role': 'user', 'content': full_prompt}]
+        }
+        stats['prompt_chars_sent'] += len(full_prompt)
+        return list(self._conversation['messages'])
+
+    def _estimated_llm_seconds(self):
+        """Average duration of this agent's LLM calls, or the fast-path policy's assumption before any call."""
+        if self._llm_seconds:
+            return sum(self._llm_seconds) / len(self._llm_seconds)
+        return self.fast_path.assumed_llm_seconds
 
-        Based on the provided information, decide the next best action to take.
-        Your response MUST be a JSON object with two keys: "action" and "params".
+    def _wait_for_element(self, element_llm_id, clickable=False):
+        """Waits up to 10s for the element with this data-llm-id to be present (or clickable) and returns it."""
+        locator = (By.CSS_SELECTOR, f"[data-llm-id='{element_llm_id}']")
+        condition = EC.element_to_be_clickable(locator) if clickable else EC.presence_of_element_located(locator)
+        return WebDriverWait(self.driver, 10).until(condition)
 
-        Possible actions and their parameters:
-        1.  "navigate_to": {{"url": "https://example.com"}}
-            - Use this to go to a completely new URL.
-        2.  "click_element": {{"id": "id_from_interactive_elements_list"}}
-            - Use this to click a button, link, or other clickable element. Ensure the 'id' is the 'id' from the 'interactive_elements' list.
-        3.  "type_text": {{"id": "id_from_interactive_elements_list", "text": "your search query"}}
-            - Use this to type text into an input field or textarea. Ensure the 'id' is the 'id' and the element is an input/textarea. After typing, if it's a search bar, consider if a "click_element" on a search button or simulating "Keys.RETURN" is needed.
-        4.  "task_complete": {{"message": "Optional message about task completion"}}
-            - Use this when the task is successfully completed.
+    def _execute_action(self, action, params):
+        """
+        Performs one action on the current page.
+        :return: 'continue' to go on with the next step, 'retry' when the page should be re-evaluated
+                 (e.g. an overlay intercepted a click), 'complete' when the task is done, or 'stop' on an error.
+        """
+        if action == "navigate_to":
+            url = params.get("url")
+            if url:
+                self._log(f"Navigating to: {url}")
+                self.driver.get(url)
+            else:
+                self._log("Error: 'navigate_to' action missing 'url' parameter. Terminating.")
+                return 'stop'
+        elif action == "click_element":
+            element_llm_id = params.get("id")
+            if element_llm_id:
+                try:
+                    element = self._wait_for_element(element_llm_id, clickable=True)
+                    self._log(f"Attempting to click element with data-llm-id: {element_llm_id}")
+                    element.click()
+                except selenium.common.exceptions.ElementClickInterceptedException as e:
+                    self._log(f"Error clicking element with data-llm-id '{element_llm_id}': {e}. This often means an overlay (like cookie consent) is blocking the click. Re-evaluating page context.")
+                    return 'retry'
+                except Exception as e:
+                    self._log(f"Error clicking element with data-llm-id '{element_llm_id}': {e}. Terminating.")
+                    return 'stop'
+            else:
+                self._log("Error: 'click_element' action missing 'id' parameter. Terminating.")
+                return 'stop'
+        elif action == "type_text":
+            element_llm_id = params.get("id")
+            text_to_type = params.get("text")
+            if element_llm_id and text_to_type is not None:
+                try:
+                    element = self._wait_for_element(element_llm_id)
+                    self._log(f"Typing '{text_to_type}' into element with data-llm-id: {element_llm_id}")
+                    element.clear()
+                    element.send_keys(text_to_type)
+                    element.send_keys(Keys.RETURN) 
+                except Exception as e:
+                    self._log(f"Error typing into element with data-llm-id '{element_llm_id}': {e}. Terminating.")
+                    return 'stop'
+            else:
+                self._log("Error: 'type_text' action missing 'id' or 'text' parameter. Terminating.")
+                return 'stop'
+        elif action == "task_complete":
+            if params.get('error'):
+                # A failed LLM call ends the task, but the task was not done
+                self._log(f"Task ended without completing: {params.get('message', 'No message provided.')}")
+                return 'stop'
+            self._log(f"Task completed successfully: {params.get('message', 'No message provided.')}")
+            return 'complete'
+        else:
+            self._log(f"Unknown action received from LLM: '{action}'. Terminating.")
+            return 'stop'
+        return 'continue'
 
-        Current Page Context:
-        {json.dumps(page_context, indent=2)}
+    def _decide_action(self, page_context, task_description):
+        """
+        Chooses the next action: from the fast-path policy for unambiguous cookie-consent and skip-ad
+        buttons, from site memory while the task follows a remembered path, from the decision cache when
+        the same task has met a structurally identical page before, and otherwise from the LLM.
+        :return: Tuple of (action dictionary, source, cache key) where source is 'fast_path', 'memory', 'cache'
+                 or 'llm' and the cache key is set only for actions served from the cache.
+        """
+        decision, cache_key = self._decide_without_llm(page_context, task_description)
+        if decision:
+            return decision
+        llm_response = self._get_llm_action(page_context, task_description)
+        if cache_key:
+            self.decision_cache.store(cache_key, llm_response, page_context)
+        return llm_response, 'llm', None
 
-        Provide only the JSON response.
+    def _decide_without_llm(self, page_context, task_description):
+        """
+        The fast-path, site memory and decision cache part of _decide_action.
+        :return: Tuple of (decision, cache key): the _decide_action result if no LLM call is needed, otherwise None
+                 and the key to store the LLM's decision under (None without a decision cache).
         """
-        return self._call_llm(prompt)
+        if self.fast_path:
+            decision = self.fast_path.decide(page_context, task_description, self._fast_path_clicked)
+            if decision:
+                fast_action, reason = decision
+                clicked = next(elem for elem in page_context['interactive_elements'] if elem['id'] == fast_action['params']['id'])
+                self._fast_path_clicked.add(element_signature(clicked))
+                self._log(f"Fast path: clicking {reason} without asking the LLM.")
+                self._conversation = None # The LLM did not see this action
+                return (fast_action, 'fast_path', None), None
+
+        if self._route and self._replay_step < self._route['replayable']:
+            remembered = self._replay_from_memory(page_context)
+            if remembered:
+                return (remembered, 'memory', None), None
+
+        if not self.decision_cache:
+            return None, None
+
+        cache_key = self.decision_cache.make_key(page_context, task_description, self.llm_config)
+        # A key is served once per task so a cached action that has no effect cannot loop
+        if cache_key not in self._served_cache_keys:
+            cached = self.decision_cache.lookup(cache_key, page_context)
+            if cached:
+                self._served_cache_keys.add(cache_key)
+                self._log("Decision cache hit: reusing a previous LLM decision for this page and task.")
+                self._conversation = None
+                return (cached, 'cache', cache_key), cache_key
+        return None, cache_key
 
-    def run_task(self, initial_url, task_description, max_steps=7):
+    def _start_from_memory(self, initial_url, task_description):
+        """
+        Looks the task up in site memory.
+        :return: The URL to open first: a remembered deeper URL for this task, or initial_url.
+        """
+        self._route = self.site_memory.find(initial_url, task_description)
+        if not self._route:
+            return initial_url
+        jump = self._route['jump']
+        if not jump:
+            self._log(f"Site memory: following a remembered path of {self._route['replayable']} steps for this task.")
+            return initial_url
+        self._replay_step = jump
+        self._trajectory = [dict(step) for step in self._route['steps'][:jump]]
+        self.site_memory_stats['url_jump'] = jump
+        self.site_memory.count('url_jumps')
+        self._log(f"Site memory: opening a remembered URL directly, skipping {jump} steps.")
+        return self._route['jump_url']
+
+    def _finish_site_memory(self, initial_url, task_description, completed, llm_failed=False):
+        """
+        Remembers the trajectory of a completed task, or counts a failure of the route it followed.
+        :param llm_failed: The task ended on a failed LLM call; it is neither remembered nor held against the route.
+        """
+        if completed:
+            self.site_memory.record(initial_url, task_description, self._trajectory)
+            self.site_memory.count('llm_calls_saved', self.site_memory_stats['url_jump'])
+        elif llm_failed:
+            self._route = None
+        elif self._route:
+            self.site_memory.fail(self._route)
+            self._route = None
+        stats = self.site_memory_stats
+        if stats['url_jump'] or stats['replayed_steps'] or stats['hinted_prompts']:
+            self._log(f"Site memory: skipped {stats['url_jump']} steps by opening a remembered URL, replayed {stats['replayed_steps']} "
+                      f"steps without the LLM, hinted {stats['hinted_prompts']} prompts.")
+        totals = self.site_memory.snapshot()
+        self._log(f"Site memory (all tasks): hit rate {totals['hit_rate']:.0%} over {totals['lookups']} tasks, "
+                  f"{totals['llm_calls_saved']} LLM calls saved, {totals['invalidations']} routes invalidated.")
+
+    def _replay_from_memory(self, page_context):
+        """
+        The next step of the remembered route, if the current page is the one it was taken on.
+        :return: The action mapped onto the current page, or None after ending the replay.
+        """
+        step = self._route['steps'][self._replay_step]
+        action = None
+        if url_pattern(step['url']) == url_pattern(page_context.get('current_url')):
+            action = decode_action(step['record'], page_context)
+        if not action:
+            self._log(f"Site memory: the page differs from remembered step {self._replay_step + 1}; asking the LLM from here.")
+            self.site_memory.fail(self._route)
+            self._route = None
+            return None
+        self._replay_step += 1
+        self._log(f"Site memory: replaying remembered step {self._replay_step} of {self._route['replayable']} without asking the LLM.")
+        self._conversation = None # The LLM did not see this action
+        return action
+
+    def _remember_step(self, source, page_context, llm_response, outcome):
+        """
+        Adds an executed action to the trajectory kept for site memory.
+        :param page_context: The page the action was chosen on, or None if it is not known (plan steps).
+        """
+        if not self._trajectory_open or outcome not in ('continue', 'complete') or source == 'fast_path':
+            return # Fast-path clicks are made again whenever the banner or ad shows up
+        if llm_response.get('action') == 'task_complete':
+            record = {'action': 'task_complete', 'params': {}}
+        else:
+            record = encode_action(llm_response, page_context) if page_context else None
+        if record is None:
+            self._trajectory_open = False
+            return
+        self._trajectory.append({'url': page_context['current_url'] if page_context else self.driver.current_url, 'record': record})
+
+    def _plan_steps(self, llm_response):
+        """Normalizes an LLM response into a list of plan steps; a single action is a one-step plan."""
+        plan = llm_response.get('plan')
+        steps = [step for step in plan if isinstance(step, dict)] if isinstance(plan, list) else []
+        return steps or [llm_response]
+
+    def _resolve_plan_step(self, planned, page_context=None):
+        """
+        Turns a plan step into an executable action. Steps that name their element by 'target' text
+        (because it did not exist when the plan was made) are matched against a fresh page context.
+        :return: The action dictionary, or None if the target cannot be found.
+        """
+        params = dict(planned.get('params') or {})
+        target = params.pop('target', None)
+        if params.get('id') or not target:
+            return {'action': planned.get('action'), 'params': params}
+
+        if page_context is None:
+            page_context = self._get_page_context()
+        wanted = target.strip().lower()
+        matches = [
+            elem for elem in page_context['interactive_elements']
+            if any(wanted in str(elem.get(key, '')).lower() for key in ('text', 'aria_label', 'placeholder', 'name'))
+        ]
+        if not matches:
+            return None
+        # Prefer what the user can see, then document order
+        matches.sort(key=lambda elem: not elem.get('is_visible_in_viewport'))
+        params['id'] = matches[0]['id']
+        self._log(f"Plan target '{target}' resolved to {params['id']}.")
+        return {'action': planned.get('action'), 'params': params}
+
+    def _check_expectation(self, expect):
+        """
+        Checks a plan step's post-condition on the settled page.
+        :return: None if it holds, otherwise a description of what failed.
+        """
+        url_contains = expect.get('url_contains')
+        if url_contains and url_contains.lower() not in self.driver.current_url.lower():
+            return f"URL does not contain '{url_contains}'"
+        text_appears = expect.get('text_appears')
+        if text_appears:
+            found = self.driver.execute_script(
+                "return !!document.body && document.body.innerText.toLowerCase().indexOf(arguments[0]) !== -1;",
+                text_appears.lower()
+            )
+            if not found:
+                return f"text '{text_appears}' does not appear"
+        return None
+
+    def run_task(self, initial_url, task_description, max_steps=7, max_actions=None):
         """
         Runs the AI agent to complete a web-based task.
         :param initial_url: The starting URL for the task.
         :param task_description: A clear description of the task to perform.
-        :param max_steps: Maximum number of actions the agent can take to prevent infinite loops.
-        :return: A list of log messages from the task execution.
+        :param max_steps: Maximum number of LLM calls the agent can make to prevent infinite loops.
+        :param max_actions: Maximum number of actions executed, including plan steps and actions that did not
+                            need the LLM. Defaults to three times max_steps.
+        :return: A list of log messages from the task execution. task_completed tells whether the task was done.
         """
+        return _run_without_loop(self._run_task(initial_url, task_description, max_steps, max_actions))
+
+    async def _browser(self, func, *args):
+        """
+        Runs a blocking browser operation of the run loop. Called directly here; AsyncAIAgent runs it
+        on its driver's thread so the event loop stays free.
+        """
+        return func(*args)
+
+    async def _decide(self, page_context, task_description):
+        """Awaitable _decide_action for the run loop; AsyncAIAgent makes the LLM call without blocking."""
+        return self._decide_action(page_context, task_description)
+
+    async def _run_task(self, initial_url, task_description, max_steps, max_actions):
+        """
+        The step loop of run_task. Browser work and decisions go through the awaitable _browser and _decide
+        hooks; AIAgent's never suspend, so run_task completes this coroutine without an event loop.
+        """
+        if max_actions is None:
+            max_actions = max_steps * 3
         self.logs = [] # Clear logs for new task
+        self.settle_timings = []
+        self.prompt_stats = []
+        self.task_llm_calls = 0
+        self.task_completed = False
+        self.stream_stats = {'calls': 0, 'early': 0, 'first_token_seconds': 0.0, 'action_seconds': 0.0,
+                             'measured': 0, 'saved_seconds': 0.0, 'mismatches': 0}
+        self._served_cache_keys = set()
+        self._fast_path_clicked = set()
+        self.fast_path_stats = {'actions': 0, 'llm_calls_saved': 0, 'seconds_saved': 0.0}
+        self._route = None
+        self._replay_step = 0
+        self._trajectory = []
+        self._trajectory_open = True
+        self.site_memory_stats = {'url_jump': 0, 'replayed_steps': 0, 'hinted_prompts': 0}
+        self._raw_snapshot = None
+        self._conversation = None
+        self.incremental_stats = {'snapshots': 0, 'full_snapshots': 0, 'elements_reextracted': 0, 'elements_reused': 0,
+                                  'delta_prompts': 0, 'prompt_chars_full': 0, 'prompt_chars_sent': 0}
         if not self.driver:
             self._log("Agent cannot run task: WebDriver not initialized.")
             return self.logs
 
+        task_span = self.tracer.start_span(
+            'run_task', initial_url=initial_url, task=task_description, provider=str(self.llm_config.get('provider')),
+            model=str(self.llm_config.get('model')), snapshot_mode=self.snapshot_mode, plan_mode=self.plan_mode
+        )
+        step = 0
+        actions_taken = 0
+        completed = False
+        llm_failed = False
         try:
-            self.driver.get(initial_url)
-            self._log(f"Starting task: '{task_description}' on {initial_url}")
+            await self._browser(self.settle_waiter.install)
+            if self.resource_blocker and await self._browser(self.resource_blocker.install):
+                blocked = [category for category in self.browser_profile['block'] if category not in self.resource_allowlist]
+                self._log(f"Blocking {', '.join(blocked)}"
+                          + (f" (allowed for this task: {', '.join(self.resource_allowlist)})." if self.resource_allowlist else "."))
+            start_url = self._start_from_memory(initial_url, task_description) if self.site_memory else initial_url
+            with self.tracer.start_span('navigate', url=start_url):
+                await self._browser(self.driver.get, start_url)
+            self._log(f"Starting task: '{task_description}' on {start_url}")
 
-            for step in range(max_steps):
-                self._log(f"\n--- Step {step + 1} ---")
-                self._log(f"Current URL: {self.driver.current_url}")
+            pending_plan = [] # Remaining steps of the current LLM plan
+            expectation = None # Post-condition of the last executed plan step
+            while True:
+                if self.cancel_event.is_set():
+                    self._log("Task cancelled.")
+                    break
+                if actions_taken >= max_actions:
+                    self._log(f"Max actions ({max_actions}) reached. Task not fully completed.")
+                    break
+                if not pending_plan and self.task_llm_calls >= max_steps:
+                    self._log(f"Max steps ({max_steps}) reached. Task not fully completed.")
+                    break
+                step += 1
+                self._log(f"\n--- Step {step} ---")
+                self._log(f"Current URL: {await self._browser(lambda: self.driver.current_url)}")
 
-                WebDriverWait(self.driver, 10).until(
-                    EC.presence_of_element_located((By.TAG_NAME, "body"))
-                )
+                await self._browser(self._wait_for_settle, f"step {step}")
 
-                page_context = self._get_page_context()
-                self._log("Page context extracted for LLM.")
-                
-                llm_response = self._get_llm_action(page_context, task_description)
-                self._log(f"LLM Action: {llm_response.get('action')}, Params: {llm_response.get('params')}")
+                if expectation:
+                    with self.tracer.start_span('plan_check', step=step):
+                        failure = await self._browser(self._check_expectation, expectation)
+                    expectation = None
+                    if failure:
+                        self._log(f"Plan check failed: {failure}. Dropping the {len(pending_plan)} remaining plan steps.")
+                        pending_plan = []
 
-                action = llm_response.get('action')
-                params = llm_response.get('params', {})
-
-                if action == "navigate_to":
-                    url = params.get("url")
-                    if url:
-                        self._log(f"Navigating to: {url}")
-                        self.driver.get(url)
-                    else:
-                        self._log("Error: 'navigate_to' action missing 'url' parameter. Terminating.")
-                        break
-                elif action == "click_element":
-                    element_llm_id = params.get("id")
-                    if element_llm_id:
-                        try:
-                            element = WebDriverWait(self.driver, 10).until(
-                                EC.element_to_be_clickable((By.CSS_SELECTOR, f"[data-llm-id='{element_llm_id}']"))
-                            )
-                            self._log(f"Attempting to click element with data-llm-id: {element_llm_id}")
-                            element.click()
-                        except selenium.common.exceptions.ElementClickInterceptedException as e:
-                            self._log(f"Error clicking element with data-llm-id '{element_llm_id}': {e}. This often means an overlay (like cookie consent) is blocking the click. Re-evaluating page context.")
-                            time.sleep(2)
-                            continue
-                        except Exception as e:
-                            self._log(f"Error clicking element with data-llm-id '{element_llm_id}': {e}. Terminating.")
-                            break
-                    else:
-                        self._log("Error: 'click_element' action missing 'id' parameter. Terminating.")
-                        break
-                elif action == "type_text":
-                    element_llm_id = params.get("id")
-                    text_to_type = params.get("text")
-                    if element_llm_id and text_to_type is not None:
-                        try:
-                            element = WebDriverWait(self.driver, 10).until(
-                                EC.presence_of_element_located((By.CSS_SELECTOR, f"[data-llm-id='{element_llm_id}']"))
-                            )
-                            self._log(f"Typing '{text_to_type}' into element with data-llm-id: {element_llm_id}")
-                            element.clear()
-                            element.send_keys(text_to_type)
-                            element.send_keys(Keys.RETURN) 
-                        except Exception as e:
-                            self._log(f"Error typing into element with data-llm-id '{element_llm_id}': {e}. Terminating.")
-                            break
-                    else:
-                        self._log("Error: 'type_text' action missing 'id' or 'text' parameter. Terminating.")
-                        break
-                elif action == "task_complete":
-                    self._log(f"Task completed successfully: {params.get('message', 'No message provided.')}")
-                    break
+                if pending_plan:
+                    planned = pending_plan.pop(0)
+                    llm_response = await self._browser(self._resolve_plan_step, planned)
+                    if not llm_response:
+                        self._log(f"Plan target '{planned.get('params', {}).get('target')}' not found on the page. Asking the LLM again.")
+                        pending_plan = []
+                        continue
+                    source, cache_key = 'plan', None
                 else:
-                    self._log(f"Unknown action received from LLM: '{action}'. Terminating.")
-                    break
-                
-                time.sleep(2)
+                    with self.tracer.start_span('page_context', step=step) as span:
+                        page_context = await self._browser(self._get_page_context)
+                        span.set_attributes(url=page_context['current_url'], elements=len(page_context['interactive_elements']))
+                    self._log("Page context extracted for LLM.")
 
-            else:
-                self._log(f"Max steps ({max_steps}) reached. Task not fully completed.")
+                    with self.tracer.start_span('decide', step=step) as span:
+                        llm_response, source, cache_key = await self._decide(page_context, task_description)
+                        span.set_attribute('source', source)
+                    plan = self._plan_steps(llm_response)
+                    if len(plan) > 1:
+                        self._log(f"LLM returned a plan of {len(plan)} actions.")
+                    planned, pending_plan = plan[0], plan[1:]
+                    llm_response = self._resolve_plan_step(planned, page_context)
+                    if not llm_response:
+                        self._log(f"Plan target '{planned.get('params', {}).get('target')}' not found on the page. Asking the LLM again.")
+                        pending_plan = []
+                        continue
+
+                source_label = {'llm': 'LLM', 'cache': 'Cached', 'fast_path': 'Fast-path', 'plan': 'Planned', 'memory': 'Remembered'}[source]
+                self._log(f"{source_label} Action: {llm_response.get('action')}, Params: {llm_response.get('params')}")
+
+                action = llm_response.get('action')
+                # Unknown actions share one span name so they cannot grow the metrics without bound
+                span_name = 'action.' + (action if action in ACTION_PROPERTIES['action']['enum'] else 'unknown')
+                with self.tracer.start_span(span_name, step=step, source=source) as span:
+                    outcome = await self._browser(self._execute_action, action, llm_response.get('params', {}))
+                    span.set_attribute('outcome', outcome)
+                    if outcome == 'stop':
+                        span.set_status(STATUS_ERROR)
+                actions_taken += 1
+                expectation = planned.get('expect') if source in ('llm', 'plan') and isinstance(planned.get('expect'), dict) else None
+                if source == 'fast_path':
+                    self.fast_path_stats['actions'] += 1
+                    if outcome == 'continue':
+                        self.fast_path_stats['llm_calls_saved'] += 1
+                        self.fast_path_stats['seconds_saved'] += self._estimated_llm_seconds()
+                if source == 'memory' and outcome == 'continue':
+                    self.site_memory_stats['replayed_steps'] += 1
+                    self.site_memory.count('replayed_steps')
+                    self.site_memory.count('llm_calls_saved')
+                if self.site_memory:
+                    await self._browser(self._remember_step, source, None if source == 'plan' else page_context, llm_response, outcome)
+                if outcome != 'continue' and pending_plan:
+                    self._log(f"Dropping the {len(pending_plan)} remaining plan steps.")
+                    pending_plan = []
+                if outcome == 'stop' and source in ('cache', 'fast_path', 'memory', 'plan'):
+                    if cache_key:
+                        self.decision_cache.invalidate(cache_key)
+                    if source == 'memory':
+                        self.site_memory.fail(self._route)
+                        self._route = None
+                    self._log(f"Action from the {source.replace('_', ' ').replace('memory', 'site memory')} failed; asking the LLM instead.")
+                    continue
+                # A failed LLM call ends the task with a task_complete flagged 'error', which is not a success
+                llm_failed = source == 'llm' and bool(llm_response.get('params', {}).get('error'))
+                completed = outcome == 'complete'
+                if outcome in ('complete', 'stop'):
+                    break
             
         except Exception as e:
             self._log(f"An unexpected error occurred during task execution: {e}")
+            task_span.set_status(STATUS_ERROR, str(e))
         finally:
-            if hasattr(self, 'driver') and self.driver:
-                self.driver.quit()
+            if self._stream_drains:
+                await self._browser(self._wait_for_stream_drains)
+            self.task_completed = completed
+            task_span.set_attributes(steps=step, actions=actions_taken, llm_calls=self.task_llm_calls, completed=completed)
+            task_span.end()
+            self._log(f"Task used {self.task_llm_calls} LLM calls.")
+            stages = task_span.stage_totals()
+            self._log(f"Task took {task_span.seconds:.2f}s. Time by stage: " +
+                      ", ".join(f"{name} {entry['seconds']:.2f}s ({entry['count']}x)" for name, entry in stages.items()))
+            if self.settle_timings:
+                total_wait = sum(result.seconds for result in self.settle_timings)
+                self._log(f"Waited {total_wait:.2f}s in total for pages to settle over {len(self.settle_timings)} waits.")
+            if self.fast_path_stats['actions']:
+                self._log(f"Fast path: {self.fast_path_stats['actions']} actions without the LLM, "
+                          f"saved {self.fast_path_stats['llm_calls_saved']} LLM calls (~{self.fast_path_stats['seconds_saved']:.1f}s).")
+            if self.stream_stats['calls']:
+                stats = self.stream_stats
+                message = (f"LLM streaming: {stats['calls']} calls, first token after {stats['first_token_seconds'] / stats['calls']:.2f}s "
+                           f"and action after {stats['action_seconds'] / stats['calls']:.2f}s on average; {stats['early']} acted on early")
+                if stats['measured']:
+                    message += (f", saving {stats['saved_seconds']:.2f}s in total "
+                                f"({stats['saved_seconds'] / stats['measured']:.2f}s per measured call, {stats['mismatches']} mismatches)")
+                self._log(message + ".")
+            if self.site_memory:
+                self._finish_site_memory(initial_url, task_description, completed, llm_failed)
+            if self.incremental_stats['delta_prompts']:
+                stats = self.incremental_stats
+                self._log(f"Incremental context: {stats['elements_reused']} elements reused, {stats['elements_reextracted']} re-extracted; "
+                          f"{stats['delta_prompts']} delta prompts sent {stats['prompt_chars_sent']} new chars instead of {stats['prompt_chars_full']}.")
+            if self.decision_cache:
+                stats = self.decision_cache.snapshot()
+                self._log(f"Decision cache (all tasks): {stats['hits']} hits, {stats['misses']} misses (hit rate {stats['hit_rate']:.0%}).")
+            if hasattr(self, 'driver') and self.driver and self.owns_driver:
+                await self._browser(self.driver.quit)
                 self._log("Selenium WebDriver quit.")
+            elif self.driver:
+                await self._browser(self.settle_waiter.uninstall)
+                if self.resource_blocker:
+                    await self._browser(self.resource_blocker.uninstall)
             return self.logs
 
+
+def _run_without_loop(coroutine):
+    """Runs a coroutine that never suspends to completion and returns its result."""
+    try:
+        coroutine.send(None)
+    except StopIteration as finished:
+        return finished.value
+    coroutine.close()
+    raise RuntimeError("The agent's run loop suspended; run AsyncAIAgent tasks on an event loop.")
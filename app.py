@@ -1,5 +1,15 @@
-from flask import Flask, render_template, request, jsonify
-from agent import AIAgent # Ensure agent.py is in the same directoryi
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
+from agent import AIAgent, create_driver # Ensure agent.py is in the same directoryi
+from batch_runner import BatchRunner
+from browser_pool import BrowserPool, PoolExhaustedError
+from jobs import JobManager, JobQueueFullError
+from llm_client import LLMClient, get_llm_client, set_llm_client
+from decision_cache import DecisionCache
+from fast_path import FastPathPolicy
+from site_memory import SiteMemory
+from tracing import JsonLinesExporter, Tracer, set_tracer
+import atexit
+import json
 import os
 
 app = Flask(__name__)
@@ -10,26 +20,134 @@ app = Flask(__name__)
 # If ChromeDriver is in your system's PATH, you can leave this as None.
 CHROME_DRIVER_PATH = None 
 
+# --- Browser pool ---
+# Tasks lease a warm headless Chrome from the pool instead of launching one per request.
+BROWSER_POOL_SIZE = 2 # Maximum number of Chrome processes
+BROWSER_POOL_MAX_TASKS_PER_SESSION = 20 # Recycle a browser after this many tasks
+BROWSER_POOL_ACQUIRE_TIMEOUT = 120 # Seconds a request waits for a free browser
+BROWSER_POOL_MAX_WAITING = 8 # Requests allowed to queue before new ones are rejected
+BROWSER_PROFILE = 'default' # 'lean' blocks images, media, fonts and trackers and returns at DOMContentLoaded (see browser_profile.py)
+
+browser_pool = BrowserPool(
+    driver_factory=lambda: create_driver(CHROME_DRIVER_PATH, headless=True, profile=BROWSER_PROFILE),
+    size=BROWSER_POOL_SIZE,
+    max_tasks_per_session=BROWSER_POOL_MAX_TASKS_PER_SESSION,
+    acquire_timeout=BROWSER_POOL_ACQUIRE_TIMEOUT,
+    max_waiting=BROWSER_POOL_MAX_WAITING
+)
+atexit.register(browser_pool.close)
+
+# --- LLM provider client ---
+# Shared by every agent: pooled keep-alive connections, timeouts, retries and per-provider limits.
+LLM_CONNECT_TIMEOUT = 5 # Seconds
+LLM_READ_TIMEOUT = 60 # Seconds
+LLM_MAX_RETRIES = 3 # Retries on connection errors, 429 and 5xx
+LLM_PROVIDER_LIMITS = {
+    # 'max_concurrency': calls in flight at once, 'requests_per_second': token-bucket rate (None = unlimited)
+    'gemini': {'max_concurrency': 8, 'requests_per_second': None},
+    'openai': {'max_concurrency': 8, 'requests_per_second': None}
+}
+
+set_llm_client(LLMClient(
+    connect_timeout=LLM_CONNECT_TIMEOUT,
+    read_timeout=LLM_READ_TIMEOUT,
+    max_retries=LLM_MAX_RETRIES,
+    provider_limits=LLM_PROVIDER_LIMITS
+))
+
+# --- Tracing ---
+# Every task records timing spans per stage; /metrics serves p50/p95 per stage.
+TRACE_EXPORT_PATH = None # e.g. 'traces.jsonl' to append every finished task trace to a file
+TRACE_EXPORT_FORMAT = 'jsonl' # 'jsonl' (one span per line) or 'otlp' (OpenTelemetry OTLP/JSON, one trace per line)
+
+tracer = Tracer(exporters=[JsonLinesExporter(TRACE_EXPORT_PATH, format=TRACE_EXPORT_FORMAT)] if TRACE_EXPORT_PATH else [])
+set_tracer(tracer)
+
+# --- Agent behaviour ---
+AGENT_PLAN_MODE = False # Let the LLM return several actions per call, checked locally between steps
+AGENT_TEXT_MODE = 'parser' # 'parser' reads page_source with a streaming parser, 'browser' collects the text in Chrome
+AGENT_STREAM_MODE = 'off' # 'early' streams LLM responses and acts before they end, 'measure' also logs the time saved
+
+# --- Decision cache ---
+# Reuses LLM decisions when the same task meets a structurally identical page again.
+# One cache serves every request, whatever its API key, so a decision made for one user can be
+# replayed in another user's task. Only enable it when all callers may share decisions.
+DECISION_CACHE_ENABLED = False
+DECISION_CACHE_MAX_ENTRIES = 5000
+DECISION_CACHE_TTL = 24 * 3600 # Seconds
+DECISION_CACHE_PATH = None # e.g. 'decision_cache.sqlite3' to keep decisions across restarts
+
+decision_cache = DecisionCache(
+    max_entries=DECISION_CACHE_MAX_ENTRIES,
+    ttl_seconds=DECISION_CACHE_TTL,
+    sqlite_path=DECISION_CACHE_PATH
+) if DECISION_CACHE_ENABLED else None
+
+# --- Fast path ---
+# Clicks unambiguous cookie-consent and skip-ad buttons without an LLM call.
+FAST_PATH_ENABLED = True
+FAST_PATH_CONFIDENCE = 0.85 # 0-1; lower clicks more often without asking the LLM
+FAST_PATH_SITE_RULES = {
+    # 'example.com': {'enabled': False},
+    # 'news.example.org': {'consent_labels': ['yes, continue'], 'confidence_threshold': 0.9},
+}
+
+fast_path = FastPathPolicy(
+    confidence_threshold=FAST_PATH_CONFIDENCE,
+    site_rules=FAST_PATH_SITE_RULES
+) if FAST_PATH_ENABLED else None
+
+# --- Site memory ---
+# Remembers how tasks were completed per site; similar tasks open remembered URLs and replay steps without the LLM.
+# The memory is shared by every request, whatever its API key, and keeps the text tasks typed and the URLs it led
+# to, so one user's searches can be replayed or hinted in another user's task. Only enable it when all callers
+# may share them.
+SITE_MEMORY_ENABLED = False
+SITE_MEMORY_MAX_SITES = 500
+SITE_MEMORY_MAX_FAILURES = 2 # Failed replays in a row before a remembered path is dropped
+SITE_MEMORY_PATH = None # e.g. 'site_memory.sqlite3' to remember across restarts
+
+site_memory = SiteMemory(
+    max_sites=SITE_MEMORY_MAX_SITES,
+    max_failures=SITE_MEMORY_MAX_FAILURES,
+    sqlite_path=SITE_MEMORY_PATH
+) if SITE_MEMORY_ENABLED else None
+
+# --- Background jobs ---
+JOB_WORKERS = BROWSER_POOL_SIZE # Jobs running at once; more than the pool size would only wait for a browser
+JOB_MAX_PENDING = 20 # Queued + running jobs accepted before POST /jobs answers 503
+JOB_STREAM_KEEPALIVE = 15 # Seconds between keep-alive comments on idle event streams
+
+# --- Batches ---
+# POST /batches runs several tasks as one job, each in its own tab (and browser context) of one pooled browser.
+BATCH_TABS_PER_BROWSER = 4 # Tasks of a batch running at once; they interleave while others wait for the LLM
+BATCH_MAX_TASKS = 50 # Tasks accepted in one batch
+
 @app.route('/')
 def index():
     """Renders the main web interface."""
     return render_template('index.html')
 
-@app.route('/run_agent', methods=['POST'])
-def run_agent_task():
-    """Handles the form submission to run the AI agent."""
-    data = request.json
-    
+def parse_task_request(data):
+    """
+    Reads the task fields posted by the web interface.
+    Returns a dictionary with 'llm_config', 'initial_url', 'task_description' and 'allow_resources', or None if a
+    field is missing. 'allow_resources' lists blocked resource categories the task needs anyway, e.g. ["media"].
+    """
+    data = data or {}
     api_key = data.get('api_key')
     llm_provider = data.get('llm_provider')
     llm_model = data.get('llm_model')
     temperature = float(data.get('temperature', 0.7)) # Convert to float
     initial_url = data.get('initial_url')
     task_description = data.get('task_description')
+    allow_resources = data.get('allow_resources') or []
 
     # Basic validation
     if not api_key or not llm_provider or not llm_model or not initial_url or not task_description:
-        return jsonify({"status": "error", "logs": ["Missing required fields. Please fill all inputs."]})
+        return None
+    if not isinstance(allow_resources, list) or not all(isinstance(item, str) for item in allow_resources):
+        return None
 
     llm_config = {
         'provider': llm_provider,
@@ -37,19 +155,184 @@ def run_agent_task():
         'api_key': api_key,
         'temperature': temperature
     }
+    return {'llm_config': llm_config, 'initial_url': initial_url, 'task_description': task_description,
+            'allow_resources': allow_resources}
 
-    # Initialize and run the agent
-    # The AIAgent class now takes llm_config directly
-    agent = AIAgent(driver_path=CHROME_DRIVER_PATH, llm_config=llm_config)
-    
-    # Run the task and get logs
-    logs = agent.run_task(initial_url, task_description)
+def parse_batch_request(data):
+    """
+    Reads a batch: the LLM fields of a task request plus 'tasks', a list of {'initial_url', 'task_description'}.
+    Returns a dictionary with 'llm_config' and 'tasks', or None if a field is missing.
+    """
+    data = data or {}
+    tasks = data.get('tasks')
+    if not isinstance(tasks, list) or not tasks or len(tasks) > BATCH_MAX_TASKS:
+        return None
+    parsed = [parse_task_request(dict(data, **task)) if isinstance(task, dict) else None for task in tasks]
+    if not all(parsed):
+        return None
+    return {
+        'llm_config': parsed[0]['llm_config'],
+        'tasks': [{'initial_url': task['initial_url'], 'task_description': task['task_description'],
+                   'allow_resources': task['allow_resources']} for task in parsed]
+    }
+
+def build_agent(params, driver, **kwargs):
+    """Creates an agent for a parsed task request on a leased browser, with the shared caches and policies."""
+    return AIAgent(
+        llm_config=params['llm_config'],
+        driver=driver,
+        decision_cache=decision_cache,
+        fast_path=fast_path,
+        site_memory=site_memory,
+        plan_mode=AGENT_PLAN_MODE,
+        text_mode=AGENT_TEXT_MODE,
+        stream_mode=AGENT_STREAM_MODE,
+        browser_profile=BROWSER_PROFILE,
+        **kwargs
+    )
+
+def run_agent_job(job):
+    """Runs one queued job on a pooled browser, streaming its logs into the job."""
+    params = job.params
+    if 'tasks' in params:
+        run_batch_job(job)
+        return
+    with browser_pool.lease() as driver:
+        agent = build_agent(params, driver, on_log=job.add_log, cancel_event=job.cancel_event,
+                            resource_allowlist=params['allow_resources'])
+        agent.run_task(params['initial_url'], params['task_description'])
+
+def run_batch_job(job):
+    """Runs the tasks of a batch job in tabs of one pooled browser; log lines are prefixed with the task number."""
+    params = job.params
+
+    def agent_factory(driver, task):
+        on_log = lambda message: job.add_log(f"[{task['index']}] {message}")
+        return build_agent(params, driver, on_log=on_log, cancel_event=job.cancel_event,
+                           resource_allowlist=task['allow_resources'])
+
+    def on_result(result):
+        job.add_log(f"[{result['index']}] Task {result['status']} in {result['seconds']:.1f}s.")
+
+    with browser_pool.lease() as driver:
+        runner = BatchRunner([driver], agent_factory, tabs_per_browser=BATCH_TABS_PER_BROWSER)
+        results = runner.run(params['tasks'], cancel_event=job.cancel_event, on_result=on_result)
+    completed = sum(result['status'] == 'completed' for result in results)
+    job.add_log(f"Batch finished: {completed} of {len(results)} tasks completed, "
+                f"{runner.stats['tasks_per_minute']:.1f} tasks/minute.")
+
+job_manager = JobManager(runner=run_agent_job, max_workers=JOB_WORKERS, max_pending=JOB_MAX_PENDING)
+atexit.register(job_manager.shutdown)
+
+@app.route('/run_agent', methods=['POST'])
+def run_agent_task():
+    """Handles the form submission to run the AI agent."""
+    params = parse_task_request(request.json)
+    if not params:
+        return jsonify({"status": "error", "logs": ["Missing required fields. Please fill all inputs."]})
+
+    # Lease a browser from the pool, then initialize and run the agent on it
+    try:
+        with browser_pool.lease() as driver:
+            agent = build_agent(params, driver, resource_allowlist=params['allow_resources'])
+            logs = agent.run_task(params['initial_url'], params['task_description'])
+    except PoolExhaustedError as e:
+        return jsonify({"status": "error", "logs": [f"Server busy: {e}"]}), 503
     
     return jsonify({"status": "completed", "logs": logs})
 
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Queues an agent task and returns its job id right away."""
+    params = parse_task_request(request.json)
+    if not params:
+        return jsonify({"status": "error", "logs": ["Missing required fields. Please fill all inputs."]}), 400
+    try:
+        job = job_manager.submit(params)
+    except JobQueueFullError as e:
+        return jsonify({"status": "error", "logs": [f"Server busy: {e}"]}), 503
+    return jsonify(job.to_dict()), 202
+
+@app.route('/batches', methods=['POST'])
+def create_batch():
+    """Queues several agent tasks as one job that runs them side by side in tabs of one browser."""
+    params = parse_batch_request(request.json)
+    if not params:
+        return jsonify({"status": "error", "logs": [f"Missing required fields or no 'tasks' (at most {BATCH_MAX_TASKS})."]}), 400
+    try:
+        job = job_manager.submit(params)
+    except JobQueueFullError as e:
+        return jsonify({"status": "error", "logs": [f"Server busy: {e}"]}), 503
+    return jsonify(job.to_dict()), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Returns the status and logs of a job."""
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({"status": "error", "logs": [f"Unknown job: {job_id}"]}), 404
+    return jsonify(job.to_dict(include_logs=True))
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancels a queued or running job."""
+    if not job_manager.cancel(job_id):
+        return jsonify({"status": "error", "logs": [f"Job {job_id} does not exist or has already finished."]}), 409
+    return jsonify(job_manager.get(job_id).to_dict())
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def stream_job_events(job_id):
+    """
+    Server-Sent Events stream of a job's log lines. Each line is sent as soon as the agent logs it;
+    a final 'end' event carries the job status. Reconnecting clients resume from Last-Event-ID.
+    """
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({"status": "error", "logs": [f"Unknown job: {job_id}"]}), 404
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID', -1))
+    except ValueError:
+        last_event_id = -1 # Not an id this endpoint sent; replay from the start
+    start = max(last_event_id, -1) + 1
+
+    def generate():
+        index = start
+        while True:
+            lines, finished = job.wait_for_logs(index, timeout=JOB_STREAM_KEEPALIVE)
+            for line in lines:
+                yield f"id: {index}\ndata: {json.dumps(line)}\n\n"
+                index += 1
+            if finished and not lines:
+                yield f"event: end\ndata: {json.dumps(job.to_dict())}\n\n"
+                return
+            if not lines:
+                yield ": keep-alive\n\n"
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Latency of every agent stage (p50/p95, count, sum) in Prometheus text format.
+    With ?format=json, also returns the browser pool, LLM client, decision cache and site memory counters.
+    """
+    if request.args.get('format') == 'json':
+        return jsonify({
+            "stages": tracer.metrics.snapshot(),
+            "browser_pool": browser_pool.snapshot(),
+            "llm": get_llm_client().snapshot(),
+            "decision_cache": decision_cache.snapshot() if decision_cache else None,
+            "site_memory": site_memory.snapshot() if site_memory else None
+        })
+    return Response(tracer.metrics.to_prometheus(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     # Create the 'templates' directory if it doesn't exist
     # This ensures render_template can find index.html
     if not os.path.exists('templates'):
         os.makedirs('templates')
+    # With debug=True the reloader runs this block in a watcher process too; only warm the serving one.
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        browser_pool.warm()
     app.run(debug=True) # debug=True allows auto-reloading and better error messages
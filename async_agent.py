@@ -0,0 +1,202 @@
+"""
+Asyncio variant of AIAgent, for running many agents on one event loop.
+
+AsyncAIAgent runs AIAgent's step loop, but hands WebDriver work to a DriverBridge thread and makes
+LLM calls through AsyncLLMClient, so an agent waiting for the LLM holds no thread. While its LLM
+call is in flight the agent prefetches what the next action needs from the browser: references to
+the elements offered in the prompt (so click_element and type_text skip the lookup) and
+dns-prefetch/preconnect hints for the origins of the links it may follow next.
+"""
+import asyncio
+import contextvars
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import selenium
+
+from agent import AIAgent
+from llm_client import AsyncLLMClient, get_async_llm_client
+from tracing import STATUS_ERROR
+
+# Returns the elements with the given data-llm-ids and adds connection hints for their link origins
+PREFETCH_SCRIPT = """
+const ids = arguments[0], maxOrigins = arguments[1];
+const wanted = new Set(ids), byId = {};
+for (const el of document.querySelectorAll('[data-llm-id]')) {
+    const id = el.getAttribute('data-llm-id');
+    if (wanted.has(id)) byId[id] = el;
+}
+const warmed = window.__llmWarmedOrigins = window.__llmWarmedOrigins || new Set();
+const origins = [];
+for (const id of ids) {
+    const el = byId[id];
+    if (origins.length >= maxOrigins) break;
+    if (!el || el.tagName !== 'A' || !el.href) continue;
+    let origin;
+    try { origin = new URL(el.href).origin; } catch (e) { continue; }
+    if (!/^https?:/.test(origin) || origin === location.origin || warmed.has(origin)) continue;
+    warmed.add(origin);
+    origins.push(origin);
+}
+const head = document.head || document.documentElement;
+for (const origin of origins) {
+    for (const rel of ['dns-prefetch', 'preconnect']) {
+        const link = document.createElement('link');
+        link.rel = rel;
+        link.href = origin;
+        head.appendChild(link);
+    }
+}
+return {elements: byId, origins: origins};
+"""
+
+
+class DriverBridge:
+    def __init__(self, driver):
+        """
+        Runs the WebDriver calls of one driver on a dedicated thread, one at a time.
+        :param driver: A Selenium WebDriver.
+        """
+        self.driver = driver
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='driver-bridge')
+
+    async def call(self, func, *args):
+        """Runs func(*args) on the bridge thread and returns its result. Tracing spans it opens nest under the caller's."""
+        context = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(context.run, func, *args))
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class AsyncAIAgent(AIAgent):
+    def __init__(self, *args, async_llm_client=None, prefetch=True, prefetch_origins=4, **kwargs):
+        """
+        Takes AIAgent's arguments, plus:
+        :param async_llm_client: AsyncLLMClient for provider calls. Defaults to the process-wide one, or to one
+                                 using the given llm_client.
+        :param prefetch: Fetch element references and warm up link origins while the LLM call is in flight.
+        :param prefetch_origins: Most link origins warmed up per LLM call.
+        """
+        super().__init__(*args, **kwargs)
+        if async_llm_client:
+            self.async_llm_client = async_llm_client
+        elif kwargs.get('llm_client'):
+            self.async_llm_client = AsyncLLMClient(kwargs['llm_client'])
+        else:
+            self.async_llm_client = get_async_llm_client()
+        self.prefetch = prefetch
+        self.prefetch_origins = prefetch_origins
+        self.bridge = DriverBridge(self.driver) if self.driver else None
+        self._prefetched_elements = {} # data-llm-id -> WebElement, valid for the action of the last LLM call only
+        self.prefetch_stats = {'prefetches': 0, 'elements_used': 0, 'origins_warmed': 0, 'seconds': 0.0}
+
+    async def run_task_async(self, initial_url, task_description, max_steps=7, max_actions=None):
+        """
+        Coroutine version of run_task; any number of agents can run on one event loop.
+        :return: A list of log messages from the task execution.
+        """
+        self.prefetch_stats = {'prefetches': 0, 'elements_used': 0, 'origins_warmed': 0, 'seconds': 0.0}
+        try:
+            logs = await self._run_task(initial_url, task_description, max_steps, max_actions)
+        finally:
+            if self.bridge and self.owns_driver:
+                self.bridge.close()
+        stats = self.prefetch_stats
+        if stats['prefetches']:
+            self._log(f"Prefetch during LLM calls: {stats['prefetches']} prefetches in {stats['seconds']:.2f}s, "
+                      f"{stats['elements_used']} element lookups saved, {stats['origins_warmed']} origins warmed up.")
+        return logs
+
+    def run_task(self, initial_url, task_description, max_steps=7, max_actions=None):
+        """
+        Synchronous wrapper of run_task_async. Called from a thread with a running event loop (e.g. a notebook or
+        an async web handler), the task gets its own loop on a worker thread and the calling thread, with its loop,
+        blocks until it is done; coroutines should await run_task_async instead.
+        """
+        async def run():
+            try:
+                return await self.run_task_async(initial_url, task_description, max_steps, max_actions)
+            finally:
+                await self.async_llm_client.aclose() # The loop is closed after this task
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(run())
+        context = contextvars.copy_context()
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='agent-task') as executor:
+            return executor.submit(context.run, asyncio.run, run()).result()
+
+    async def _browser(self, func, *args):
+        if self.bridge is None:
+            return func(*args)
+        return await self.bridge.call(func, *args)
+
+    async def _decide(self, page_context, task_description):
+        self._prefetched_elements = {}
+        decision, cache_key = self._decide_without_llm(page_context, task_description)
+        if decision:
+            return decision
+
+        messages = self._llm_messages(page_context, task_description)
+        prefetch = asyncio.create_task(self._prefetch(self._prompt_element_ids)) if self.prefetch and self.bridge else None
+        start = time.monotonic()
+        llm_response = await self._call_llm_async(messages)
+        self._record_llm_response(llm_response, time.monotonic() - start)
+        if prefetch:
+            await prefetch
+        if cache_key:
+            self.decision_cache.store(cache_key, llm_response, page_context)
+        return llm_response, 'llm', None
+
+    async def _call_llm_async(self, prompt):
+        """_call_llm on the event loop. Streamed responses are read in a worker thread."""
+        if self.stream_mode != 'off':
+            return await asyncio.to_thread(self._call_llm_streaming, prompt)
+        provider, api_url, headers, payload, span = self._start_llm_call(prompt)
+        response = None
+        try:
+            response = await self.async_llm_client.post_json(provider, api_url, headers, payload)
+            return self._read_llm_response(provider, response, span)
+        except Exception as e:
+            return self._llm_call_failed(provider, e, response, span)
+        finally:
+            span.end()
+
+    async def _prefetch(self, element_ids):
+        """Runs on the bridge while the LLM call is in flight. Failures only cost the lookups it would have saved."""
+        with self.tracer.start_span('prefetch', elements=len(element_ids)) as span:
+            start = time.monotonic()
+            try:
+                result = await self.bridge.call(self.driver.execute_script, PREFETCH_SCRIPT, element_ids, self.prefetch_origins)
+            except Exception as e:
+                span.set_status(STATUS_ERROR, str(e))
+                return
+            finally:
+                self.prefetch_stats['seconds'] += time.monotonic() - start
+            result = result or {}
+            self._prefetched_elements = result.get('elements') or {}
+            origins = result.get('origins') or []
+            span.set_attributes(elements_found=len(self._prefetched_elements), origins=len(origins))
+        self.prefetch_stats['prefetches'] += 1
+        self.prefetch_stats['origins_warmed'] += len(origins)
+
+    def _execute_action(self, action, params):
+        try:
+            return super()._execute_action(action, params)
+        finally:
+            self._prefetched_elements = {}
+
+    def _wait_for_element(self, element_llm_id, clickable=False):
+        element = self._prefetched_elements.pop(element_llm_id, None)
+        if element is not None:
+            try:
+                if not clickable or (element.is_displayed() and element.is_enabled()):
+                    self.prefetch_stats['elements_used'] += 1
+                    return element
+            except selenium.common.exceptions.StaleElementReferenceException:
+                pass
+        return super()._wait_for_element(element_llm_id, clickable)
@@ -0,0 +1,212 @@
+"""
+Runs several agent tasks at once in the tabs of one browser.
+
+A Chrome process costs hundreds of MB, while an agent spends most of a task waiting for the LLM.
+TabbedDriver lets several threads share one WebDriver: each thread is bound to its own tab (in its
+own browser context, so cookies and storage are isolated), and every WebDriver command switches to
+the calling thread's tab under a lock first. Commands of different tasks interleave, and a task
+waiting for its LLM call or for its page to settle leaves the browser to the others.
+
+Page loads hold the lock until the load strategy is satisfied, so drivers created with
+page_load_strategy 'eager' interleave better.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from selenium.webdriver.remote.command import Command
+
+
+class TabbedDriver:
+    def __init__(self, driver, isolation='context'):
+        """
+        Wraps driver.execute so the driver can be shared by threads; call detach() to undo it.
+        :param driver: A Selenium WebDriver for Chrome.
+        :param isolation: 'context' opens every tab in a new browser context (separate cookies and storage),
+                          'window' opens plain windows sharing the profile. 'context' falls back to 'window'
+                          when the driver does not support it.
+        """
+        self.driver = driver
+        self.isolation = isolation
+        self.stats = {'tabs': 0, 'commands': 0, 'switches': 0, 'lock_wait_seconds': 0.0}
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._current = None # Window handle WebDriver commands currently go to
+        self._contexts = {} # Window handle -> browser context id
+        self._execute = driver.execute
+        driver.execute = self._shared_execute
+
+    def detach(self):
+        """Restores the driver's own execute method and switches back to its first window."""
+        self.driver.execute = self._execute
+        try:
+            self.driver.switch_to.window(self.driver.window_handles[0])
+        except Exception:
+            pass
+
+    def _shared_execute(self, driver_command, params=None):
+        handle = getattr(self._local, 'handle', None)
+        start = time.perf_counter()
+        with self._lock:
+            self.stats['lock_wait_seconds'] += time.perf_counter() - start
+            self.stats['commands'] += 1
+            if handle and handle != self._current and driver_command != Command.QUIT:
+                self._execute(Command.SWITCH_TO_WINDOW, {'handle': handle})
+                self._current = handle
+                self.stats['switches'] += 1
+            result = self._execute(driver_command, params)
+            if driver_command == Command.SWITCH_TO_WINDOW:
+                self._current = params['handle']
+            elif driver_command == Command.CLOSE:
+                self._current = None
+            return result
+
+    def open_tab(self):
+        """
+        Opens a blank tab for a task.
+        :return: Its window handle.
+        """
+        with self._lock:
+            handle = self._open_context_tab() if self.isolation == 'context' else None
+            if handle is None:
+                handle = self._execute(Command.NEW_WINDOW, {'type': 'window'})['value']['handle']
+            self.stats['tabs'] += 1
+            return handle
+
+    def _open_context_tab(self):
+        try:
+            context_id = self.driver.execute_cdp_cmd('Target.createBrowserContext', {})['browserContextId']
+            target_id = self.driver.execute_cdp_cmd('Target.createTarget', {
+                'url': 'about:blank', 'browserContextId': context_id, 'newWindow': True
+            })['targetId']
+        except Exception as e:
+            print(f"Tabbed driver: browser contexts unavailable ({e}); using plain windows.")
+            self.isolation = 'window'
+            return None
+        # ChromeDriver names windows after their DevTools target id
+        handle = next((handle for handle in self.driver.window_handles if handle.endswith(target_id)), None)
+        if handle is None:
+            self._dispose_context(context_id)
+            self.isolation = 'window'
+            return None
+        self._contexts[handle] = context_id
+        return handle
+
+    def close_tab(self, handle):
+        """Closes a tab opened by open_tab() and discards its browser context."""
+        with self._lock:
+            try:
+                self._execute(Command.SWITCH_TO_WINDOW, {'handle': handle})
+                self._execute(Command.CLOSE, {})
+            except Exception as e:
+                print(f"Tabbed driver: closing tab failed: {e}")
+            self._current = None
+            context_id = self._contexts.pop(handle, None)
+            if context_id:
+                self._dispose_context(context_id)
+
+    def _dispose_context(self, context_id):
+        try:
+            self.driver.execute_cdp_cmd('Target.disposeBrowserContext', {'browserContextId': context_id})
+        except Exception:
+            pass
+
+    def bind(self, handle):
+        """Sends the calling thread's WebDriver commands, including those of its WebElements, to this tab."""
+        self._local.handle = handle
+
+    def unbind(self):
+        self._local.handle = None
+
+
+class BatchRunner:
+    def __init__(self, drivers, agent_factory, tabs_per_browser=4, isolation='context'):
+        """
+        :param drivers: WebDrivers to run the tasks in, e.g. leased from a BrowserPool. They are not quit.
+        :param agent_factory: Callable(driver, job) returning the AIAgent for a job dictionary.
+        :param tabs_per_browser: Tasks running at once in each browser.
+        :param isolation: Tab isolation passed to TabbedDriver.
+        """
+        self.drivers = list(drivers)
+        self.agent_factory = agent_factory
+        self.tabs_per_browser = tabs_per_browser
+        self.isolation = isolation
+        self.stats = {}
+
+    def run(self, jobs, cancel_event=None, on_result=None):
+        """
+        Runs every job and waits for all of them.
+        :param jobs: List of dictionaries with 'initial_url' and 'task_description' (plus anything the agent
+                     factory needs), or (initial_url, task_description) tuples.
+        :param cancel_event: Optional threading.Event; jobs that have not started yet are skipped once it is set.
+        :param on_result: Optional callable receiving every result as soon as its job finishes.
+        :return: Results in job order: dictionaries with 'index', 'initial_url', 'task_description',
+                 'status' ('completed', 'finished', 'cancelled' or 'failed'), 'logs' and 'seconds'.
+        """
+        jobs = [
+            dict(job, index=index) if isinstance(job, dict)
+            else {'index': index, 'initial_url': job[0], 'task_description': job[1]}
+            for index, job in enumerate(jobs)
+        ]
+        browsers = [TabbedDriver(driver, self.isolation) for driver in self.drivers]
+        slots = queue.Queue()
+        for _ in range(self.tabs_per_browser):
+            for browser in browsers:
+                slots.put(browser)
+
+        def run_job(job):
+            if cancel_event is not None and cancel_event.is_set():
+                result = self._result(job, 'cancelled', [], 0.0)
+            else:
+                browser = slots.get()
+                try:
+                    result = self._run_in_tab(browser, job)
+                finally:
+                    slots.put(browser)
+            if on_result:
+                on_result(result)
+            return result
+
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, len(browsers) * self.tabs_per_browser)) as executor:
+                results = list(executor.map(run_job, jobs))
+        finally:
+            for browser in browsers:
+                browser.detach()
+        seconds = time.perf_counter() - start
+        self.stats = {
+            'jobs': len(jobs),
+            'seconds': seconds,
+            'tasks_per_minute': len(jobs) / seconds * 60 if seconds else 0.0,
+            'browsers': [dict(browser.stats, isolation=browser.isolation) for browser in browsers]
+        }
+        return results
+
+    def _run_in_tab(self, browser, job):
+        start = time.perf_counter()
+        handle = None
+        try:
+            handle = browser.open_tab()
+            browser.bind(handle)
+            agent = self.agent_factory(browser.driver, job)
+            logs = agent.run_task(job['initial_url'], job['task_description'])
+            return self._result(job, 'completed' if agent.task_completed else 'finished', logs, time.perf_counter() - start)
+        except Exception as e:
+            return self._result(job, 'failed', [f"Batch job failed: {e}"], time.perf_counter() - start)
+        finally:
+            browser.unbind()
+            if handle:
+                browser.close_tab(handle)
+
+    @staticmethod
+    def _result(job, status, logs, seconds):
+        return {
+            'index': job['index'],
+            'initial_url': job['initial_url'],
+            'task_description': job['task_description'],
+            'status': status,
+            'logs': logs,
+            'seconds': seconds
+        }
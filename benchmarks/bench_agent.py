@@ -0,0 +1,297 @@
+"""
+End-to-end agent benchmark that needs neither the internet nor an LLM key.
+
+The page corpus is served from a local HTTP server and the agent's 'api_base' points at a mock
+provider replaying scripted actions (see mock_servers.py). Every scenario runs AIAgent.run_task in
+headless Chrome and reports wall-clock time, time per stage (from the tracing spans), WebDriver
+commands, prompt sizes and memory.
+
+Usage: python benchmarks/bench_agent.py
+Settings (environment):
+    BENCH_REPEAT=3              runs per scenario; the report shows medians
+    BENCH_PROVIDER=gemini       request format of the mock provider: gemini or openai
+    BENCH_LLM_LATENCY_MS=200    simulated provider latency
+    BENCH_SNAPSHOT_MODE=script  AIAgent snapshot_mode
+    BENCH_TEXT_MODE=parser      AIAgent text_mode
+    BENCH_AGENT=sync            sync (AIAgent) or async (AsyncAIAgent through its run_task wrapper)
+    BENCH_STREAM_MODE=off       AIAgent stream_mode: off, early or measure
+    BENCH_CHUNK_DELAY_MS=0      simulated time between streamed response chunks (also added to plain responses)
+    BENCH_OUTPUT=path.json      write the results
+    BENCH_BASELINE=path.json    compare with earlier results and exit with 1 on a regression
+    BENCH_TOLERANCE=20          percent more wall time, WebDriver commands or prompt chars tolerated against the baseline
+"""
+import collections
+import contextlib
+import io
+import json
+import os
+import resource
+import sys
+import time
+
+from common import build_corpus, start_driver, env_int
+from mock_servers import MockLLMServer, PageServer
+
+from agent import AIAgent
+from async_agent import AsyncAIAgent
+from tracing import Tracer
+
+# Scripted LLM answers per scenario; 'target' is the visible text of the element to act on
+SCENARIOS = [
+    {
+        'name': 'search',
+        'page': 'search.html',
+        'task': 'Search for telugu love songs and skip the ad',
+        'script': [
+            {'action': 'type_text', 'target': 'Search', 'text': 'telugu love songs'},
+            {'action': 'click_element', 'target': 'Skip Ads'},
+            {'action': 'task_complete', 'params': {'message': 'Searched and skipped the ad.'}}
+        ]
+    },
+    {
+        'name': 'cookie_wall',
+        'page': 'cookie_wall.html',
+        'task': 'Accept the cookies and open the first headline',
+        'script': [
+            {'action': 'click_element', 'target': 'Accept all'},
+            {'action': 'click_element', 'target': 'Markets rally'},
+            {'action': 'task_complete', 'params': {'message': 'Opened the first headline.'}}
+        ]
+    },
+    {
+        'name': 'video_list',
+        'page': 'video_list.html',
+        'task': 'Skip the ad',
+        'script': [
+            {'action': 'click_element', 'target': 'Skip Ads'},
+            {'action': 'task_complete', 'params': {'message': 'Skipped the ad.'}}
+        ]
+    },
+    {
+        'name': 'many_links',
+        'page': 'generated/many_links.html',
+        'task': 'Open result number 1500',
+        'script': [
+            {'action': 'click_element', 'target': 'Result number 1500 for'},
+            {'action': 'task_complete', 'params': {'message': 'Opened result 1500.'}}
+        ]
+    }
+]
+
+# Form targets of the corpus pages
+PAGE_ROUTES = {'/results.html': '/video_list.html'}
+
+
+class _SpanCollector:
+    """Trace exporter keeping the spans of the last finished task of its tracer."""
+    def __init__(self):
+        self.spans = []
+        self.tracer = Tracer(exporters=[self])
+
+    def export(self, spans):
+        self.spans = list(spans)
+
+
+def count_commands(driver):
+    """
+    Counts every WebDriver command sent by the driver, including those of its WebElements.
+    :return: A Counter by command name, to be cleared between tasks.
+    """
+    counter = collections.Counter()
+    execute = driver.execute
+
+    def counting_execute(driver_command, params=None):
+        counter[driver_command] += 1
+        return execute(driver_command, params)
+
+    driver.execute = counting_execute
+    return counter
+
+
+def process_tree_rss_mb(pid):
+    """Resident memory of a process and its descendants in MB (Linux /proc only; shared pages count repeatedly)."""
+    if not os.path.isdir('/proc'):
+        return None
+    children = collections.defaultdict(list)
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children[ppid].append(int(entry))
+    total_kb, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        pending.extend(children.get(current, []))
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total_kb += int(line.split()[1])
+        except OSError:
+            continue
+    return total_kb / 1024
+
+
+def python_peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_scenario(scenario, driver, commands, pages, llm, collector, settings):
+    llm.load(scenario['script'])
+    agent_class = AsyncAIAgent if settings['agent'] == 'async' else AIAgent
+    agent = agent_class(
+        driver=driver,
+        llm_config={'provider': settings['provider'], 'model': 'mock', 'api_key': 'offline', 'api_base': llm.url},
+        snapshot_mode=settings['snapshot_mode'],
+        text_mode=settings['text_mode'],
+        stream_mode=settings['stream_mode'],
+        tracer=collector.tracer
+    )
+    commands.clear()
+    page_bytes = pages.stats['bytes']
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        agent.run_task(pages.page_url(scenario['page']), scenario['task'])
+    seconds = time.perf_counter() - start
+
+    stages = collections.defaultdict(float)
+    for span in collector.spans:
+        if span.parent is not None:
+            stages[span.name] += span.seconds
+    prompt_chars = [call['prompt_chars'] for call in llm.calls]
+    missed = [call['action']['params']['message'] for call in llm.calls if 'Mock LLM' in call['action']['params'].get('message', '')]
+    return {
+        'seconds': seconds,
+        'ok': agent.task_completed and not missed,
+        'stages': dict(stages),
+        'webdriver_commands': sum(commands.values()),
+        'commands_by_name': dict(commands),
+        'llm_calls': len(llm.calls),
+        'prompt_chars_max': max(prompt_chars, default=0),
+        'prompt_chars_total': sum(prompt_chars),
+        'request_bytes_total': sum(call['request_bytes'] for call in llm.calls),
+        'page_bytes': pages.stats['bytes'] - page_bytes,
+        'chrome_rss_mb': process_tree_rss_mb(driver.service.process.pid),
+        'python_peak_rss_mb': python_peak_rss_mb(),
+        'stream_early': agent.stream_stats['early'],
+        'stream_saved_seconds': agent.stream_stats['saved_seconds'],
+        'errors': missed
+    }
+
+
+def median(values):
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2] if ordered else None
+
+
+def summarize_runs(runs):
+    stage_names = sorted({name for run in runs for name in run['stages']})
+    return {
+        'runs': len(runs),
+        'ok': all(run['ok'] for run in runs),
+        'seconds': median([run['seconds'] for run in runs]),
+        'stages': {name: median([run['stages'].get(name, 0.0) for run in runs]) for name in stage_names},
+        'webdriver_commands': median([run['webdriver_commands'] for run in runs]),
+        'llm_calls': median([run['llm_calls'] for run in runs]),
+        'prompt_chars_max': median([run['prompt_chars_max'] for run in runs]),
+        'prompt_chars_total': median([run['prompt_chars_total'] for run in runs]),
+        'request_bytes_total': median([run['request_bytes_total'] for run in runs]),
+        'page_bytes': median([run['page_bytes'] for run in runs]),
+        'chrome_rss_mb': max((run['chrome_rss_mb'] or 0 for run in runs), default=0),
+        'python_peak_rss_mb': max(run['python_peak_rss_mb'] for run in runs),
+        'stream_early': median([run['stream_early'] for run in runs]),
+        'stream_saved_seconds': median([run['stream_saved_seconds'] for run in runs]),
+        'commands_by_name': runs[-1]['commands_by_name'],
+        'errors': sorted({error for run in runs for error in run['errors']})
+    }
+
+
+def print_report(results, settings):
+    print(f"Agent benchmark: provider={settings['provider']} latency={settings['llm_latency_ms']}ms "
+          f"snapshot_mode={settings['snapshot_mode']} text_mode={settings['text_mode']} agent={settings['agent']} "
+          f"stream_mode={settings['stream_mode']} chunk_delay={settings['chunk_delay_ms']}ms")
+    for name, result in results.items():
+        status = 'ok' if result['ok'] else 'FAILED'
+        print(f"\n{name} [{status}] {result['seconds']:.2f}s median of {result['runs']}, "
+              f"{result['llm_calls']} LLM calls, {result['webdriver_commands']} WebDriver commands")
+        print(f"  prompts: max {result['prompt_chars_max']} chars, {result['prompt_chars_total']} chars in total, "
+              f"{result['request_bytes_total'] / 1024:.1f} KB sent; pages: {result['page_bytes'] / 1024:.1f} KB served")
+        chrome = f"{result['chrome_rss_mb']:.0f} MB" if result['chrome_rss_mb'] else 'n/a'
+        print(f"  memory: Chrome {chrome}, Python peak {result['python_peak_rss_mb']:.0f} MB")
+        stages = sorted(result['stages'].items(), key=lambda item: -item[1])
+        print("  stages: " + ", ".join(f"{stage} {seconds * 1000:.0f}ms" for stage, seconds in stages))
+        top_commands = collections.Counter(result['commands_by_name']).most_common(5)
+        print("  top commands: " + ", ".join(f"{command} {count}" for command, count in top_commands))
+        if settings['stream_mode'] != 'off':
+            saved = f", {result['stream_saved_seconds'] * 1000:.0f}ms saved" if settings['stream_mode'] == 'measure' else ''
+            print(f"  streaming: {result['stream_early']} of {result['llm_calls']} LLM calls acted on early{saved}")
+        for error in result['errors']:
+            print(f"  error: {error}")
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """:return: List of regression descriptions."""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get('results', {}).get(name)
+        if not before:
+            continue
+        if before['ok'] and not result['ok']:
+            regressions.append(f"{name}: task no longer completes")
+        for key in ('seconds', 'webdriver_commands', 'prompt_chars_total'):
+            if before[key] and result[key] > before[key] * (1 + tolerance / 100):
+                regressions.append(f"{name}: {key} {before[key]:.2f} -> {result[key]:.2f}")
+    return regressions
+
+
+def main():
+    settings = {
+        'repeat': env_int('BENCH_REPEAT', 3),
+        'provider': os.environ.get('BENCH_PROVIDER', 'gemini'),
+        'llm_latency_ms': env_int('BENCH_LLM_LATENCY_MS', 200),
+        'snapshot_mode': os.environ.get('BENCH_SNAPSHOT_MODE', 'script'),
+        'text_mode': os.environ.get('BENCH_TEXT_MODE', 'parser'),
+        'agent': os.environ.get('BENCH_AGENT', 'sync'),
+        'stream_mode': os.environ.get('BENCH_STREAM_MODE', 'off'),
+        'chunk_delay_ms': env_int('BENCH_CHUNK_DELAY_MS', 0)
+    }
+    build_corpus()
+    collector = _SpanCollector()
+
+    results = {}
+    llm_server = MockLLMServer(latency=settings['llm_latency_ms'] / 1000, chunk_delay=settings['chunk_delay_ms'] / 1000)
+    with PageServer(routes=PAGE_ROUTES) as pages, llm_server as llm:
+        driver = start_driver()
+        commands = count_commands(driver)
+        try:
+            for scenario in SCENARIOS:
+                runs = [run_scenario(scenario, driver, commands, pages, llm, collector, settings)
+                        for _ in range(settings['repeat'])]
+                results[scenario['name']] = summarize_runs(runs)
+        finally:
+            driver.quit()
+
+    print_report(results, settings)
+    output = {'settings': settings, 'results': results}
+    if os.environ.get('BENCH_OUTPUT'):
+        with open(os.environ['BENCH_OUTPUT'], 'w', encoding='utf-8') as f:
+            json.dump(output, f, indent=2)
+    if os.environ.get('BENCH_BASELINE'):
+        with open(os.environ['BENCH_BASELINE'], encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, env_int('BENCH_TOLERANCE', 20))
+        if regressions:
+            print("\nREGRESSIONS against " + os.environ['BENCH_BASELINE'])
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo regressions against " + os.environ['BENCH_BASELINE'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+Compares two ways of running agent tasks side by side, offline (see bench_agent.py):
+'browsers' gives every concurrent task its own Chrome, as the Flask app's browser pool does, and
+'tabs' runs them in tabs of a single Chrome with BatchRunner. Reports tasks per minute and the
+peak Chrome memory per concurrent task.
+
+Usage: python benchmarks/bench_batch.py
+Settings (environment):
+    BENCH_TASKS=12              tasks per mode, cycling through the bench_agent scenarios
+    BENCH_CONCURRENCY=4         browsers in 'browsers' mode, tabs in 'tabs' mode
+    BENCH_PROVIDER=gemini       request format of the mock provider: gemini or openai
+    BENCH_LLM_LATENCY_MS=1000   simulated provider latency; the longer, the more tabs overlap
+"""
+import contextlib
+import io
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_agent import PAGE_ROUTES, SCENARIOS, process_tree_rss_mb
+from common import build_corpus, start_driver, env_int
+from mock_servers import MockLLMServer, PageServer
+
+from agent import AIAgent
+from batch_runner import BatchRunner
+
+
+class _PeakMemory:
+    """Samples the resident memory of the Chrome process trees in the background and keeps the peak."""
+    def __init__(self, drivers, interval=0.2):
+        self.pids = [driver.service.process.pid for driver in drivers]
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while True:
+            sizes = [process_tree_rss_mb(pid) for pid in self.pids]
+            if None in sizes:
+                return
+            self.peak_mb = max(self.peak_mb, sum(sizes))
+            if self._stop.wait(self.interval):
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+
+
+def build_tasks(count):
+    """:return: ({task description: script}, jobs) for count tasks with distinct descriptions."""
+    scripts, jobs = {}, []
+    for index in range(count):
+        scenario = SCENARIOS[index % len(SCENARIOS)]
+        task = f"{scenario['task']} (task {index})"
+        scripts[task] = scenario['script']
+        jobs.append({'page': scenario['page'], 'task_description': task})
+    return scripts, jobs
+
+
+def run_browsers(drivers, jobs, agent_factory):
+    """One task per browser at a time, each browser running its tasks one after another."""
+    idle = queue.Queue()
+    for driver in drivers:
+        idle.put(driver)
+
+    def run_job(job):
+        driver = idle.get()
+        try:
+            agent = agent_factory(driver, job)
+            agent.run_task(job['initial_url'], job['task_description'])
+        finally:
+            idle.put(driver)
+        return agent.task_completed
+
+    with ThreadPoolExecutor(max_workers=len(drivers)) as executor:
+        return sum(executor.map(run_job, jobs))
+
+
+def run_tabs(driver, jobs, agent_factory, tabs):
+    """:return: (completed tasks, TabbedDriver stats: commands, tab switches, seconds waited for the browser)."""
+    runner = BatchRunner([driver], agent_factory, tabs_per_browser=tabs)
+    results = runner.run(jobs)
+    return sum(result['status'] == 'completed' for result in results), runner.stats['browsers'][0]
+
+
+def main():
+    settings = {
+        'tasks': env_int('BENCH_TASKS', 12),
+        'concurrency': env_int('BENCH_CONCURRENCY', 4),
+        'provider': os.environ.get('BENCH_PROVIDER', 'gemini'),
+        'llm_latency_ms': env_int('BENCH_LLM_LATENCY_MS', 1000)
+    }
+    build_corpus()
+    scripts, jobs = build_tasks(settings['tasks'])
+    print(f"Batch benchmark: {settings['tasks']} tasks, concurrency {settings['concurrency']}, "
+          f"provider={settings['provider']} latency={settings['llm_latency_ms']}ms")
+
+    with PageServer(routes=PAGE_ROUTES) as pages, MockLLMServer(latency=settings['llm_latency_ms'] / 1000) as llm:
+        for job in jobs:
+            job['initial_url'] = pages.page_url(job['page'])
+        llm_config = {'provider': settings['provider'], 'model': 'mock', 'api_key': 'offline', 'api_base': llm.url}
+
+        def agent_factory(driver, job):
+            return AIAgent(driver=driver, llm_config=llm_config)
+
+        results = {}
+        for mode in ('browsers', 'tabs'):
+            llm.load_tasks(scripts)
+            drivers = [start_driver() for _ in range(settings['concurrency'] if mode == 'browsers' else 1)]
+            try:
+                with _PeakMemory(drivers) as memory:
+                    start = time.perf_counter()
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        if mode == 'browsers':
+                            completed, sharing = run_browsers(drivers, jobs, agent_factory), None
+                        else:
+                            completed, sharing = run_tabs(drivers[0], jobs, agent_factory, settings['concurrency'])
+                    seconds = time.perf_counter() - start
+            finally:
+                for driver in drivers:
+                    driver.quit()
+            results[mode] = {
+                'completed': completed,
+                'seconds': seconds,
+                'tasks_per_minute': len(jobs) / seconds * 60,
+                'chrome_peak_mb': memory.peak_mb,
+                'llm_calls': len(llm.calls),
+                'sharing': sharing
+            }
+
+    for mode, result in results.items():
+        print(f"\n{mode}: {result['completed']}/{len(jobs)} completed in {result['seconds']:.1f}s, "
+              f"{result['tasks_per_minute']:.1f} tasks/minute, {result['llm_calls']} LLM calls")
+        print(f"  Chrome peak {result['chrome_peak_mb']:.0f} MB, "
+              f"{result['chrome_peak_mb'] / settings['concurrency']:.0f} MB per concurrent task")
+        if result['sharing']:
+            sharing = result['sharing']
+            print(f"  shared browser: {sharing['commands']} WebDriver commands, {sharing['switches']} tab switches, "
+                  f"{sharing['lock_wait_seconds']:.1f}s waited for the browser ({sharing['isolation']} isolation)")
+    browsers, tabs = results['browsers'], results['tabs']
+    if tabs['chrome_peak_mb']:
+        print(f"\ntabs vs browsers: {browsers['chrome_peak_mb'] / tabs['chrome_peak_mb']:.1f}x less memory, "
+              f"{tabs['tasks_per_minute'] / browsers['tasks_per_minute']:.2f}x the throughput")
+
+
+if __name__ == '__main__':
+    main()
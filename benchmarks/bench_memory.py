@@ -0,0 +1,110 @@
+"""
+Measures how site memory (see site_memory.py) cuts LLM calls on repeated kinds of tasks, offline
+(see bench_agent.py). Every task searches the local video site for a different query, opens the
+top story of the results and completes; the cookie wall on the results page is left to the fast
+path. The tasks run once without memory and once with a SiteMemory shared by all of them, where
+every task after the first opens the results URL directly and replays the click.
+
+Usage: python benchmarks/bench_memory.py
+Settings (environment):
+    BENCH_TASKS=6               tasks per mode, each with its own query
+    BENCH_PROVIDER=gemini       request format of the mock provider: gemini or openai
+    BENCH_LLM_LATENCY_MS=500    simulated provider latency
+"""
+import contextlib
+import io
+import os
+import time
+
+from common import build_corpus, start_driver, env_int
+from mock_servers import MockLLMServer, PageServer
+
+from agent import AIAgent
+from fast_path import FastPathPolicy
+from site_memory import SiteMemory
+
+QUERIES = ['telugu love songs', 'lofi beats', 'pasta recipes', 'jazz piano', 'marathon training', 'space documentaries',
+           'guitar lessons', 'city walks', 'chess openings', 'yoga for beginners']
+
+# The search form submits to results.html; the results page has a cookie wall and headlines linking to /story/N
+ROUTES = {'/results.html': '/cookie_wall.html', '/story/1': '/video_list.html'}
+
+
+def build_tasks(count):
+    """:return: ({task description: script}, task descriptions), one query per task."""
+    scripts, tasks = {}, []
+    for index in range(count):
+        query = QUERIES[index % len(QUERIES)] + (f" {index // len(QUERIES)}" if index >= len(QUERIES) else '')
+        task = f"Search for {query} and open the top story"
+        scripts[task] = [
+            {'action': 'type_text', 'target': 'Search', 'text': query, 'page': 'search.html'},
+            {'action': 'click_element', 'target': 'Markets rally', 'page': 'results.html'},
+            {'action': 'task_complete', 'params': {'message': 'Opened the top story.'}, 'page': 'story'}
+        ]
+        tasks.append(task)
+    return scripts, tasks
+
+
+def run_tasks(driver, pages, llm, llm_config, scripts, tasks, site_memory):
+    """:return: List of per-task results with 'llm_calls', 'completed' and 'seconds'."""
+    llm.load_tasks(scripts)
+    results = []
+    for task in tasks:
+        calls = len(llm.calls)
+        agent = AIAgent(driver=driver, llm_config=llm_config, fast_path=FastPathPolicy(), site_memory=site_memory)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            logs = agent.run_task(pages.page_url('search.html'), task)
+        results.append({
+            'llm_calls': len(llm.calls) - calls,
+            'completed': agent.task_completed and not any('Mock LLM' in line for line in logs),
+            'seconds': time.perf_counter() - start
+        })
+    return results
+
+
+def main():
+    settings = {
+        'tasks': env_int('BENCH_TASKS', 6),
+        'provider': os.environ.get('BENCH_PROVIDER', 'gemini'),
+        'llm_latency_ms': env_int('BENCH_LLM_LATENCY_MS', 500)
+    }
+    build_corpus()
+    scripts, tasks = build_tasks(settings['tasks'])
+    print(f"Site memory benchmark: {settings['tasks']} tasks per mode, provider={settings['provider']} "
+          f"latency={settings['llm_latency_ms']}ms")
+
+    results = {}
+    with PageServer(routes=ROUTES) as pages, MockLLMServer(latency=settings['llm_latency_ms'] / 1000) as llm:
+        llm_config = {'provider': settings['provider'], 'model': 'mock', 'api_key': 'offline', 'api_base': llm.url}
+        driver = start_driver()
+        try:
+            for mode in ('cold', 'memory'):
+                memory = SiteMemory() if mode == 'memory' else None
+                results[mode] = {'tasks': run_tasks(driver, pages, llm, llm_config, scripts, tasks, memory),
+                                 'memory': memory.snapshot() if memory else None}
+        finally:
+            driver.quit()
+
+    for mode, result in results.items():
+        runs = result['tasks']
+        completed = sum(run['completed'] for run in runs)
+        calls = [run['llm_calls'] for run in runs]
+        seconds = sum(run['seconds'] for run in runs)
+        print(f"\n{mode}: {completed}/{len(runs)} completed, {sum(calls) / len(runs):.2f} LLM calls per task "
+              f"(first task {calls[0]}, later tasks {sum(calls[1:]) / max(len(calls) - 1, 1):.2f}), "
+              f"{seconds / len(runs):.2f}s per task")
+        if result['memory']:
+            memory = result['memory']
+            print(f"  site memory: hit rate {memory['hit_rate']:.0%}, {memory['url_jumps']} URL jumps, "
+                  f"{memory['replayed_steps']} replayed steps, {memory['llm_calls_saved']} LLM calls saved, "
+                  f"{memory['hinted_prompts']} hinted prompts, {memory['replay_failures']} failed replays")
+    cold, memory = results['cold']['tasks'], results['memory']['tasks']
+    cold_calls = sum(run['llm_calls'] for run in cold) / len(cold)
+    memory_calls = sum(run['llm_calls'] for run in memory) / len(memory)
+    print(f"\nmemory vs cold: {cold_calls:.2f} -> {memory_calls:.2f} LLM calls per task "
+          f"({(1 - memory_calls / cold_calls) * 100 if cold_calls else 0:.0f}% fewer)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Compares page loads in the 'default' and 'lean' browser profiles (see browser_profile.py), offline:
+the corpus pages plus a generated media-heavy page (images, a video, a web font and an analytics
+script on a second "third-party" server that keeps beaconing). Both servers add latency to every
+response like remote hosts. Reports the time until driver.get returns, until the page has settled
+(when the agent would start reading it), and the bytes and requests the servers answered.
+
+Both profiles run headless here; the default profile's only other differences are
+page_load_strategy 'normal' and no blocking. The browser cache is disabled, so every load is cold.
+
+Usage: python benchmarks/bench_profile.py
+Settings (environment):
+    BENCH_REPEAT=3              loads per page and profile; the report shows medians
+    BENCH_LATENCY_MS=50         latency added to every response of both servers
+    BENCH_IMAGES=24             images on the media-heavy page
+"""
+import os
+import time
+
+from common import GENERATED_DIR, build_corpus, env_int
+from mock_servers import PageServer
+
+from agent import create_driver
+from browser_profile import TRACKER_DOMAINS, ResourceBlocker, get_profile
+from page_settle import PageSettleWaiter
+
+MEDIA_DIR = GENERATED_DIR / 'media' # Not part of the corpus other benchmarks read
+
+# Beacons for two seconds after load, like analytics and ad scripts
+TRACKER_SCRIPT = """
+(function() {
+    var sent = 0;
+    var timer = setInterval(function() {
+        fetch('/collect?event=' + (sent++), {mode: 'no-cors'}).catch(function() {});
+        if (sent >= 10) clearInterval(timer);
+    }, 200);
+})();
+"""
+
+
+def build_media_page(tracker_origin, images):
+    """Writes the media-heavy page and its assets. :return: Its path relative to the page server root."""
+    MEDIA_DIR.mkdir(parents=True, exist_ok=True)
+    assets = {'photo.jpg': 120 * 1024, 'clip.mp4': 2 * 1024 * 1024, 'font.woff2': 150 * 1024}
+    for name, size in assets.items():
+        path = MEDIA_DIR / name
+        if not path.exists() or path.stat().st_size != size:
+            path.write_bytes(os.urandom(size))
+    (MEDIA_DIR / 'analytics.js').write_text(TRACKER_SCRIPT, encoding='utf-8')
+    figures = [
+        f'<figure><img src="photo.jpg?n={i}" alt="Product photo {i}" width="200" height="150">'
+        f'<figcaption><a href="/product/{i}">Product {i}</a></figcaption></figure>'
+        for i in range(images)
+    ]
+    (MEDIA_DIR / 'media_heavy.html').write_text(
+        '<!DOCTYPE html><html><head><meta charset="UTF-8"><title>Media heavy</title>'
+        '<style>@font-face { font-family: "Brand"; src: url("font.woff2") format("woff2"); } body { font-family: "Brand", sans-serif; }</style>'
+        f'<script async src="{tracker_origin}/generated/media/analytics.js"></script>'
+        '</head><body><h1>Catalogue</h1><input type="text" name="q" placeholder="Search products">'
+        '<video src="clip.mp4" preload="auto" muted width="320"></video>'
+        + ''.join(figures) + '</body></html>',
+        encoding='utf-8'
+    )
+    return 'generated/media/media_heavy.html'
+
+
+def load_page(driver, waiter, url, servers):
+    """:return: Dictionary with 'get_seconds', 'ready_seconds', 'settled', 'bytes' and 'requests' of one cold load."""
+    driver.get('about:blank')
+    before = [dict(server.stats) for server in servers]
+    start = time.perf_counter()
+    driver.get(url)
+    get_seconds = time.perf_counter() - start
+    result = waiter.wait(url)
+    ready_seconds = time.perf_counter() - start
+    return {
+        'get_seconds': get_seconds,
+        'ready_seconds': ready_seconds,
+        'settled': result.settled,
+        'bytes': sum(server.stats['bytes'] - stats['bytes'] for server, stats in zip(servers, before)),
+        'requests': sum(server.stats['requests'] - stats['requests'] for server, stats in zip(servers, before))
+    }
+
+
+def run_profile(name, pages, servers, tracker_host, repeat):
+    profile = get_profile(name)
+    driver = create_driver(headless=True, profile=profile)
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setCacheDisabled', {'cacheDisabled': True})
+        # The offline tracker is a local port, so it joins the real tracker list
+        blocker = ResourceBlocker(driver, profile['block'], tracker_domains=TRACKER_DOMAINS + [tracker_host])
+        blocker.install()
+        waiter = PageSettleWaiter(driver, **profile['settle_config'])
+        waiter.install()
+        results = {}
+        for page, url in pages.items():
+            runs = [load_page(driver, waiter, url, servers) for _ in range(repeat)]
+            results[page] = {key: median([run[key] for run in runs]) for key in ('get_seconds', 'ready_seconds', 'bytes', 'requests')}
+            results[page]['settled'] = all(run['settled'] for run in runs)
+        return results
+    finally:
+        driver.quit()
+
+
+def median(values):
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2]
+
+
+def main():
+    repeat = env_int('BENCH_REPEAT', 3)
+    latency = env_int('BENCH_LATENCY_MS', 50) / 1000
+    build_corpus()
+    with PageServer(latency=latency) as site, PageServer(latency=latency) as tracker:
+        tracker_host = tracker.url.split('://', 1)[1]
+        media_page = build_media_page(tracker.url, env_int('BENCH_IMAGES', 24))
+        pages = {name: site.page_url(name) for name in ('search.html', 'video_list.html', 'cookie_wall.html')}
+        pages['media_heavy.html'] = site.page_url(media_page)
+        print(f"Browser profile benchmark: {len(pages)} pages x {repeat} cold loads, {latency * 1000:.0f}ms latency per response")
+        results = {name: run_profile(name, pages, [site, tracker], tracker_host, repeat) for name in ('default', 'lean')}
+
+    for page in pages:
+        print(f"\n{page}")
+        for name, profile_results in results.items():
+            result = profile_results[page]
+            settled = '' if result['settled'] else ' (did not settle)'
+            print(f"  {name:8} get {result['get_seconds'] * 1000:7.0f} ms  ready {result['ready_seconds'] * 1000:7.0f} ms{settled}  "
+                  f"{result['bytes'] / 1024:8.1f} KB in {result['requests']} requests")
+    totals = {
+        name: {key: sum(result[key] for result in profile_results.values()) for key in ('ready_seconds', 'bytes')}
+        for name, profile_results in results.items()
+    }
+    default, lean = totals['default'], totals['lean']
+    print(f"\nlean vs default: ready {default['ready_seconds'] / max(lean['ready_seconds'], 1e-9):.1f}x faster, "
+          f"{(1 - lean['bytes'] / max(default['bytes'], 1)) * 100:.0f}% fewer bytes")
+
+
+if __name__ == '__main__':
+    main()
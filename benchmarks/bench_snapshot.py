@@ -0,0 +1,45 @@
+"""
+Compares the ways AIAgent collects interactive elements on the saved page corpus:
+one WebDriver call per element property ('webdriver'), one injected script ('script'), and
+repeated snapshots of an unchanged page in 'incremental' mode.
+Also checks that all of them produce the same 'interactive_elements'.
+
+Usage: python benchmarks/bench_snapshot.py  (BENCH_REPEAT=5 by default)
+"""
+from common import build_corpus, start_driver, time_call, summarize, env_int
+
+from agent import AIAgent
+
+
+def main():
+    repeat = env_int('BENCH_REPEAT', 5)
+    driver = start_driver()
+    try:
+        agent = AIAgent(driver=driver)
+        for page in build_corpus():
+            driver.get(page.as_uri())
+            webdriver_times, webdriver_elements = time_call(agent._collect_elements_webdriver, repeat)
+            script_times, script_elements = time_call(agent._collect_elements_script, repeat)
+            agent._raw_snapshot = None
+            agent._collect_elements_incremental() # Full snapshot that the timed calls build on
+            incremental_times, incremental_elements = time_call(agent._collect_elements_incremental, repeat)
+
+            speedup = sorted(webdriver_times)[repeat // 2] / max(sorted(script_times)[repeat // 2], 1e-9)
+            print(f"{page.name} ({len(script_elements)} elements, {speedup:.1f}x faster)")
+            print(f"  webdriver: {summarize(webdriver_times)}")
+            print(f"  script:    {summarize(script_times)}")
+            print(f"  incremental (unchanged page): {summarize(incremental_times)}")
+            if incremental_elements != script_elements:
+                print("  MISMATCH: incremental snapshot differs from the script snapshot")
+            if webdriver_elements != script_elements:
+                mismatched = [
+                    (a, b) for a, b in zip(webdriver_elements, script_elements) if a != b
+                ]
+                print(f"  MISMATCH: {len(webdriver_elements)} vs {len(script_elements)} elements, "
+                      f"first difference: {mismatched[:1]}")
+    finally:
+        driver.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Compares the page text extraction of page_text.py with the BeautifulSoup reference on the page corpus,
+and checks that every backend returns the same text.
+
+Usage: python benchmarks/bench_text.py  (BENCH_REPEAT=5 by default)
+Set BENCH_BROWSER=1 to also time reading page_source from Chrome versus collecting the text in the browser.
+"""
+from common import build_corpus, start_driver, time_call, summarize, env_int
+
+from page_text import etree, extract_text, extract_text_in_browser, soup_text
+
+
+def compare(name, reference, result):
+    if result != reference:
+        first = next((i for i, (a, b) in enumerate(zip(reference, result)) if a != b), min(len(reference), len(result)))
+        print(f"  MISMATCH ({name}) at character {first}: {reference[first:first + 40]!r} vs {result[first:first + 40]!r}")
+
+
+def main():
+    repeat = env_int('BENCH_REPEAT', 5)
+    backends = ['html.parser'] + (['lxml'] if etree is not None else [])
+    pages = build_corpus()
+    for page in pages:
+        html = page.read_text(encoding='utf-8')
+        soup_times, reference = time_call(lambda: soup_text(html), repeat)
+        print(f"{page.name} ({len(html) / 1024:.0f} KB)")
+        print(f"  {'beautifulsoup':12} {summarize(soup_times)}")
+        for backend in backends:
+            times, text = time_call(lambda: extract_text(html, backend=backend), repeat)
+            speedup = sorted(soup_times)[repeat // 2] / max(sorted(times)[repeat // 2], 1e-9)
+            print(f"  {backend:12} {summarize(times)}  ({speedup:.1f}x faster)")
+            compare(backend, reference, text)
+
+    if env_int('BENCH_BROWSER', 0):
+        driver = start_driver()
+        try:
+            print("\nIn Chrome: page_source + parser versus text collected in the browser")
+            for page in pages:
+                driver.get(page.as_uri())
+                source_times, reference = time_call(lambda: extract_text(driver.page_source), repeat)
+                browser_times, text = time_call(lambda: extract_text_in_browser(driver), repeat)
+                print(f"{page.name}")
+                print(f"  page_source: {summarize(source_times)}")
+                print(f"  browser:     {summarize(browser_times)}")
+                compare('browser', reference, text)
+        finally:
+            driver.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Shared helpers for the benchmark scripts: the saved page corpus and a headless Chrome.
+Run the scripts from the repository root, e.g. `python benchmarks/bench_snapshot.py`.
+"""
+import os
+import pathlib
+import sys
+import time
+
+REPO_ROOT = pathlib.Path(__file__).resolve().parent.parent
+PAGES_DIR = pathlib.Path(__file__).resolve().parent / 'pages'
+GENERATED_DIR = PAGES_DIR / 'generated'
+
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+
+def build_corpus():
+    """
+    Writes the generated pages (too large to keep in git) next to the saved ones.
+    :return: Sorted list of every page path in the corpus.
+    """
+    GENERATED_DIR.mkdir(exist_ok=True)
+    many_links = GENERATED_DIR / 'many_links.html'
+    if not many_links.exists():
+        rows = []
+        for i in range(2000):
+            rows.append(
+                f'<li><a href="/item/{i}" title="Item {i}">Result number {i} for the query</a>'
+                f' <button aria-label="More actions for item {i}">...</button></li>'
+            )
+        many_links.write_text(
+            '<!DOCTYPE html><html><head><meta charset="UTF-8"><title>Many links</title></head><body>'
+            '<input type="text" name="q" placeholder="Filter results">'
+            '<ul>' + '\n'.join(rows) + '</ul></body></html>',
+            encoding='utf-8'
+        )
+    large_article = GENERATED_DIR / 'large_article.html'
+    if not large_article.exists():
+        # A few MB of inline scripts and styles before a long article, like many news sites
+        script = '<script>window.__state = ' + '{"key": "value", "items": [1, 2, 3]},' * 400 + '{};</script>'
+        style = '<style>' + '.c { color: red; margin: 0 auto; }' * 300 + '</style>'
+        paragraphs = [
+            f'<p>Paragraph {i} of the article with <b>bold</b> and <a href="/topic/{i % 50}">a link</a> &amp; more text.</p>'
+            for i in range(5000)
+        ]
+        large_article.write_text(
+            '<!DOCTYPE html><html><head><meta charset="UTF-8"><title>Large article</title>' + style * 20 +
+            '</head><body>' + script * 100 + '<article>' + '\n'.join(paragraphs) + '</article></body></html>',
+            encoding='utf-8'
+        )
+    return sorted(PAGES_DIR.glob('*.html')) + sorted(GENERATED_DIR.glob('*.html'))
+
+
+def start_driver(headless=True):
+    """Starts a Chrome WebDriver suitable for benchmarking."""
+    from selenium import webdriver
+
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument('--headless=new')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--window-size=1920,1080')
+    return webdriver.Chrome(options=options)
+
+
+def time_call(func, repeat):
+    """
+    Calls func `repeat` times.
+    :return: Tuple of (list of durations in seconds, result of the last call).
+    """
+    durations = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        durations.append(time.perf_counter() - start)
+    return durations, result
+
+
+def summarize(durations):
+    """Formats min / median / max of a list of durations in milliseconds."""
+    ordered = sorted(durations)
+    median = ordered[len(ordered) // 2]
+    return f"min {ordered[0] * 1000:8.1f} ms  median {median * 1000:8.1f} ms  max {ordered[-1] * 1000:8.1f} ms"
+
+
+def env_int(name, default):
+    """Reads an integer setting from the environment."""
+    return int(os.environ.get(name, default))
@@ -0,0 +1,333 @@
+"""
+Local stand-ins for the web and the LLM providers, so agent benchmarks run offline and for free.
+
+PageServer serves the page corpus over HTTP. MockLLMServer answers Gemini generateContent and
+OpenAI chat/completions requests with scripted actions, streamed as server-sent events when asked
+(streamGenerateContent, "stream": true). Scripted steps name their element by
+visible text; the mock finds it in the page context of the prompt, so scripts do not depend on
+'llm_elem_N' numbering or on which elements the prompt budget kept. MockLLMServer.inject makes it
+answer with error statuses (with Retry-After) or stall, to exercise the client's retries and timeouts.
+"""
+import http.server
+import json
+import re
+import threading
+import time
+from urllib.parse import urlparse
+
+from common import PAGES_DIR
+
+_CONTEXT_RE = re.compile(r"\n(\{.*\})\n\nProvide only the JSON response\.", re.DOTALL)
+_TASK_RE = re.compile(r'Your task is: "(.*)"')
+
+
+class _Server:
+    def __init__(self, handler_class):
+        self.httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler_class)
+        self.httpd.daemon_threads = True
+        self.httpd.owner = self
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+class _PageHandler(http.server.SimpleHTTPRequestHandler):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, directory=str(PAGES_DIR), **kwargs)
+
+    def translate_path(self, path):
+        route = self.server.owner.routes.get(urlparse(path).path)
+        return super().translate_path(route or path)
+
+    def copyfile(self, source, outputfile):
+        super().copyfile(source, outputfile)
+        with self.server.owner.lock:
+            self.server.owner.stats['bytes'] += source.tell()
+
+    def send_response(self, code, message=None):
+        with self.server.owner.lock:
+            self.server.owner.stats['requests'] += 1
+        if self.server.owner.latency:
+            time.sleep(self.server.owner.latency)
+        super().send_response(code, message)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PageServer(_Server):
+    def __init__(self, routes=None, latency=0.0):
+        """
+        Serves benchmarks/pages (including generated/) on a free local port.
+        :param routes: Optional {path: path} aliases, e.g. {'/results.html': '/video_list.html'} for form targets.
+        :param latency: Seconds added before every response, like a remote server.
+        """
+        super().__init__(_PageHandler)
+        self.routes = routes or {}
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'bytes': 0}
+
+    def page_url(self, name):
+        return f"{self.url}/{name}"
+
+
+class _LLMHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # Keep-alive, and chunked streams like the real providers
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        path = urlparse(self.path).path
+        payload = json.loads(body)
+        stream = path.endswith(':streamGenerateContent') or bool(payload.get('stream'))
+        if path.endswith(':generateContent') or path.endswith(':streamGenerateContent'):
+            provider = 'gemini'
+            messages = [
+                {'role': 'assistant' if content.get('role') == 'model' else 'user',
+                 'content': ''.join(part.get('text', '') for part in content.get('parts', []))}
+                for content in payload.get('contents', [])
+            ]
+        elif path == '/v1/chat/completions':
+            provider = 'openai'
+            messages = payload.get('messages', [])
+        else:
+            self.send_error(404)
+            return
+
+        owner = self.server.owner
+        with owner.lock:
+            owner.stats['requests'] += 1
+            owner.stats['active'] += 1
+            owner.stats['max_active'] = max(owner.stats['max_active'], owner.stats['active'])
+            status = owner.faults.pop(0) if owner.faults else None
+        try:
+            if owner.delay:
+                time.sleep(owner.delay)
+            if status:
+                self._send_error(status, owner.retry_after)
+            else:
+                self._answer(provider, messages, len(body), stream)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True # The client timed out
+        finally:
+            with owner.lock:
+                owner.stats['active'] -= 1
+
+    def _send_error(self, status, retry_after):
+        data = json.dumps({'error': {'code': status, 'message': 'Injected by MockLLMServer.'}}).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        if retry_after is not None:
+            self.send_header('Retry-After', str(retry_after))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _answer(self, provider, messages, request_bytes, stream):
+        owner = self.server.owner
+        action = owner.respond(provider, messages, request_bytes)
+        text = json.dumps(action)
+        chunks = [text[i:i + owner.chunk_chars] for i in range(0, len(text), owner.chunk_chars)]
+        if stream:
+            self._stream(provider, chunks)
+            return
+        # Without streaming the answer arrives once the last token is generated
+        time.sleep(owner.chunk_delay * (len(chunks) + 1))
+        if provider == 'gemini':
+            result = {'candidates': [{'content': {'role': 'model', 'parts': [{'text': text}]}}]}
+        else:
+            result = {'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}}]}
+        data = json.dumps(result).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, provider, chunks):
+        if provider == 'gemini':
+            events = [{'candidates': [{'content': {'role': 'model', 'parts': [{'text': chunk}]}}]} for chunk in chunks]
+            events.append({'candidates': [{'content': {'role': 'model', 'parts': [{'text': ''}]}, 'finishReason': 'STOP'}]})
+        else:
+            events = [{'choices': [{'index': 0, 'delta': {'content': chunk}}]} for chunk in chunks]
+            events.append({'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})
+        data = [f"data: {json.dumps(event)}\r\n\r\n".encode('utf-8') for event in events]
+        if provider == 'openai':
+            data[-1] += b"data: [DONE]\r\n\r\n"
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for chunk in data:
+                time.sleep(self.server.owner.chunk_delay)
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+            with self.server.owner.lock:
+                self.server.owner.stats['streams_cancelled'] += 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockLLMServer(_Server):
+    def __init__(self, latency=0.0, chunk_delay=0.0, chunk_chars=16):
+        """
+        :param latency: Seconds every response is delayed by, to model the provider's think time (time to first token).
+        :param chunk_delay: Seconds to generate each chunk of chunk_chars response characters, plus one final event.
+                            Streamed responses send the chunks as they are generated; others wait for all of them.
+        :param chunk_chars: Response characters per streamed chunk.
+        """
+        super().__init__(_LLMHandler)
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.chunk_chars = chunk_chars
+        self.stats = {'streams_cancelled': 0, 'requests': 0, 'active': 0, 'max_active': 0}
+        self.lock = threading.Lock()
+        self.faults = [] # Status codes the next requests are answered with, see inject()
+        self.retry_after = None
+        self.delay = 0.0
+        self.scripts = {} # Task description (None for any task) -> remaining steps
+        self.calls = [] # {'provider', 'task', 'request_bytes', 'prompt_chars', 'messages', 'action'} per request
+
+    def load(self, script):
+        """
+        Sets the responses for the next task and clears the recorded calls.
+        :param script: List of steps answered in order, e.g. {'action': 'click_element', 'target': 'Accept all'},
+                       {'action': 'type_text', 'target': 'Search', 'text': 'query'}, {'action': 'navigate_to',
+                       'params': {'url': ...}} or {'action': 'task_complete', 'params': {'message': ...}}.
+                       Once the script is used up every request gets task_complete. A step with a 'page' (part of
+                       the URL path) only answers on that page; the steps before it are skipped on it, since an
+                       agent that remembers its way does them without asking.
+        """
+        self.load_tasks({None: script})
+
+    def load_tasks(self, scripts):
+        """
+        Sets separate scripts for tasks running at the same time and clears the recorded calls.
+        :param scripts: {task description: script}; a request is answered from the script of the task quoted
+                        in its prompt, or from the None entry.
+        """
+        with self.lock:
+            self.scripts = {task: list(script) for task, script in scripts.items()}
+            self.calls = []
+
+    def inject(self, statuses=(), retry_after=None, delay=0.0):
+        """
+        Makes the server misbehave like an overloaded provider; scripted answers resume after the statuses.
+        :param statuses: HTTP status codes the next requests are answered with in order, e.g. [429, 503].
+        :param retry_after: Retry-After header value (seconds or an HTTP date) sent with those errors.
+        :param delay: Seconds every request stalls before it is answered, e.g. longer than a client's read timeout.
+        """
+        with self.lock:
+            self.faults = list(statuses)
+            self.retry_after = retry_after
+            self.delay = delay
+
+    def respond(self, provider, messages, request_bytes):
+        if self.latency:
+            time.sleep(self.latency)
+        task = task_description(messages)
+        path = urlparse(current_url(messages) or '').path
+        with self.lock:
+            script = self.scripts.get(task, self.scripts.get(None, []))
+            # Skip ahead to the first step for this page if earlier ones were done without the LLM
+            index = next((i for i, step in enumerate(script) if step.get('page') and step['page'] in path), 0)
+            del script[:index]
+            step = script.pop(0) if script else {'action': 'task_complete', 'params': {'message': 'Script finished.'}}
+        action = self._resolve(step, messages)
+        with self.lock:
+            self.calls.append({
+                'provider': provider,
+                'task': task,
+                'request_bytes': request_bytes,
+                'prompt_chars': sum(len(message['content']) for message in messages),
+                'messages': len(messages),
+                'action': action
+            })
+        return action
+
+    @staticmethod
+    def _resolve(step, messages):
+        """Turns a scripted step into an action, looking up its 'target' in the page context of the conversation."""
+        params = dict(step.get('params') or {})
+        target = step.get('target')
+        if not target:
+            return {'action': step['action'], 'params': params}
+
+        elements = visible_elements(messages)
+        wanted = target.lower()
+        candidates = [
+            elem for elem in elements
+            if any(wanted in str(elem.get(key, '')).lower() for key in ('text', 'aria_label', 'placeholder', 'name'))
+        ]
+        if step['action'] == 'type_text':
+            candidates = [elem for elem in candidates if elem['tag'] in ('input', 'textarea')]
+        if not candidates:
+            return {'action': 'task_complete', 'params': {'message': f"Mock LLM: '{target}' is not in the prompt."}}
+        params['id'] = candidates[0]['id']
+        if 'text' in step:
+            params['text'] = step['text']
+        return {'action': step['action'], 'params': params}
+
+
+def visible_elements(messages):
+    """
+    Elements the LLM currently knows about: the page context of the last full prompt with the
+    changes of later incremental messages applied.
+    """
+    elements = {}
+    for message in messages:
+        if message.get('role') != 'user':
+            continue
+        match = _CONTEXT_RE.search(message['content'])
+        if not match:
+            continue
+        context = json.loads(match.group(1))
+        if 'interactive_elements' in context:
+            elements = {elem['id']: elem for elem in context['interactive_elements']}
+            continue
+        for elem in context.get('added', []) + context.get('changed', []):
+            elements[elem['id']] = elem
+        for element_id in context.get('removed', []):
+            elements.pop(element_id, None)
+    return list(elements.values())
+
+
+def current_url(messages):
+    """The URL of the page the LLM was last told about, or None."""
+    url = None
+    for message in messages:
+        match = _CONTEXT_RE.search(message['content']) if message.get('role') == 'user' else None
+        if match:
+            url = json.loads(match.group(1)).get('current_url', url)
+    return url
+
+
+def task_description(messages):
+    """The task quoted in the first full prompt of the conversation, or None."""
+    for message in messages:
+        match = _TASK_RE.search(message['content'])
+        if match:
+            return match.group(1)
+    return None
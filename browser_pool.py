@@ -0,0 +1,255 @@
+"""
+A bounded pool of warm WebDriver sessions shared by the Flask endpoints.
+
+Sessions are leased for one task, reset (tabs, cookies, storage) when they come back
+and reused, instead of launching and quitting Chrome for every request. Every lease runs
+in a fresh CDP browser context, so nothing a task stored on any site (cookies, local
+storage, IndexedDB, service workers, cache) reaches the next task.
+"""
+import collections
+import contextlib
+import threading
+import time
+from urllib.parse import urlparse
+
+
+class PoolExhaustedError(Exception):
+    """Raised when no browser session becomes available in time or the wait queue is full."""
+
+
+class _PooledSession:
+    def __init__(self, driver):
+        self.driver = driver
+        self.tasks_run = 0
+        self.created_at = time.time()
+        self.context_id = None # Browser context of the session's tab; None for the default context
+
+
+class BrowserPool:
+    def __init__(self, driver_factory, size=2, max_tasks_per_session=20, acquire_timeout=120, max_waiting=8):
+        """
+        :param driver_factory: Callable returning a new WebDriver (e.g. agent.create_driver with headless=True).
+        :param size: Maximum number of browser sessions alive at once.
+        :param max_tasks_per_session: Recycle a session after it has run this many tasks.
+        :param acquire_timeout: Seconds a lease waits for a free session before giving up.
+        :param max_waiting: Number of leases allowed to queue; further requests are rejected right away.
+        """
+        self.driver_factory = driver_factory
+        self.size = size
+        self.max_tasks_per_session = max_tasks_per_session
+        self.acquire_timeout = acquire_timeout
+        self.max_waiting = max_waiting
+
+        self._cond = threading.Condition()
+        self._idle = collections.deque()
+        self._alive = 0 # Sessions idle, leased or being launched
+        self._waiting = 0
+        self._closed = False
+        self.stats = {'launched': 0, 'recycled': 0, 'crashed': 0, 'leases': 0, 'rejected': 0}
+
+    def warm(self):
+        """Launches sessions until the pool is full, so the first tasks do not pay for a cold start."""
+        while True:
+            with self._cond:
+                if self._closed or self._alive >= self.size:
+                    return
+                self._alive += 1
+            session = self._launch()
+            with self._cond:
+                if session is None:
+                    self._alive -= 1
+                    return
+                self._idle.append(session)
+                self._cond.notify()
+
+    @contextlib.contextmanager
+    def lease(self, timeout=None):
+        """
+        Leases a healthy WebDriver for the duration of a `with` block.
+        :param timeout: Overrides acquire_timeout for this lease.
+        :raises PoolExhaustedError: If no session is available in time.
+        """
+        session = self._acquire(self.acquire_timeout if timeout is None else timeout)
+        try:
+            yield session.driver
+        finally:
+            self._release(session)
+
+    def snapshot(self):
+        """Returns the current pool occupancy and lifetime counters."""
+        with self._cond:
+            return dict(self.stats, size=self.size, alive=self._alive, idle=len(self._idle), waiting=self._waiting)
+
+    def close(self):
+        """Quits every idle session. Leased sessions are quit when they are released."""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._alive -= len(idle)
+            self._cond.notify_all()
+        for session in idle:
+            self._quit(session)
+
+    def _acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if not self._idle and self._alive >= self.size and self._waiting >= self.max_waiting:
+                self.stats['rejected'] += 1
+                raise PoolExhaustedError(f"All {self.size} browser sessions are busy and {self._waiting} requests are already waiting.")
+            self._waiting += 1
+            try:
+                while True:
+                    if self._closed:
+                        raise PoolExhaustedError("Browser pool is shut down.")
+                    if self._idle:
+                        session = self._idle.popleft()
+                        break
+                    if self._alive < self.size:
+                        self._alive += 1
+                        session = None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stats['rejected'] += 1
+                        raise PoolExhaustedError(f"No browser session became free within {timeout} seconds.")
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+
+        # Launching and health checks talk to Chrome, so they run outside the lock.
+        if session is not None and not self._is_healthy(session):
+            self._quit(session)
+            session = None
+            with self._cond:
+                self.stats['crashed'] += 1
+        if session is None:
+            session = self._launch()
+            if session is None:
+                with self._cond:
+                    self._alive -= 1
+                    self._cond.notify()
+                raise PoolExhaustedError("Could not launch a browser session.")
+        with self._cond:
+            self.stats['leases'] += 1
+        return session
+
+    def _release(self, session):
+        session.tasks_run += 1
+        expired = self._closed or session.tasks_run >= self.max_tasks_per_session
+        crashed = not expired and not self._reset(session)
+
+        if not expired and not crashed:
+            with self._cond:
+                self._idle.append(session)
+                self._cond.notify()
+            return
+
+        self._quit(session)
+        with self._cond:
+            self.stats['crashed' if crashed else 'recycled'] += 1
+            self._alive -= 1
+            self._cond.notify()
+        if not self._closed:
+            # Replace the session in the background so the pool stays warm.
+            threading.Thread(target=self.warm, daemon=True).start()
+
+    def _launch(self):
+        try:
+            driver = self.driver_factory()
+        except Exception as e:
+            print(f"Browser pool: could not launch WebDriver: {e}")
+            return None
+        with self._cond:
+            self.stats['launched'] += 1
+        session = _PooledSession(driver)
+        try:
+            self._new_context(session)
+        except Exception as e:
+            print(f"Browser pool: could not open a browser context: {e}")
+        return session
+
+    def _is_healthy(self, session):
+        try:
+            return session.driver.execute_script("return 1;") == 1
+        except Exception:
+            return False
+
+    def _new_context(self, session):
+        """
+        Moves a session to a blank tab in a new browser context, closing its other tabs and
+        disposing of its previous context.
+        :return: False if the driver does not support browser contexts.
+        """
+        driver = session.driver
+        try:
+            context_id = driver.execute_cdp_cmd('Target.createBrowserContext', {})['browserContextId']
+            target_id = driver.execute_cdp_cmd('Target.createTarget', {
+                'url': 'about:blank', 'browserContextId': context_id, 'newWindow': True
+            })['targetId']
+        except Exception:
+            return False
+        # ChromeDriver names windows after their DevTools target id
+        handles = driver.window_handles
+        handle = next((handle for handle in handles if handle.endswith(target_id)), None)
+        if handle is None:
+            self._dispose_context(driver, context_id)
+            return False
+        for other in handles:
+            if other != handle:
+                driver.switch_to.window(other)
+                driver.close()
+        driver.switch_to.window(handle)
+        if session.context_id:
+            self._dispose_context(driver, session.context_id)
+        session.context_id = context_id
+        return True
+
+    def _dispose_context(self, driver, context_id):
+        try:
+            driver.execute_cdp_cmd('Target.disposeBrowserContext', {'browserContextId': context_id})
+        except Exception:
+            pass
+
+    def _reset(self, session):
+        """
+        Brings a session back to a blank state: a new browser context, or, for drivers without
+        browser contexts, one tab with no cookies and no web storage for the origin it ended on.
+        :return: False if the browser did not respond, in which case the session is discarded.
+        """
+        driver = session.driver
+        try:
+            if self._new_context(session):
+                return True
+            handles = driver.window_handles
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(handles[0])
+
+            origin = urlparse(driver.current_url)
+            if origin.scheme in ('http', 'https'):
+                driver.execute_script("try { window.localStorage.clear(); window.sessionStorage.clear(); } catch (e) {}")
+                try:
+                    driver.execute_cdp_cmd('Storage.clearDataForOrigin', {
+                        'origin': f"{origin.scheme}://{origin.netloc}",
+                        'storageTypes': 'all'
+                    })
+                except Exception:
+                    pass
+            try:
+                # Clears cookies of every domain, unlike delete_all_cookies() which only sees the current one.
+                driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+            except Exception:
+                driver.delete_all_cookies()
+            driver.get('about:blank')
+            return True
+        except Exception as e:
+            print(f"Browser pool: resetting session failed: {e}")
+            return False
+
+    def _quit(self, session):
+        try:
+            session.driver.quit()
+        except Exception:
+            pass
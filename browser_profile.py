@@ -0,0 +1,140 @@
+"""
+Browser profiles: how Chrome is launched and what it downloads for the agent.
+
+The agent reads DOM text and attributes only, so images, video, fonts and analytics scripts cost
+page-load time and bandwidth without changing its decisions. The 'lean' profile runs headless,
+returns from navigation once the DOM is ready (page_load_strategy 'eager'; the settle waiter
+decides when the page is usable) and blocks those resources with CDP Network.setBlockedURLs.
+Blocking is set per tab when a task starts, so every task can allow what it needs, e.g. 'media'
+for a task that plays a video.
+"""
+from selenium import webdriver
+
+# URL patterns (Network.setBlockedURLs wildcards) of every resource category
+RESOURCE_EXTENSIONS = {
+    'images': ['png', 'jpg', 'jpeg', 'gif', 'webp', 'avif', 'bmp', 'ico', 'svg'],
+    'media': ['mp4', 'webm', 'ogg', 'ogv', 'mp3', 'wav', 'm4a', 'm4s', 'm3u8', 'mpd', 'ts'],
+    'fonts': ['woff', 'woff2', 'ttf', 'otf', 'eot']
+}
+
+# Analytics, advertising and session-recording hosts; subdomains are blocked too
+TRACKER_DOMAINS = [
+    'google-analytics.com', 'googletagmanager.com', 'googlesyndication.com', 'googleadservices.com',
+    'doubleclick.net', 'adservice.google.com', 'connect.facebook.net', 'analytics.twitter.com',
+    'ads-twitter.com', 'bat.bing.com', 'clarity.ms', 'hotjar.com', 'segment.io', 'segment.com',
+    'mixpanel.com', 'amplitude.com', 'newrelic.com', 'nr-data.net', 'scorecardresearch.com',
+    'quantserve.com', 'taboola.com', 'outbrain.com', 'criteo.com', 'adnxs.com', 'amazon-adsystem.com',
+    'pubmatic.com', 'rubiconproject.com', 'moatads.com', 'chartbeat.com', 'optimizely.com'
+]
+
+BLOCKABLE = list(RESOURCE_EXTENSIONS) + ['trackers']
+
+PROFILES = {
+    # Chrome's defaults: every resource loads and navigation waits for the load event
+    'default': {'headless': False, 'page_load_strategy': 'normal', 'block': [], 'settle_config': {}},
+    # Headless, returns at DOMContentLoaded and skips what the agent does not read
+    'lean': {
+        'headless': True,
+        'page_load_strategy': 'eager',
+        'block': ['images', 'media', 'fonts', 'trackers'],
+        'settle_config': {'ready_state': 'interactive'}
+    }
+}
+
+
+def get_profile(profile):
+    """
+    :param profile: A profile name from PROFILES, or a dictionary overriding keys of the 'default' profile.
+    :return: The complete profile dictionary.
+    """
+    if isinstance(profile, dict):
+        return dict(PROFILES['default'], **profile)
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown browser profile '{profile}'. Use one of: {', '.join(PROFILES)}.")
+    return dict(PROFILES[profile])
+
+
+def chrome_options(profile='default', headless=None):
+    """
+    Builds ChromeOptions for a profile.
+    :param profile: Profile name or dictionary (see get_profile).
+    :param headless: Overrides the profile's headless setting when not None.
+    """
+    profile = get_profile(profile)
+    options = webdriver.ChromeOptions()
+    if profile['headless'] if headless is None else headless:
+        options.add_argument('--headless=new')
+        options.add_argument('--disable-gpu')
+        options.add_argument('--no-sandbox')
+        options.add_argument('--window-size=1920,1080')
+    options.page_load_strategy = profile['page_load_strategy']
+    if profile['block']:
+        # Nothing to see or hear; saves the work of background tabs and audio output
+        options.add_argument('--mute-audio')
+        options.add_argument('--disable-background-networking')
+    return options
+
+
+def blocked_url_patterns(block, allow=(), tracker_domains=None):
+    """
+    :param block: Categories to block: 'images', 'media', 'fonts' and/or 'trackers'.
+    :param allow: Categories, or tracker domains (and their subdomains), to load anyway.
+    :param tracker_domains: Overrides TRACKER_DOMAINS.
+    :return: List of Network.setBlockedURLs patterns.
+    """
+    unknown = [category for category in block if category not in BLOCKABLE]
+    if unknown:
+        raise ValueError(f"Unknown resource categories: {', '.join(unknown)}. Use: {', '.join(BLOCKABLE)}.")
+    allow = set(allow)
+    patterns = []
+    for category in block:
+        if category in allow:
+            continue
+        if category == 'trackers':
+            for domain in TRACKER_DOMAINS if tracker_domains is None else tracker_domains:
+                if any(domain == allowed or domain.endswith('.' + allowed) for allowed in allow):
+                    continue
+                patterns += [f"*://{domain}/*", f"*://*.{domain}/*"]
+        else:
+            for extension in RESOURCE_EXTENSIONS[category]:
+                patterns += [f"*.{extension}", f"*.{extension}?*"]
+    return patterns
+
+
+class ResourceBlocker:
+    def __init__(self, driver, block=(), allow=(), tracker_domains=None):
+        """
+        Blocks resource categories in the driver's current tab through the Chrome DevTools Protocol.
+        Resources are matched by URL (file extension or host), so an image served without an image
+        extension still loads, and allowing a category applies to every site of the task.
+        :param driver: A Selenium WebDriver for Chrome.
+        :param block: Categories to block (see blocked_url_patterns).
+        :param allow: Categories or tracker domains the task needs.
+        :param tracker_domains: Overrides TRACKER_DOMAINS.
+        """
+        self.driver = driver
+        self.patterns = blocked_url_patterns(block, allow, tracker_domains)
+        self.installed = False
+
+    def install(self):
+        """Starts blocking in the current tab. Drivers without CDP support load everything."""
+        if not self.patterns:
+            return False
+        try:
+            self.driver.execute_cdp_cmd('Network.enable', {})
+            self.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': self.patterns})
+            self.installed = True
+        except Exception as e:
+            print(f"Resource blocking unavailable: {e}")
+            self.installed = False
+        return self.installed
+
+    def uninstall(self):
+        """Stops blocking, e.g. before handing a pooled driver back."""
+        if not self.installed:
+            return
+        try:
+            self.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': []})
+        except Exception:
+            pass
+        self.installed = False
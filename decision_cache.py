@@ -0,0 +1,251 @@
+"""
+Cache of LLM decisions keyed on the structure of the page and the task.
+
+When the same task meets a structurally identical page again (same URL pattern, same list of
+interactive elements), the action the LLM chose last time is reused instead of calling it again.
+Element ids ('llm_elem_N') are not stable between runs, so cached actions refer to elements by
+a signature built from their stable attributes and are mapped back onto the current ids on a hit.
+"""
+import collections
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse, parse_qsl
+
+ELEMENT_ACTIONS = ('click_element', 'type_text')
+CACHEABLE_ACTIONS = ('navigate_to',) + ELEMENT_ACTIONS
+
+_SPACE_RE = re.compile(r"\s+")
+_VOLATILE_SEGMENT_RE = re.compile(r"^(\d+|[0-9a-f]{8,}|[0-9a-f-]{32,36})$", re.IGNORECASE)
+
+
+def normalize_text(value, limit=None):
+    """Lower-cases a value and collapses its whitespace, optionally truncating it to limit characters."""
+    value = _SPACE_RE.sub(' ', str(value or '')).strip().lower()
+    return value[:limit] if limit else value
+
+
+def element_signature(elem):
+    """
+    Identifies an element by attributes that survive a page reload: not its 'llm_elem_N' id,
+    position or current value.
+    """
+    return '|'.join([
+        elem.get('tag', ''),
+        normalize_text(elem.get('original_html_id')),
+        normalize_text(elem.get('name')),
+        normalize_text(elem.get('type')),
+        normalize_text(elem.get('aria_label')),
+        normalize_text(elem.get('placeholder')),
+        normalize_text(elem.get('text'), 60)
+    ])
+
+
+def url_pattern(url):
+    """Reduces a URL to scheme, host, path with numeric/hash segments wildcarded and sorted query keys."""
+    parsed = urlparse(url or '')
+    segments = ['*' if _VOLATILE_SEGMENT_RE.match(segment) else segment for segment in parsed.path.split('/')]
+    query_keys = sorted({key for key, _ in parse_qsl(parsed.query, keep_blank_values=True)})
+    pattern = f"{parsed.scheme}://{parsed.netloc}{'/'.join(segments)}"
+    return pattern + ('?' + '&'.join(query_keys) if query_keys else '')
+
+
+def page_fingerprint(page_context):
+    """Structural fingerprint of a page: URL pattern plus a hash of its normalized element list."""
+    signatures = '\n'.join(element_signature(elem) for elem in page_context.get('interactive_elements', []))
+    return url_pattern(page_context.get('current_url')) + '#' + hashlib.sha1(signatures.encode('utf-8')).hexdigest()
+
+
+def _locate(page_context, element_id):
+    """Returns (signature, occurrence) of an element id, occurrence counting earlier elements with the same signature."""
+    seen = collections.Counter()
+    for elem in page_context.get('interactive_elements', []):
+        signature = element_signature(elem)
+        if elem['id'] == element_id:
+            return signature, seen[signature]
+        seen[signature] += 1
+    return None
+
+
+def _resolve(page_context, signature, occurrence):
+    seen = 0
+    for elem in page_context.get('interactive_elements', []):
+        if element_signature(elem) == signature:
+            if seen == occurrence:
+                return elem['id']
+            seen += 1
+    return None
+
+
+def encode_action(llm_response, page_context):
+    """
+    Turns an LLM action into a cache record with element ids replaced by signatures.
+    :return: The record, or None if the action should not be cached.
+    """
+    action = llm_response.get('action')
+    params = dict(llm_response.get('params') or {})
+    if action not in CACHEABLE_ACTIONS:
+        return None
+    if action in ELEMENT_ACTIONS:
+        located = _locate(page_context, params.pop('id', None))
+        if not located:
+            return None
+        params['element'] = {'signature': located[0], 'occurrence': located[1]}
+    return {'action': action, 'params': params}
+
+
+def decode_action(record, page_context):
+    """
+    Maps a cache record back onto the current page.
+    :return: An action dictionary like the LLM returns, or None if the element is not on the page.
+    """
+    params = dict(record['params'])
+    if record['action'] in ELEMENT_ACTIONS:
+        element = params.pop('element')
+        element_id = _resolve(page_context, element['signature'], element['occurrence'])
+        if not element_id:
+            return None
+        params['id'] = element_id
+    return {'action': record['action'], 'params': params}
+
+
+class MemoryBackend:
+    """An in-process LRU store of (record, created_at) entries, shared with site_memory.py."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, record, created_at):
+        self._entries[key] = (record, created_at)
+        self._entries.move_to_end(key)
+        evicted = 0
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            evicted += 1
+        return evicted
+
+    def delete(self, key):
+        self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """MemoryBackend's interface on a SQLite table, so entries survive restarts and are shared by processes."""
+
+    def __init__(self, path, max_entries, table='decisions'):
+        self.max_entries = max_entries
+        self.table = table # Trusted constant, not user input
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, record TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def get(self, key):
+        row = self._db.execute(f"SELECT record, created_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        if not row:
+            return None
+        self._db.execute(f"UPDATE {self.table} SET last_used = ? WHERE key = ?", (time.time(), key))
+        self._db.commit()
+        return json.loads(row[0]), row[1]
+
+    def put(self, key, record, created_at):
+        self._db.execute(
+            f"INSERT OR REPLACE INTO {self.table} (key, record, created_at, last_used) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(record), created_at, created_at)
+        )
+        excess = len(self) - self.max_entries
+        if excess > 0:
+            self._db.execute(
+                f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} ORDER BY last_used LIMIT ?)", (excess,)
+            )
+        self._db.commit()
+        return max(excess, 0)
+
+    def delete(self, key):
+        self._db.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        self._db.commit()
+
+    def __len__(self):
+        return self._db.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+class DecisionCache:
+    def __init__(self, max_entries=1000, ttl_seconds=24 * 3600, sqlite_path=None):
+        """
+        :param max_entries: Least recently used entries beyond this are evicted.
+        :param ttl_seconds: Entries older than this are treated as misses and dropped.
+        :param sqlite_path: Optional SQLite file to keep the cache across restarts and processes.
+        """
+        self.ttl_seconds = ttl_seconds
+        self._backend = SQLiteBackend(sqlite_path, max_entries) if sqlite_path else MemoryBackend(max_entries)
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'expired': 0,
+                      'remap_failures': 0, 'invalidations': 0}
+
+    @staticmethod
+    def make_key(page_context, task_description, llm_config):
+        """Cache key from the page fingerprint, the task and the model."""
+        parts = [
+            page_fingerprint(page_context),
+            normalize_text(task_description),
+            str(llm_config.get('provider')),
+            str(llm_config.get('model'))
+        ]
+        return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+    def lookup(self, key, page_context):
+        """
+        :return: The cached action mapped onto the current page, or None on a miss.
+        """
+        with self._lock:
+            entry = self._backend.get(key)
+            if entry and time.time() - entry[1] > self.ttl_seconds:
+                self._backend.delete(key)
+                self.stats['expired'] += 1
+                entry = None
+            if not entry:
+                self.stats['misses'] += 1
+                return None
+            action = decode_action(entry[0], page_context)
+            if not action:
+                self.stats['remap_failures'] += 1
+                self.stats['misses'] += 1
+                return None
+            self.stats['hits'] += 1
+            return action
+
+    def store(self, key, llm_response, page_context):
+        """Caches an LLM action if it can be replayed on a structurally identical page."""
+        record = encode_action(llm_response, page_context)
+        if not record:
+            return
+        with self._lock:
+            self.stats['evictions'] += self._backend.put(key, record, time.time())
+            self.stats['stores'] += 1
+
+    def invalidate(self, key):
+        """Drops an entry whose action failed when replayed."""
+        with self._lock:
+            self._backend.delete(key)
+            self.stats['invalidations'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats, size=len(self._backend))
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        return stats
@@ -0,0 +1,136 @@
+"""
+Local policy that handles cookie-consent and skip-ad buttons without asking the LLM.
+
+_get_page_context already flags these elements and the prompt tells the LLM to click them first,
+so when exactly one visible, unambiguous candidate exists the policy clicks it directly. Anything
+less certain falls through to the LLM.
+"""
+import re
+from urllib.parse import urlparse
+
+from decision_cache import element_signature
+
+_SPACE_RE = re.compile(r"\s+")
+
+CONSENT_LABELS = {
+    'accept', 'accept all', 'accept all cookies', 'accept cookies', 'allow all', 'allow all cookies',
+    'allow cookies', 'i accept', 'i agree', 'agree', 'agree and continue', 'accept and continue',
+    'got it', 'yes, i agree', 'ok, got it'
+}
+CONSENT_NEGATIVE_WORDS = ('reject', 'decline', 'deny', 'refuse', 'manage', 'settings', 'options',
+                          'preferences', 'customi', 'more info', 'learn more', 'policy', 'necessary only')
+SKIP_AD_LABELS = {'skip', 'skip ad', 'skip ads', 'skip advertisement'}
+SKIP_AD_IDS = {'ytp-ad-skip-button', 'skip-button'}
+# Candidates below this are treated as keyword noise rather than a real banner
+NOISE_CONFIDENCE = 0.5
+# When the task itself is about consent, clicking 'Accept' on the user's behalf would be wrong
+CONSENT_TASK_WORDS = ('cookie', 'consent', 'reject', 'decline', 'privacy', 'gdpr')
+
+
+def _label(elem):
+    for key in ('text', 'aria_label', 'value', 'placeholder'):
+        if elem.get(key):
+            return _SPACE_RE.sub(' ', str(elem[key])).strip().lower()
+    return ''
+
+
+def _host_matches(host, site):
+    return host == site or host.endswith('.' + site)
+
+
+class FastPathPolicy:
+    def __init__(self, confidence_threshold=0.85, ambiguity_margin=0.1, site_rules=None, assumed_llm_seconds=3.0):
+        """
+        :param confidence_threshold: Minimum confidence (0-1) to click without the LLM.
+        :param ambiguity_margin: If the two best candidates with different labels score within this margin,
+                                 the page is considered ambiguous and left to the LLM.
+        :param site_rules: Optional {hostname: rule} where a rule may set 'enabled' (False turns the fast path
+                           off for the site), 'confidence_threshold', and extra 'consent_labels' /
+                           'skip_ad_labels' that count as exact matches. Subdomains match too.
+        :param assumed_llm_seconds: Estimated duration of one LLM call until real calls have been measured.
+        """
+        self.confidence_threshold = confidence_threshold
+        self.ambiguity_margin = ambiguity_margin
+        self.site_rules = site_rules or {}
+        self.assumed_llm_seconds = assumed_llm_seconds
+
+    def rule_for(self, url):
+        host = urlparse(url or '').hostname or ''
+        rule = {}
+        for site, site_rule in self.site_rules.items():
+            if _host_matches(host, site):
+                rule.update(site_rule)
+        return rule
+
+    def consent_confidence(self, elem, page_context, rule):
+        label = _label(elem)
+        if not label or any(word in label for word in CONSENT_NEGATIVE_WORDS):
+            return 0.0
+        if label in CONSENT_LABELS or label in rule.get('consent_labels', ()):
+            confidence = 0.95
+        elif 'accept' in label or 'agree' in label:
+            confidence = 0.8
+        else:
+            confidence = 0.4 # 'OK', 'Continue'... could be anything
+        if elem['tag'] == 'a':
+            confidence -= 0.2 # Consent is given with buttons; links are usually policies
+        if not self._mentions_cookies(page_context):
+            confidence = min(confidence, 0.6)
+        return confidence
+
+    @staticmethod
+    def _mentions_cookies(page_context):
+        """Whether the page text or any element label talks about cookies or consent."""
+        texts = [page_context.get('text_content') or '']
+        texts.extend(_label(elem) for elem in page_context.get('interactive_elements', []))
+        combined = ' '.join(texts).lower()
+        return 'cookie' in combined or 'consent' in combined
+
+    def skip_ad_confidence(self, elem, rule):
+        label = _label(elem)
+        if label in SKIP_AD_LABELS or label in rule.get('skip_ad_labels', ()) or elem.get('original_html_id') in SKIP_AD_IDS:
+            return 0.95
+        if label.startswith('skip'):
+            return 0.8
+        return 0.3 # 'Ad in 5', 'Advertisement'... are countdowns and labels, not buttons
+
+    def decide(self, page_context, task_description, clicked_signatures=()):
+        """
+        :param page_context: Dictionary returned by AIAgent._get_page_context.
+        :param task_description: The task; consent tasks are always left to the LLM.
+        :param clicked_signatures: Signatures already clicked by the fast path in this task. They are not
+                                   clicked again, since a button that is still there did not work.
+        :return: Tuple of (action dictionary, reason) or None to ask the LLM.
+        """
+        rule = self.rule_for(page_context.get('current_url'))
+        if rule.get('enabled') is False:
+            return None
+        threshold = rule.get('confidence_threshold', self.confidence_threshold)
+        task = task_description.lower()
+
+        consent, skip_ad = [], []
+        for elem in page_context.get('interactive_elements', []):
+            if not elem.get('is_visible_in_viewport') or element_signature(elem) in clicked_signatures:
+                continue
+            if elem.get('is_cookie_consent_button') and not any(word in task for word in CONSENT_TASK_WORDS):
+                consent.append((self.consent_confidence(elem, page_context, rule), elem))
+            if elem.get('is_skip_ad_button'):
+                skip_ad.append((self.skip_ad_confidence(elem, rule), elem))
+
+        # Same priority as the prompt rules: cookie consent first, then skip-ad
+        for kind, candidates in (('cookie consent', consent), ('skip-ad', skip_ad)):
+            if not candidates:
+                continue
+            candidates.sort(key=lambda candidate: -candidate[0])
+            confidence, best = candidates[0]
+            if confidence < NOISE_CONFIDENCE:
+                continue # Keyword false positives such as 'Book' matching 'ok'
+            if confidence < threshold:
+                return None
+            if len(candidates) > 1:
+                runner_up_confidence, runner_up = candidates[1]
+                if confidence - runner_up_confidence < self.ambiguity_margin and _label(runner_up) != _label(best):
+                    return None
+            reason = f"{kind} button '{_label(best)}' (confidence {confidence:.2f})"
+            return {'action': 'click_element', 'params': {'id': best['id']}}, reason
+        return None
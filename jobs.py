@@ -0,0 +1,155 @@
+"""
+Background job subsystem for agent tasks.
+
+A job is submitted, runs on a bounded thread pool and exposes its status and log lines
+while it runs, so the web interface can follow progress instead of blocking on one request.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class JobQueueFullError(Exception):
+    """Raised when too many jobs are queued or running to accept another one."""
+
+
+class Job:
+    def __init__(self, params):
+        """
+        :param params: Whatever the job runner needs (LLM config, URL, task description...).
+        """
+        self.id = uuid.uuid4().hex
+        self.params = params
+        self.status = QUEUED
+        self.logs = []
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self._cond = threading.Condition()
+
+    def add_log(self, message):
+        """Appends a log line and wakes up every stream following this job."""
+        with self._cond:
+            self.logs.append(message)
+            self._cond.notify_all()
+
+    def wait_for_logs(self, start, timeout):
+        """
+        Blocks until there are log lines past `start`, the job finishes or `timeout` seconds pass.
+        :return: Tuple of (new log lines, whether the job has finished).
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: len(self.logs) > start or self.status in FINISHED_STATES, timeout)
+            return self.logs[start:], self.status in FINISHED_STATES
+
+    def set_status(self, status, error=None):
+        with self._cond:
+            self.status = status
+            if status == RUNNING:
+                self.started_at = time.time()
+            elif status in FINISHED_STATES:
+                self.finished_at = time.time()
+                self.error = error
+            self._cond.notify_all()
+
+    def to_dict(self, include_logs=False):
+        with self._cond:
+            info = {
+                'job_id': self.id,
+                'status': self.status,
+                'error': self.error,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'log_count': len(self.logs)
+            }
+            if include_logs:
+                info['logs'] = list(self.logs)
+            return info
+
+
+class JobManager:
+    def __init__(self, runner, max_workers=2, max_pending=20, retention_seconds=3600):
+        """
+        :param runner: Callable taking a Job and running it to completion. It should log through
+                       job.add_log and stop early once job.cancel_event is set.
+        :param max_workers: Number of jobs running at the same time.
+        :param max_pending: Number of unfinished (queued + running) jobs accepted before submit() refuses.
+        :param retention_seconds: How long finished jobs stay queryable.
+        """
+        self.runner = runner
+        self.max_pending = max_pending
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='agent-job')
+        self._jobs = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def submit(self, params):
+        """
+        Queues a new job.
+        :raises JobQueueFullError: If max_pending jobs are already unfinished.
+        """
+        with self._lock:
+            self._prune()
+            pending = sum(1 for job in self._jobs.values() if job.status not in FINISHED_STATES)
+            if pending >= self.max_pending:
+                raise JobQueueFullError(f"{pending} jobs are already queued or running.")
+            job = Job(params)
+            self._jobs[job.id] = job
+            self._futures[job.id] = self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """
+        Cancels a job. A queued job never starts; a running one stops at its next step.
+        :return: False if the job does not exist or has already finished.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            future = self._futures.get(job_id)
+        if not job or job.status in FINISHED_STATES:
+            return False
+        job.cancel_event.set()
+        if future and future.cancel():
+            job.set_status(CANCELLED)
+        return True
+
+    def shutdown(self):
+        for job_id in list(self._jobs):
+            self.cancel(job_id)
+        self._executor.shutdown(wait=False)
+
+    def _run(self, job):
+        if job.cancel_event.is_set():
+            job.set_status(CANCELLED)
+            return
+        job.set_status(RUNNING)
+        try:
+            self.runner(job)
+        except Exception as e:
+            job.add_log(f"Job failed: {e}")
+            job.set_status(FAILED, error=str(e))
+            return
+        job.set_status(CANCELLED if job.cancel_event.is_set() else COMPLETED)
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_seconds
+        for job_id, job in list(self._jobs.items()):
+            if job.status in FINISHED_STATES and job.finished_at < cutoff:
+                del self._jobs[job_id]
+                self._futures.pop(job_id, None)
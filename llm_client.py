@@ -0,0 +1,333 @@
+"""
+Shared HTTP client for the LLM providers.
+
+One keep-alive requests.Session per provider is shared by every agent in the process, so
+steps reuse TCP/TLS connections. Calls have connect/read timeouts, are retried on connection
+errors, 429 and 5xx with exponential backoff and jitter (honoring Retry-After), and each
+provider has a concurrency limit and an optional token-bucket rate limit.
+
+AsyncLLMClient makes the same calls from an event loop, for agents sharing one (see async_agent.py).
+"""
+import asyncio
+import email.utils
+import random
+import threading
+import time
+import weakref
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+DEFAULT_API_BASES = {
+    'gemini': 'https://generativelanguage.googleapis.com',
+    'openai': 'https://api.openai.com'
+}
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+def _redact_url(text, url):
+    """Removes the query string of a request URL, which holds the Gemini API key, from an error message."""
+    query = url.partition('?')[2]
+    return text.replace(query, '<redacted>') if query else text
+
+
+def _http_error(response, url):
+    """An HTTPError for a failed response that does not reveal the URL's query string."""
+    return requests.exceptions.HTTPError(f"{response.status_code} Error for url: {url.split('?')[0]}", response=response)
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        """
+        :param rate: Tokens added per second.
+        :param capacity: Maximum burst size; defaults to one second worth of tokens.
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self):
+        """Takes a token if one is available. Returns 0, or the seconds until the next token."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        """Blocks until a token is available and takes it. Returns the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            delay = self._take()
+            if not delay:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+    async def acquire_async(self):
+        """Like acquire(), but waits without blocking the event loop."""
+        waited = 0.0
+        while True:
+            delay = self._take()
+            if not delay:
+                return waited
+            await asyncio.sleep(delay)
+            waited += delay
+
+
+class _ProviderState:
+    def __init__(self, pool_size, max_concurrency, requests_per_second, burst):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.bucket = TokenBucket(requests_per_second, burst) if requests_per_second else None
+        self.stats = {'requests': 0, 'retries': 0, 'failures': 0, 'throttled_seconds': 0.0}
+
+
+class LLMClient:
+    def __init__(self, connect_timeout=5, read_timeout=60, max_retries=3, backoff_base=0.5, backoff_max=30,
+                 provider_limits=None):
+        """
+        :param connect_timeout: Seconds to establish a connection.
+        :param read_timeout: Seconds to wait for the response once connected.
+        :param max_retries: Retries after the first attempt for connection errors, timeouts, 429 and 5xx.
+        :param backoff_base: First backoff delay in seconds; doubles on every retry.
+        :param backoff_max: Upper bound of a single backoff delay, including Retry-After.
+        :param provider_limits: Optional {provider: {'max_concurrency': n, 'requests_per_second': r, 'burst': b,
+                                'pool_size': n}} for running many agents at once. Defaults: 8 concurrent calls,
+                                no rate limit.
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.provider_limits = provider_limits or {}
+        self._providers = {}
+        self._lock = threading.Lock()
+
+    def _provider(self, provider):
+        with self._lock:
+            state = self._providers.get(provider)
+            if state is None:
+                limits = self.provider_limits.get(provider, {})
+                max_concurrency = limits.get('max_concurrency', 8)
+                state = _ProviderState(
+                    pool_size=limits.get('pool_size', max_concurrency),
+                    max_concurrency=max_concurrency,
+                    requests_per_second=limits.get('requests_per_second'),
+                    burst=limits.get('burst')
+                )
+                self._providers[provider] = state
+            return state
+
+    def post_json(self, provider, url, headers, payload, stream=False):
+        """
+        POSTs a JSON payload with retries.
+        :param stream: Return as soon as the response headers arrive and leave the body to be read (and the
+                       response closed) by the caller, for streaming endpoints. The concurrency limit covers
+                       the request until then.
+        :return: The successful requests.Response. Its 'attempts' attribute holds the number of attempts made.
+        :raises requests.exceptions.RequestException: Once retries are exhausted or on a non-retryable status. Error
+                                                      messages leave out the URL's query string (the API key).
+        """
+        state = self._provider(provider)
+        attempt = 0
+        while True:
+            attempt += 1
+            retry_after = None
+            if state.bucket:
+                waited = state.bucket.acquire()
+                with self._lock:
+                    state.stats['throttled_seconds'] += waited
+            with state.semaphore:
+                with self._lock:
+                    state.stats['requests'] += 1
+                try:
+                    response = state.session.post(url, headers=headers, json=payload, timeout=self.timeout, stream=stream)
+                    error = None
+                except requests.exceptions.RequestException as e:
+                    error = type(e)(_redact_url(str(e), url), request=e.request, response=e.response)
+                    if not isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+                        with self._lock:
+                            state.stats['failures'] += 1
+                        raise error from None # e.g. InvalidURL or MissingSchema: retrying cannot help
+                    response = None
+
+            if response is not None:
+                response.attempts = attempt
+                if response.status_code not in RETRY_STATUS_CODES:
+                    if not response.ok:
+                        with self._lock:
+                            state.stats['failures'] += 1
+                        raise _http_error(response, url)
+                    return response
+                retry_after = self._retry_after(response)
+                if stream and attempt <= self.max_retries:
+                    response.close()
+
+            if attempt > self.max_retries:
+                with self._lock:
+                    state.stats['failures'] += 1
+                if error is not None:
+                    raise error
+                raise _http_error(response, url)
+
+            with self._lock:
+                state.stats['retries'] += 1
+            time.sleep(self._backoff(attempt, retry_after))
+
+    def _backoff(self, attempt, retry_after):
+        """Full-jitter exponential backoff; a Retry-After from the server takes precedence."""
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1))))
+
+    @staticmethod
+    def _retry_after(response):
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def snapshot(self):
+        """Returns per-provider request, retry and failure counters."""
+        with self._lock:
+            return {provider: dict(state.stats) for provider, state in self._providers.items()}
+
+
+class AsyncLLMClient:
+    def __init__(self, client=None):
+        """
+        Makes LLMClient calls from an event loop. With httpx installed, requests are sent on an httpx.AsyncClient
+        with the LLMClient's timeouts, retries and per-provider limits; otherwise every call runs
+        LLMClient.post_json in a worker thread. Either way, counters go to the LLMClient's snapshot().
+        Usable from several event loops; connections and concurrency limits are kept per loop.
+        :param client: LLMClient to take the settings from. Defaults to the process-wide one at call time.
+        """
+        self._client = client
+        self._loops = weakref.WeakKeyDictionary() # Event loop -> {'http': httpx.AsyncClient, 'semaphores': {...}}
+
+    @property
+    def client(self):
+        return self._client if self._client else get_llm_client()
+
+    def _loop_state(self, provider):
+        client = self.client
+        state = self._loops.get(asyncio.get_running_loop())
+        if state is None:
+            limits = httpx.Limits(max_connections=None, max_keepalive_connections=20)
+            state = self._loops[asyncio.get_running_loop()] = {
+                'http': httpx.AsyncClient(timeout=httpx.Timeout(client.timeout[1], connect=client.timeout[0]), limits=limits),
+                'semaphores': {}
+            }
+        if provider not in state['semaphores']:
+            max_concurrency = client.provider_limits.get(provider, {}).get('max_concurrency', 8)
+            state['semaphores'][provider] = asyncio.Semaphore(max_concurrency)
+        return state['http'], state['semaphores'][provider]
+
+    async def post_json(self, provider, url, headers, payload):
+        """
+        POSTs a JSON payload with retries, like LLMClient.post_json.
+        :return: The successful response (requests.Response, or httpx.Response with httpx) with an 'attempts' attribute.
+        :raises requests.exceptions.RequestException: Also for httpx errors, so callers handle both alike.
+        """
+        client = self.client
+        if httpx is None:
+            return await asyncio.to_thread(client.post_json, provider, url, headers, payload)
+
+        state = client._provider(provider)
+        http, semaphore = self._loop_state(provider)
+        attempt = 0
+        while True:
+            attempt += 1
+            retry_after = None
+            if state.bucket:
+                waited = await state.bucket.acquire_async()
+                with client._lock:
+                    state.stats['throttled_seconds'] += waited
+            async with semaphore:
+                with client._lock:
+                    state.stats['requests'] += 1
+                try:
+                    response = await http.post(url, headers=headers, json=payload)
+                    error = None
+                except httpx.TransportError as e:
+                    response = None
+                    message = _redact_url(str(e), url)
+                    error = requests.exceptions.Timeout(message) if isinstance(e, httpx.TimeoutException) \
+                        else requests.exceptions.ConnectionError(message)
+
+            if response is not None:
+                response.attempts = attempt
+                if response.status_code not in RETRY_STATUS_CODES:
+                    if not response.is_success:
+                        with client._lock:
+                            state.stats['failures'] += 1
+                        raise _http_error(response, url)
+                    return response
+                retry_after = client._retry_after(response)
+
+            if attempt > client.max_retries:
+                with client._lock:
+                    state.stats['failures'] += 1
+                if error is not None:
+                    raise error
+                raise _http_error(response, url)
+
+            with client._lock:
+                state.stats['retries'] += 1
+            await asyncio.sleep(client._backoff(attempt, retry_after))
+
+    async def aclose(self):
+        """Closes the connections of the running event loop, e.g. before it is closed."""
+        state = self._loops.pop(asyncio.get_running_loop(), None)
+        if state:
+            await state['http'].aclose()
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    """Returns the process-wide LLMClient, creating it on first use."""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = LLMClient()
+        return _default_client
+
+
+def set_llm_client(client):
+    """Replaces the process-wide LLMClient, e.g. to configure limits at application start."""
+    global _default_client
+    with _default_client_lock:
+        _default_client = client
+
+
+_default_async_client = AsyncLLMClient()
+
+
+def get_async_llm_client():
+    """Returns the process-wide AsyncLLMClient, which uses the process-wide LLMClient's settings."""
+    return _default_async_client
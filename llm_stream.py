@@ -0,0 +1,157 @@
+"""
+Reading streamed LLM responses.
+
+Gemini streamGenerateContent (with alt=sse) and OpenAI chat completions with "stream": true send
+the response text in server-sent events. stream_text() yields the text pieces, and
+JsonStreamParser parses the JSON they form while it arrives, recording every value as soon as it
+is complete, so the agent can act on "action" and its parameters before the response has ended.
+"""
+import json
+
+
+def iter_sse_data(lines):
+    """Yields the data of every server-sent event from an iterable of decoded lines."""
+    data = []
+    for line in lines:
+        if not line:
+            if data:
+                yield '\n'.join(data)
+                data = []
+            continue
+        if line.startswith(':'):
+            continue
+        field, _, value = line.partition(':')
+        if field == 'data':
+            data.append(value[1:] if value.startswith(' ') else value)
+    if data:
+        yield '\n'.join(data)
+
+
+def stream_text(provider, response):
+    """
+    Yields the pieces of response text from a streaming provider response.
+    :param provider: 'gemini' or 'openai'.
+    :param response: requests.Response opened with stream=True. Chunked responses (as providers send) are read
+                     chunk by chunk as they arrive.
+    """
+    for data in iter_sse_data(response.iter_lines(chunk_size=None, decode_unicode=True)):
+        if data == '[DONE]':
+            return
+        event = json.loads(data)
+        if provider == 'gemini':
+            for candidate in event.get('candidates', [])[:1]:
+                for part in (candidate.get('content') or {}).get('parts', []):
+                    if part.get('text'):
+                        yield part['text']
+        else:
+            for choice in event.get('choices', [])[:1]:
+                content = (choice.get('delta') or {}).get('content')
+                if content:
+                    yield content
+
+
+class JsonStreamParser:
+    """
+    Incremental parser for a JSON object arriving in pieces. Every value is recorded under its path
+    (a tuple of object keys and array indexes, () for the whole object) once it is complete, e.g.
+    ('action',) and ('params', 'id') for {"action": "click_element", "params": {"id": "llm_elem_3"}}.
+    Text before the opening brace is ignored; malformed JSON raises json.JSONDecodeError.
+    """
+    def __init__(self):
+        self.text = ''
+        self.values = {}
+        self.complete = False
+        self._pos = 0
+        self._frames = [] # Open containers: {'kind', 'path', 'key', 'index', 'expect_key', 'value_start', 'start'}
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._started = False
+
+    def feed(self, text):
+        """Adds the next piece of text and records the values it completes."""
+        self.text += text
+        while self._pos < len(self.text) and not self.complete:
+            self._scan(self.text[self._pos], self._pos)
+            self._pos += 1
+
+    def _scan(self, char, i):
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif char == '\\':
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                self._string_end(i)
+            return
+        if not self._started:
+            if char == '{':
+                self._started = True
+                self._frames.append(self._frame('{', (), i))
+            return
+
+        frame = self._frames[-1]
+        if char == '"':
+            self._in_string = True
+            self._string_start = i
+            if not (frame['kind'] == '{' and frame['expect_key']):
+                self._begin_value(frame, i)
+        elif char in '{[':
+            self._begin_value(frame, i)
+            self._frames.append(self._frame(char, self._child_path(frame), i))
+        elif char in '}]':
+            self._end_primitive(frame, i)
+            self._frames.pop()
+            self._record(frame['path'], frame['start'], i + 1)
+            if self._frames:
+                self._frames[-1]['value_start'] = None
+            else:
+                self.complete = True
+        elif char == ',':
+            self._end_primitive(frame, i)
+            if frame['kind'] == '{':
+                frame['expect_key'] = True
+            else:
+                frame['index'] += 1
+        elif char == ':':
+            frame['expect_key'] = False
+        elif not char.isspace():
+            self._begin_value(frame, i)
+
+    @staticmethod
+    def _frame(kind, path, start):
+        return {'kind': kind, 'path': path, 'key': None, 'index': 0, 'expect_key': kind == '{', 'value_start': None, 'start': start}
+
+    @staticmethod
+    def _child_path(frame):
+        return frame['path'] + ((frame['key'],) if frame['kind'] == '{' else (frame['index'],))
+
+    @staticmethod
+    def _begin_value(frame, i):
+        if frame['value_start'] is None:
+            frame['value_start'] = i
+
+    def _string_end(self, i):
+        frame = self._frames[-1]
+        if frame['kind'] == '{' and frame['expect_key']:
+            frame['key'] = json.loads(self.text[self._string_start:i + 1])
+            return
+        self._record(self._child_path(frame), frame['value_start'], i + 1)
+        frame['value_start'] = None
+
+    def _end_primitive(self, frame, end):
+        """Numbers, true, false and null end at the next ',' or closing bracket."""
+        if frame['value_start'] is not None:
+            self._record(self._child_path(frame), frame['value_start'], end)
+            frame['value_start'] = None
+
+    def _record(self, path, start, end):
+        self.values[path] = json.loads(self.text[start:end])
+
+    def get(self, *path):
+        """The completed value at a path, or None."""
+        return self.values.get(path)
+
+    def has(self, *path):
+        return path in self.values
@@ -0,0 +1,186 @@
+"""
+Event-driven detection of when a page has settled after navigation or an action.
+
+Instead of sleeping for a fixed time, the page is instrumented with a fetch/XHR counter and
+a MutationObserver, and polled until the document is loaded, the network has been idle and
+the DOM has stopped changing for the configured windows, or until a hard time cap.
+"""
+import time
+from urllib.parse import urlparse
+
+# Installed before page scripts run (via CDP) or lazily by STATE_SCRIPT. Safe to run twice.
+INSTRUMENT_SCRIPT = """
+(function() {
+    if (window.__llmSettle) return;
+    var state = window.__llmSettle = {pending: 0, lastNetwork: performance.now(), lastMutation: performance.now()};
+    function begin() { state.pending++; state.lastNetwork = performance.now(); }
+    function end() { state.pending = Math.max(0, state.pending - 1); state.lastNetwork = performance.now(); }
+
+    var originalFetch = window.fetch;
+    if (originalFetch) {
+        window.fetch = function() {
+            begin();
+            try {
+                return originalFetch.apply(this, arguments).then(
+                    function(response) { end(); return response; },
+                    function(error) { end(); throw error; });
+            } catch (e) {
+                end();
+                throw e;
+            }
+        };
+    }
+
+    var originalSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function() {
+        begin();
+        this.addEventListener('loadend', end, {once: true});
+        try {
+            return originalSend.apply(this, arguments);
+        } catch (e) {
+            end();
+            throw e;
+        }
+    };
+
+    // Attribute changes are ignored: video players and progress bars restyle themselves continuously.
+    new MutationObserver(function() { state.lastMutation = performance.now(); })
+        .observe(document, {childList: true, subtree: true, characterData: true});
+})();
+"""
+
+STATE_SCRIPT = INSTRUMENT_SCRIPT + """
+var state = window.__llmSettle;
+var now = performance.now();
+return {
+    readyState: document.readyState,
+    host: location.hostname,
+    pending: state.pending,
+    networkIdleMs: now - state.lastNetwork,
+    domIdleMs: now - state.lastMutation
+};
+"""
+
+# Document readyState values accepted for each ready_state setting
+READY_STATES = {'complete': ('complete',), 'interactive': ('interactive', 'complete')}
+
+
+class SettleResult:
+    def __init__(self, label, url, seconds, settled, reason, polls):
+        self.label = label
+        self.url = url
+        self.seconds = seconds
+        self.settled = settled
+        self.reason = reason
+        self.polls = polls
+
+    def to_dict(self):
+        return {
+            'label': self.label,
+            'url': self.url,
+            'seconds': round(self.seconds, 3),
+            'settled': self.settled,
+            'reason': self.reason,
+            'polls': self.polls
+        }
+
+
+class PageSettleWaiter:
+    def __init__(self, driver, dom_idle_ms=500, network_idle_ms=500, timeout=5, poll_interval=0.1, site_overrides=None,
+                 ready_state='complete'):
+        """
+        :param driver: A Selenium WebDriver instance.
+        :param dom_idle_ms: How long the DOM must go without mutations to count as settled.
+        :param network_idle_ms: How long there must be no fetch/XHR in flight to count as settled.
+        :param timeout: Hard cap in seconds; the wait gives up and lets the agent continue.
+        :param poll_interval: Seconds between state polls.
+        :param site_overrides: Optional {hostname: {setting: value}} to tune the windows per site,
+                               e.g. {'www.youtube.com': {'dom_idle_ms': 1000}}. Subdomains match too.
+        :param ready_state: 'complete' waits for the load event, 'interactive' only for the DOM to be parsed
+                            (with blocked images and fonts, or page_load_strategy 'eager', the load event
+                            adds little the agent can use).
+        """
+        self.driver = driver
+        self.defaults = {
+            'dom_idle_ms': dom_idle_ms,
+            'network_idle_ms': network_idle_ms,
+            'timeout': timeout,
+            'poll_interval': poll_interval,
+            'ready_state': ready_state
+        }
+        self.site_overrides = site_overrides or {}
+        self._script_id = None
+
+    def install(self):
+        """
+        Registers the instrumentation to run before any page script on every new document,
+        so requests made during page load are counted too. Only Chromium drivers support this;
+        elsewhere the instrumentation is injected on the first poll instead.
+        """
+        try:
+            result = self.driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': INSTRUMENT_SCRIPT})
+            self._script_id = result.get('identifier')
+        except Exception:
+            self._script_id = None
+
+    def uninstall(self):
+        """Removes the instrumentation registered by install(), e.g. before handing a pooled driver back."""
+        if self._script_id is None:
+            return
+        try:
+            self.driver.execute_cdp_cmd('Page.removeScriptToEvaluateOnNewDocument', {'identifier': self._script_id})
+        except Exception:
+            pass
+        self._script_id = None
+
+    def settings_for(self, host):
+        settings = dict(self.defaults)
+        for site, overrides in self.site_overrides.items():
+            if host == site or host.endswith('.' + site):
+                settings.update(overrides)
+        return settings
+
+    def wait(self, label=''):
+        """
+        Blocks until the current page has settled or the hard cap is reached.
+        :param label: Short description of what is being waited for, kept in the result.
+        :return: A SettleResult.
+        """
+        start = time.monotonic()
+        host = urlparse(self._current_url()).hostname or ''
+        settings = self.settings_for(host)
+        polls = 0
+        reason = 'no state'
+        while True:
+            polls += 1
+            try:
+                state = self.driver.execute_script(STATE_SCRIPT)
+            except Exception as e:
+                # Navigation in progress or the document was replaced mid-poll
+                state = None
+                reason = f"page unavailable ({type(e).__name__})"
+
+            if state:
+                waiting_for = []
+                if state['readyState'] not in READY_STATES[settings['ready_state']]:
+                    waiting_for.append(f"readyState={state['readyState']}")
+                if state['pending'] > 0 or state['networkIdleMs'] < settings['network_idle_ms']:
+                    waiting_for.append(f"network ({state['pending']} pending)")
+                if state['domIdleMs'] < settings['dom_idle_ms']:
+                    waiting_for.append("DOM mutations")
+                if not waiting_for:
+                    return self._result(label, start, True, 'settled', polls)
+                reason = 'still waiting for ' + ', '.join(waiting_for)
+
+            if time.monotonic() - start >= settings['timeout']:
+                return self._result(label, start, False, f"timeout: {reason}", polls)
+            time.sleep(settings['poll_interval'])
+
+    def _current_url(self):
+        try:
+            return self.driver.current_url
+        except Exception:
+            return ''
+
+    def _result(self, label, start, settled, reason, polls):
+        return SettleResult(label, self._current_url(), time.monotonic() - start, settled, reason, polls)
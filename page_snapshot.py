@@ -0,0 +1,222 @@
+"""
+In-page snapshot of interactive elements.
+
+Instead of issuing one WebDriver command per element property (is_displayed,
+is_enabled, tag_name, get_attribute, text, location, size...), the whole page is
+inspected by a single injected script. The script also stamps every matched element
+with its 'data-llm-id' so the agent can locate it again by CSS selector.
+"""
+import json
+
+# Same element set as the XPath used by the WebDriver path:
+# //button | //a | //input[not(@type='hidden')] | //textarea | //select
+INTERACTIVE_SELECTOR = "button, a, input:not([type='hidden' i]), textarea, select"
+
+# Field order of every entry returned by SNAPSHOT_SCRIPT.
+SNAPSHOT_FIELDS = (
+    'index', 'tag', 'id', 'name', 'text', 'value', 'placeholder',
+    'aria_label', 'type', 'class', 'href', 'x', 'y', 'width', 'height'
+)
+
+# Shared by both snapshot scripts. describe() returns one entry in SNAPSHOT_FIELDS order.
+SNAPSHOT_HELPERS = """
+// Mirrors WebDriver's getAttribute(): prefer the DOM property, fall back to the attribute.
+function attr(el, name) {
+    var v = el[name];
+    if (v === undefined || v === null || typeof v === 'object' || typeof v === 'function') {
+        v = el.getAttribute(name);
+    }
+    return v === null || v === undefined ? null : String(v);
+}
+
+function hasArea(el) {
+    var r = el.getBoundingClientRect();
+    if (r.width > 0 && r.height > 0) return true;
+    for (var c = el.firstElementChild; c; c = c.nextElementSibling) {
+        if (hasArea(c)) return true;
+    }
+    return false;
+}
+
+function isShown(el) {
+    if (el.checkVisibility && !el.checkVisibility({
+            checkOpacity: true, checkVisibilityCSS: true,
+            opacityProperty: true, visibilityProperty: true})) {
+        return false;
+    }
+    var style = window.getComputedStyle(el);
+    if (style.display === 'none' || style.visibility === 'hidden' || style.visibility === 'collapse') {
+        return false;
+    }
+    return hasArea(el);
+}
+
+function rect(el) {
+    var r = el.getBoundingClientRect();
+    return [Math.round(r.left + window.scrollX), Math.round(r.top + window.scrollY), Math.trunc(r.width), Math.trunc(r.height)];
+}
+
+function describe(el, index) {
+    el.setAttribute('data-llm-id', 'llm_elem_' + index);
+    var tag = el.tagName.toLowerCase();
+    return [
+        index,
+        tag,
+        el.id || null,
+        attr(el, 'name'),
+        el.innerText || null,
+        attr(el, 'value'),
+        attr(el, 'placeholder'),
+        el.getAttribute('aria-label'),
+        tag === 'input' ? attr(el, 'type') : null,
+        el.getAttribute('class') || '',
+        tag === 'a' ? attr(el, 'href') : null
+    ].concat(rect(el));
+}
+"""
+
+SNAPSHOT_SCRIPT = SNAPSHOT_HELPERS + """
+var selector = arguments[0];
+var nodes = document.querySelectorAll(selector);
+var out = [];
+for (var i = 0; i < nodes.length; i++) {
+    var el = nodes[i];
+    try {
+        if (!isShown(el) || el.matches(':disabled')) continue;
+        out.push(describe(el, i));
+    } catch (e) {
+        continue;
+    }
+}
+return JSON.stringify({vw: window.innerWidth, vh: window.innerHeight, els: out});
+"""
+
+# Attributes whose changes can alter an element's entry or the visibility of its subtree
+WATCHED_ATTRIBUTES = ['class', 'style', 'hidden', 'disabled', 'aria-label', 'placeholder', 'name', 'id', 'type', 'href', 'value']
+
+# Incremental passes after which every element is described again anyway: stylesheet and media query
+# changes can show or hide elements without a DOM mutation the observer would see
+REFRESH_EVERY_PASSES = 10
+
+# Keeps per-document state in window.__llmSnapshot and a MutationObserver recording what changed.
+# Elements outside changed subtrees are returned as [index, x, y, width, height] only, and keep their
+# data-llm-id; new elements get fresh ids. The first call on a document (or forceFull) describes everything;
+# so does a pass after the page scrolled or the viewport was resized, and every refreshEvery-th pass.
+INCREMENTAL_SNAPSHOT_SCRIPT = SNAPSHOT_HELPERS + """
+var selector = arguments[0], forceFull = arguments[1], watched = arguments[2], refreshEvery = arguments[3];
+var state = window.__llmSnapshot;
+var full = forceFull || !state;
+var view = [window.scrollX, window.scrollY, window.innerWidth, window.innerHeight].join(',');
+if (full) {
+    if (state) state.observer.disconnect();
+    state = window.__llmSnapshot = {counter: 0, known: new Map(), roots: [], texts: [], overflow: false, passes: 0, view: view};
+    state.observer = new MutationObserver(function(records) {
+        for (var k = 0; k < records.length; k++) {
+            var record = records[k];
+            if (record.type === 'attributes') {
+                state.roots.push(record.target); // May change the element and the visibility of its subtree
+            } else if (record.type === 'characterData') {
+                if (record.target.parentNode) state.texts.push(record.target.parentNode); // Changes ancestors' text
+            } else {
+                state.texts.push(record.target);
+                for (var a = 0; a < record.addedNodes.length; a++) state.roots.push(record.addedNodes[a]);
+            }
+        }
+        if (state.roots.length + state.texts.length > 300) {
+            state.overflow = true;
+            state.roots = [];
+            state.texts = [];
+        }
+    });
+    state.observer.observe(document, {childList: true, subtree: true, characterData: true,
+                                      attributes: true, attributeFilter: watched});
+}
+
+state.passes++;
+var everything = full || state.overflow || view !== state.view || state.passes % refreshEvery === 0;
+var roots = state.roots, texts = state.texts;
+state.roots = [];
+state.texts = [];
+state.overflow = false;
+state.view = view;
+// Elements removed from the document (e.g. by SPA navigations) are never returned again
+state.known.forEach(function(index, el) {
+    if (!el.isConnected) state.known.delete(el);
+});
+
+function changed(el) {
+    if (everything) return true;
+    for (var k = 0; k < roots.length; k++) {
+        if (roots[k] === el || (roots[k].contains && roots[k].contains(el))) return true;
+    }
+    for (var k = 0; k < texts.length; k++) {
+        if (el.contains(texts[k])) return true;
+    }
+    return false;
+}
+
+var nodes = document.querySelectorAll(selector);
+var out = [], reextracted = 0, reused = 0;
+for (var i = 0; i < nodes.length; i++) {
+    var el = nodes[i];
+    try {
+        var index = state.known.get(el);
+        var tag = el.tagName;
+        // Form values change without DOM mutations, so form fields are always described again
+        if (index !== undefined && tag !== 'INPUT' && tag !== 'TEXTAREA' && tag !== 'SELECT' && !changed(el)) {
+            out.push([index].concat(rect(el)));
+            reused++;
+            continue;
+        }
+        if (!isShown(el) || el.matches(':disabled')) {
+            state.known.delete(el);
+            continue;
+        }
+        if (index === undefined) index = full ? i : state.counter++;
+        state.known.set(el, index);
+        out.push(describe(el, index));
+        reextracted++;
+    } catch (e) {
+        continue;
+    }
+}
+if (full) state.counter = nodes.length;
+return JSON.stringify({vw: window.innerWidth, vh: window.innerHeight, full: full, els: out,
+                       reextracted: reextracted, reused: reused});
+"""
+
+
+def take_snapshot(driver):
+    """
+    Runs SNAPSHOT_SCRIPT in the current page in one WebDriver round trip.
+    :param driver: A Selenium WebDriver instance.
+    :return: Tuple of (viewport_width, viewport_height, list of raw element dicts keyed by SNAPSHOT_FIELDS).
+    """
+    result = json.loads(driver.execute_script(SNAPSHOT_SCRIPT, INTERACTIVE_SELECTOR))
+    elements = [dict(zip(SNAPSHOT_FIELDS, entry)) for entry in result['els']]
+    return result['vw'], result['vh'], elements
+
+
+def take_incremental_snapshot(driver, previous):
+    """
+    Runs INCREMENTAL_SNAPSHOT_SCRIPT and merges its result with the previous snapshot of the same document.
+    :param driver: A Selenium WebDriver instance.
+    :param previous: {index: raw element dict} from the last call, or None to describe every element.
+    :return: Tuple of (viewport_width, viewport_height, list of raw element dicts, info dictionary with
+             'full', 'reextracted' and 'reused').
+    """
+    result = json.loads(driver.execute_script(
+        INCREMENTAL_SNAPSHOT_SCRIPT, INTERACTIVE_SELECTOR, previous is None, WATCHED_ATTRIBUTES, REFRESH_EVERY_PASSES
+    ))
+    elements = []
+    for entry in result['els']:
+        if len(entry) == len(SNAPSHOT_FIELDS):
+            elements.append(dict(zip(SNAPSHOT_FIELDS, entry)))
+            continue
+        base = previous.get(entry[0]) if previous else None
+        if base is None:
+            # The page kept state this process does not have (e.g. another agent used the tab); start over
+            return take_incremental_snapshot(driver, None)
+        elements.append(dict(base, x=entry[1], y=entry[2], width=entry[3], height=entry[4]))
+    info = {'full': result['full'], 'reextracted': result['reextracted'], 'reused': result['reused']}
+    return result['vw'], result['vh'], elements, info
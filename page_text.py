@@ -0,0 +1,217 @@
+"""
+Extraction of the visible page text sent to the LLM.
+
+The text is capped at TEXT_LIMIT characters, so instead of building a BeautifulSoup tree of the
+whole page_source (often several MB) the HTML is fed to a streaming parser in chunks and parsing
+stops as soon as the budget is filled. The result is the same as the BeautifulSoup version kept
+in soup_text(). lxml's parser is used when it is installed, the standard library's otherwise.
+Alternatively the text can be collected in the browser, which avoids transferring page_source.
+"""
+from html.parser import HTMLParser
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+TEXT_LIMIT = 2000
+CHUNK_SIZE = 64 * 1024
+
+# Strings inside these tags are not part of BeautifulSoup's get_text() (scripts and styles are removed,
+# the others are special string containers)
+SKIPPED_TAGS = {'script', 'style', 'template', 'rt', 'rp'}
+# Same as BeautifulSoup's HTML tree builder: these never contain text and are closed right away
+VOID_TAGS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem', 'meta', 'param',
+    'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex', 'nextid', 'spacer'
+}
+
+# Walks the live DOM like the parsers walk page_source and stops once the budget is filled
+BROWSER_TEXT_SCRIPT = """
+var limit = arguments[0], skipped = arguments[1];
+var parts = [], length = -1;
+var walker = document.createTreeWalker(document.documentElement, NodeFilter.SHOW_ELEMENT | NodeFilter.SHOW_TEXT, {
+    acceptNode: function(node) {
+        if (node.nodeType !== Node.ELEMENT_NODE) return NodeFilter.FILTER_ACCEPT;
+        return skipped.indexOf(node.localName) !== -1 ? NodeFilter.FILTER_REJECT : NodeFilter.FILTER_SKIP;
+    }
+});
+while (length <= limit && walker.nextNode()) {
+    var text = walker.currentNode.data.trim();
+    if (!text) continue;
+    parts.push(text);
+    length += text.length + 1;
+}
+return parts.join(' ');
+"""
+
+
+class _BudgetReached(Exception):
+    pass
+
+
+class _TextCollector:
+    """
+    Receives parser events and joins the stripped strings like get_text(separator=' ', strip=True),
+    raising _BudgetReached once more than `limit` characters are collected.
+    """
+    def __init__(self, limit):
+        self.limit = limit
+        self.parts = []
+        self.length = -1 # No separator before the first part
+        self._stack = [] # Open tags, as BeautifulSoup nests them
+        self._skipping = 0 # Open tags from SKIPPED_TAGS
+        self._buffer = []
+
+    def start(self, tag):
+        self.flush()
+        if tag in VOID_TAGS:
+            return
+        self._stack.append(tag)
+        if tag in SKIPPED_TAGS:
+            self._skipping += 1
+
+    def end(self, tag):
+        self.flush()
+        if tag not in self._stack:
+            return # Stray end tags are ignored
+        while self._stack:
+            closed = self._stack.pop()
+            if closed in SKIPPED_TAGS:
+                self._skipping -= 1
+            if closed == tag:
+                break
+
+    def data(self, text):
+        # Parsers may report one text node in several pieces; it only ends at the next tag or comment
+        self._buffer.append(text)
+
+    def flush(self, cdata=False):
+        if not self._buffer:
+            return
+        text = ''.join(self._buffer).strip()
+        self._buffer = []
+        # CDATA sections are kept even inside skipped containers, as BeautifulSoup does
+        if text and (cdata or not self._skipping):
+            self.parts.append(text)
+            self.length += len(text) + 1
+            if self.length > self.limit:
+                raise _BudgetReached()
+
+    def text(self):
+        return ' '.join(self.parts)
+
+
+class _StdlibParser(HTMLParser):
+    # Character references are decoded as HTML5 specifies. That differs from BeautifulSoup only for
+    # references without ';' followed by letters (e.g. '&copyx'), which browsers never serialize.
+    def __init__(self, collector):
+        super().__init__(convert_charrefs=True)
+        self.collector = collector
+
+    def handle_starttag(self, tag, attrs):
+        self.collector.start(tag)
+
+    def handle_endtag(self, tag):
+        self.collector.end(tag)
+
+    def handle_data(self, data):
+        self.collector.data(data)
+
+    def handle_comment(self, data):
+        self.collector.flush()
+
+    def handle_decl(self, decl):
+        self.collector.flush()
+
+    def handle_pi(self, data):
+        self.collector.flush()
+
+    def unknown_decl(self, data):
+        self.collector.flush()
+        if data.startswith('CDATA['):
+            self.collector.data(data[len('CDATA['):])
+            self.collector.flush(cdata=True)
+
+
+class _LxmlTarget:
+    """Parser target for lxml.etree.HTMLParser forwarding events to a _TextCollector."""
+    def __init__(self, collector):
+        self.collector = collector
+
+    def start(self, tag, attrib):
+        self.collector.start(tag)
+
+    def end(self, tag):
+        self.collector.end(tag)
+
+    def data(self, data):
+        self.collector.data(data)
+
+    def comment(self, text):
+        self.collector.flush()
+
+    def pi(self, target, data=None):
+        self.collector.flush()
+
+    def close(self):
+        return None
+
+
+def default_backend():
+    """'lxml' when lxml is installed, otherwise 'html.parser'."""
+    return 'lxml' if etree is not None else 'html.parser'
+
+
+def truncate(text, limit=TEXT_LIMIT):
+    return text[:limit] + "..." if len(text) > limit else text
+
+
+def extract_text(html, limit=TEXT_LIMIT, backend=None):
+    """
+    Visible text of an HTML document, stopping as soon as `limit` characters are collected.
+    :param html: The page source.
+    :param limit: Characters to keep; longer texts are cut and end with '...'.
+    :param backend: 'lxml' or 'html.parser'. Defaults to default_backend().
+    :return: The same string as soup_text(html, limit).
+    """
+    backend = backend or default_backend()
+    collector = _TextCollector(limit)
+    if backend == 'lxml':
+        if etree is None:
+            raise ValueError("The 'lxml' text backend needs lxml installed.")
+        parser = etree.HTMLParser(target=_LxmlTarget(collector))
+    elif backend == 'html.parser':
+        parser = _StdlibParser(collector)
+    else:
+        raise ValueError(f"Unknown text backend: {backend}")
+
+    try:
+        for start in range(0, len(html), CHUNK_SIZE):
+            parser.feed(html[start:start + CHUNK_SIZE])
+        parser.close()
+        collector.flush()
+    except _BudgetReached:
+        pass
+    return truncate(collector.text(), limit)
+
+
+def extract_text_in_browser(driver, limit=TEXT_LIMIT):
+    """
+    Collects the visible text from the live DOM with BROWSER_TEXT_SCRIPT in one WebDriver round trip.
+    Whitespace trimming follows JavaScript rather than Python, so rare characters may differ from extract_text.
+    :param driver: A Selenium WebDriver instance.
+    """
+    return truncate(driver.execute_script(BROWSER_TEXT_SCRIPT, limit, sorted(SKIPPED_TAGS)) or '', limit)
+
+
+def soup_text(html, limit=TEXT_LIMIT):
+    """
+    Reference implementation: parses the whole page with BeautifulSoup. Kept for parity checks and benchmarks.
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    for script_or_style in soup(["script", "style"]):
+        script_or_style.extract()
+    return truncate(soup.get_text(separator=' ', strip=True), limit)
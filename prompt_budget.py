@@ -0,0 +1,120 @@
+"""
+Compaction of the page context before it is sent to the LLM.
+
+Elements are ranked by how likely they are to matter for the next action (viewport visibility,
+lexical overlap with the task, cookie/skip-ad/video flags) and only the best ones that fit the
+token budget are kept, serialized without indentation and without redundant keys.
+"""
+import json
+import math
+import re
+
+# Rough average for English text and JSON with both Gemini and OpenAI tokenizers
+CHARS_PER_TOKEN = 4
+MAX_ELEMENT_TEXT = 80
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    'the', 'and', 'for', 'from', 'with', 'that', 'this', 'then', 'click', 'on', 'into', 'any',
+    'once', 'its', 'are', 'was', 'state', 'task', 'complete', 'page', 'first', 'one', 'if', 'is'
+}
+_TYPING_WORDS = {'search', 'type', 'enter', 'find', 'query', 'login', 'log', 'sign', 'fill', 'write'}
+_VIDEO_WORDS = {'video', 'play', 'watch', 'song', 'songs', 'music'}
+
+
+def estimate_tokens(text):
+    """Estimates the number of tokens in a string without calling a tokenizer."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def to_json(value):
+    """Compact JSON serialization used in prompts."""
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+
+def task_terms(task_description):
+    """Lowercase content words of the task used for lexical scoring."""
+    return {word for word in _WORD_RE.findall(task_description.lower()) if len(word) > 2 and word not in _STOPWORDS}
+
+
+def score_element(elem, terms):
+    """
+    Scores how likely an element is to be the target of the next action.
+    :param elem: An entry of 'interactive_elements'.
+    :param terms: Result of task_terms().
+    """
+    visible = elem.get('is_visible_in_viewport', False)
+    score = 3.0 if visible else 0.0
+
+    if elem.get('is_cookie_consent_button') and visible:
+        score += 6
+    if elem.get('is_skip_ad_button') and visible:
+        score += 6
+    if elem.get('is_video_link'):
+        score += 2 if terms & _VIDEO_WORDS else 0.5
+    if elem['tag'] in ('input', 'textarea') and terms & _TYPING_WORDS:
+        score += 3
+
+    label = ' '.join(str(elem.get(key, '')) for key in ('text', 'aria_label', 'placeholder', 'name', 'original_html_id', 'value'))
+    words = set(_WORD_RE.findall(label.lower()))
+    score += 2 * min(len(terms & words), 4)
+    return score
+
+
+def compact_element(elem):
+    """Drops keys the LLM does not need and trims long texts."""
+    compact = {'id': elem['id'], 'tag': elem['tag']}
+    text = elem.get('text')
+    if text:
+        compact['text'] = text if len(text) <= MAX_ELEMENT_TEXT else text[:MAX_ELEMENT_TEXT] + '...'
+    for key in ('original_html_id', 'name', 'type', 'value', 'placeholder'):
+        if elem.get(key):
+            compact[key] = elem[key]
+    aria_label = elem.get('aria_label')
+    if aria_label and aria_label not in (text, elem.get('placeholder')):
+        compact['aria_label'] = aria_label
+    # Flags are only sent when true; bounding boxes are summed up by is_visible_in_viewport
+    for flag in ('is_visible_in_viewport', 'is_cookie_consent_button', 'is_skip_ad_button', 'is_video_link'):
+        if elem.get(flag):
+            compact[flag] = True
+    return compact
+
+
+def compact_page_context(page_context, task_description, max_tokens=4000, max_elements=80, reserved_tokens=0, preferred_ids=()):
+    """
+    Keeps the highest ranked elements that fit into the token budget.
+    :param page_context: Dictionary returned by AIAgent._get_page_context.
+    :param task_description: The task, used for lexical relevance.
+    :param max_tokens: Token budget for the serialized page context.
+    :param max_elements: Upper bound on the number of elements kept.
+    :param reserved_tokens: Tokens of the rest of the prompt, subtracted from the budget.
+    :param preferred_ids: Element ids ranked above all others, e.g. those the prompt refers to.
+    :return: Tuple of (compacted page context, stats dictionary).
+    """
+    elements = page_context.get('interactive_elements', [])
+    terms = task_terms(task_description)
+    order = {elem['id']: position for position, elem in enumerate(elements)}
+    preferred = set(preferred_ids)
+    ranked = sorted(elements, key=lambda elem: (elem['id'] not in preferred, -score_element(elem, terms), order[elem['id']]))
+
+    compact = {
+        'current_url': page_context.get('current_url'),
+        'text_content': page_context.get('text_content', '')
+    }
+    budget = max_tokens - reserved_tokens - estimate_tokens(to_json(compact))
+    kept = []
+    for elem in ranked:
+        if len(kept) >= max_elements:
+            break
+        entry = compact_element(elem)
+        cost = estimate_tokens(to_json(entry)) + 1
+        if cost > budget:
+            continue
+        kept.append(entry)
+        budget -= cost
+
+    # Document order matters for instructions like "click the first result"
+    kept.sort(key=lambda entry: order[entry['id']])
+    compact['interactive_elements'] = kept
+    stats = {'elements_total': len(elements), 'elements_kept': len(kept)}
+    return compact, stats
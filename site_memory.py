@@ -0,0 +1,259 @@
+"""
+Per-site memory of how earlier tasks were completed, so similar tasks need fewer LLM calls.
+
+When a task completes, its trajectory (the page URL and the action of every step, with elements
+identified by their signatures as in decision_cache.py) is stored under the task's site. Text the
+agent typed is replaced by a slot where it appears in the task, so "Search for cats" and "Search
+for dogs" share the template "search for {query}". A later task matching a template and starting
+on the same page:
+- jumps straight to the deepest remembered URL that contains the slot, e.g. a search results URL,
+- replays the remembered steps after it without the LLM while every page matches the remembered
+  one (task_complete is always left to the LLM),
+- and gets prompt hints naming the elements earlier tasks used on the pages it reaches.
+A trajectory is dropped after max_failures failed replays in a row.
+"""
+import re
+import threading
+import time
+from urllib.parse import quote, quote_plus, urlparse
+
+from decision_cache import ELEMENT_ACTIONS, MemoryBackend, SQLiteBackend, decode_action, normalize_text, url_pattern
+
+SLOT = '{query}'
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def site_of(url):
+    """The site a URL belongs to: its hostname without 'www.'."""
+    host = (urlparse(url or '').hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+def task_template(task_description, typed_texts):
+    """
+    Replaces the first typed text that appears in the task with SLOT.
+    :return: Tuple of (normalized template, slot value as typed), the value being None without a slot.
+    """
+    task = normalize_text(task_description)
+    for text in typed_texts:
+        value = normalize_text(text)
+        match = re.search(r'(?<!\w)' + re.escape(value) + r'(?!\w)', task) if len(value) >= 2 else None
+        if match:
+            return task[:match.start()] + SLOT + task[match.end():], _SPACE_RE.sub(' ', str(text)).strip()
+    return task, None
+
+
+def match_template(template, task_description):
+    """
+    :return: The slot value the task fills in (in the task's own case), '' for a matching template
+             without a slot, or None if the task does not match.
+    """
+    if SLOT not in template:
+        return '' if normalize_text(task_description) == template else None
+    before, after = template.split(SLOT, 1)
+    task = _SPACE_RE.sub(' ', str(task_description or '')).strip()
+    match = re.fullmatch(re.escape(before) + '(.+?)' + re.escape(after), task, re.IGNORECASE)
+    return match.group(1) if match else None
+
+
+def _templatize_url(url, value):
+    base, separator, query = url.partition('?')
+    for encoded in (quote(value, safe=''), quote_plus(value)):
+        base = base.replace(encoded, SLOT)
+    for encoded in (quote_plus(value), quote(value, safe='')):
+        query = query.replace(encoded, SLOT)
+    return base + separator + query
+
+
+def _fill_url(url, value):
+    base, separator, query = url.partition('?')
+    return base.replace(SLOT, quote(value, safe='')) + separator + query.replace(SLOT, quote_plus(value))
+
+
+def _map_step(step, url_func, text_func):
+    params = dict(step['record'].get('params') or {})
+    if isinstance(params.get('url'), str):
+        params['url'] = url_func(params['url'])
+    if isinstance(params.get('text'), str):
+        params['text'] = text_func(params['text'])
+    return {'url': url_func(step['url']), 'record': dict(step['record'], params=params)}
+
+
+def templatize_step(step, value):
+    """Replaces the slot value in a step's page URL, typed text and navigation URL with SLOT."""
+    if not value:
+        return _map_step(step, lambda url: url, lambda text: text)
+    value_re = re.compile(re.escape(value), re.IGNORECASE)
+    return _map_step(step, lambda url: _templatize_url(url, value), lambda text: value_re.sub(SLOT, text))
+
+
+def fill_step(step, value):
+    """The inverse of templatize_step for a new slot value."""
+    return _map_step(step, lambda url: _fill_url(url, value), lambda text: text.replace(SLOT, value))
+
+
+class SiteMemory:
+    def __init__(self, max_sites=500, max_trajectories_per_site=20, ttl_seconds=30 * 24 * 3600, max_failures=2,
+                 min_successes=1, sqlite_path=None):
+        """
+        :param max_sites: Least recently used sites beyond this are evicted.
+        :param max_trajectories_per_site: Trajectories kept per site; the least successful are evicted.
+        :param ttl_seconds: Trajectories without a success for this long are dropped.
+        :param max_failures: Failed replays in a row after which a trajectory is dropped.
+        :param min_successes: Successful runs a trajectory needs before it is replayed.
+        :param sqlite_path: Optional SQLite file to keep the memory across restarts and processes.
+        """
+        self.max_trajectories_per_site = max_trajectories_per_site
+        self.ttl_seconds = ttl_seconds
+        self.max_failures = max_failures
+        self.min_successes = min_successes
+        self._backend = SQLiteBackend(sqlite_path, max_sites, table='site_memory') if sqlite_path else MemoryBackend(max_sites)
+        self._lock = threading.Lock()
+        self.stats = {'lookups': 0, 'hits': 0, 'misses': 0, 'url_jumps': 0, 'replayed_steps': 0, 'llm_calls_saved': 0,
+                      'hinted_prompts': 0, 'records': 0, 'replay_failures': 0, 'invalidations': 0, 'evictions': 0,
+                      'expired': 0}
+
+    def _load(self, site):
+        """The site's live trajectories, dropping expired ones. Call with the lock held."""
+        entry = self._backend.get(site)
+        if not entry:
+            return []
+        trajectories = entry[0]['trajectories']
+        live = [trajectory for trajectory in trajectories if time.time() - trajectory['last_success'] <= self.ttl_seconds]
+        if len(live) != len(trajectories):
+            self.stats['expired'] += len(trajectories) - len(live)
+            self._save(site, live)
+        return live
+
+    def _save(self, site, trajectories):
+        if trajectories:
+            self.stats['evictions'] += self._backend.put(site, {'trajectories': trajectories}, time.time())
+        else:
+            self._backend.delete(site)
+
+    @staticmethod
+    def _find_trajectory(trajectories, template, start, steps):
+        return next((trajectory for trajectory in trajectories if trajectory['template'] == template
+                     and trajectory['start'] == start and trajectory['steps'] == steps), None)
+
+    def find(self, initial_url, task_description):
+        """
+        Looks for a remembered way to do a task.
+        :return: A route dictionary with 'site', 'template', 'start', 'value' (the slot value), 'steps' (filled in for
+                 this task, each with 'url' and 'record'), 'replayable' (steps before task_complete), 'jump' (index
+                 of the step the task can start at), 'jump_url' (None without a jump) and 'recorded_steps' (the
+                 stored steps, identifying the trajectory), or None.
+        """
+        site = site_of(initial_url)
+        start = url_pattern(initial_url)
+        with self._lock:
+            self.stats['lookups'] += 1
+            trajectories = self._load(site) if site else []
+            trajectories = sorted(trajectories, key=lambda trajectory: (-trajectory['successes'], -trajectory['last_success']))
+            for trajectory in trajectories:
+                if trajectory['start'] != start or trajectory['successes'] < self.min_successes:
+                    continue
+                value = match_template(trajectory['template'], task_description)
+                if value is None:
+                    continue
+                self.stats['hits'] += 1
+                steps = [fill_step(step, value) for step in trajectory['steps']]
+                replayable = next((index for index, step in enumerate(steps) if step['record']['action'] == 'task_complete'), len(steps))
+                jump = trajectory['jump']
+                return {
+                    'site': site,
+                    'template': trajectory['template'],
+                    'start': start,
+                    'value': value,
+                    'steps': steps,
+                    'replayable': replayable,
+                    'jump': jump,
+                    'jump_url': steps[jump]['url'] if jump is not None else None,
+                    'recorded_steps': trajectory['steps']
+                }
+            self.stats['misses'] += 1
+            return None
+
+    def record(self, initial_url, task_description, steps):
+        """
+        Remembers the trajectory of a completed task.
+        :param steps: Executed steps in order, each {'url': page URL, 'record': action record} with element ids
+                      replaced by signatures (decision_cache.encode_action), ending with task_complete.
+        """
+        site = site_of(initial_url)
+        if not site or not steps:
+            return
+        typed = [step['record']['params'].get('text') for step in steps
+                 if step['record']['action'] == 'type_text' and step['record']['params'].get('text')]
+        template, value = task_template(task_description, typed)
+        steps = [templatize_step(step, value) for step in steps]
+        # The deepest page whose URL the slot value builds can be opened directly
+        jump = next((index for index in range(len(steps) - 1, 0, -1) if SLOT in steps[index]['url']), None)
+        now = time.time()
+        with self._lock:
+            trajectories = self._load(site)
+            start = url_pattern(initial_url)
+            # A different way to do the same task is kept next to the known ones; successes rank them
+            existing = self._find_trajectory(trajectories, template, start, steps)
+            if existing:
+                existing['successes'] += 1
+                existing['failures'] = 0
+                existing['last_success'] = now
+            else:
+                trajectories.append({'template': template, 'start': start, 'steps': steps, 'jump': jump, 'successes': 1,
+                                     'failures': 0, 'last_success': now, 'created_at': now})
+            trajectories.sort(key=lambda trajectory: (-trajectory['successes'], -trajectory['last_success']))
+            self.stats['evictions'] += max(len(trajectories) - self.max_trajectories_per_site, 0)
+            self._save(site, trajectories[:self.max_trajectories_per_site])
+            self.stats['records'] += 1
+
+    def fail(self, route):
+        """Counts a failed replay of a route; the trajectory is dropped after max_failures in a row."""
+        with self._lock:
+            self.stats['replay_failures'] += 1
+            trajectories = self._load(route['site'])
+            trajectory = self._find_trajectory(trajectories, route['template'], route['start'], route['recorded_steps'])
+            if not trajectory:
+                return
+            trajectory['failures'] += 1
+            if trajectory['failures'] >= self.max_failures:
+                trajectories.remove(trajectory)
+                self.stats['invalidations'] += 1
+            self._save(route['site'], trajectories)
+
+    def hints(self, page_context, limit=5):
+        """
+        Elements on the current page that remembered trajectories of its site used on the same URL pattern.
+        :return: List of (element id, action) on the current page, most successful trajectories first.
+        """
+        url = page_context.get('current_url')
+        site = site_of(url)
+        if not site:
+            return []
+        pattern = url_pattern(url)
+        with self._lock:
+            trajectories = sorted(self._load(site), key=lambda trajectory: -trajectory['successes'])
+        hints, seen = [], set()
+        for trajectory in trajectories:
+            for step in trajectory['steps']:
+                if step['record']['action'] not in ELEMENT_ACTIONS or url_pattern(step['url']) != pattern:
+                    continue
+                action = decode_action(step['record'], page_context)
+                if action and action['params']['id'] not in seen:
+                    seen.add(action['params']['id'])
+                    hints.append((action['params']['id'], action['action']))
+                    if len(hints) >= limit:
+                        return hints
+        return hints
+
+    def count(self, name, amount=1):
+        """Adds to a usage counter ('url_jumps', 'replayed_steps', 'llm_calls_saved', 'hinted_prompts')."""
+        with self._lock:
+            self.stats[name] += amount
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats, sites=len(self._backend))
+        stats['hit_rate'] = round(stats['hits'] / stats['lookups'], 3) if stats['lookups'] else 0.0
+        return stats
@@ -0,0 +1,12 @@
+"""
+Tests run with `python -m pytest` from the repository root. The modules live at the top level and
+the mock provider in benchmarks/, so both go on the import path.
+"""
+import pathlib
+import sys
+
+REPO_ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+for path in (REPO_ROOT, REPO_ROOT / 'benchmarks'):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
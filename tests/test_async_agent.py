@@ -0,0 +1,27 @@
+"""AsyncAIAgent.run_task with and without a running event loop in the calling thread."""
+import asyncio
+import threading
+
+from async_agent import AsyncAIAgent
+
+
+class RecordingAgent(AsyncAIAgent):
+    async def run_task_async(self, initial_url, task_description, max_steps=7, max_actions=None):
+        return [threading.current_thread().name, initial_url, task_description]
+
+
+def agent():
+    return RecordingAgent(driver=object(), llm_config={'provider': 'gemini', 'model': 'mock', 'api_key': 'key'})
+
+
+def test_runs_on_the_calling_thread_without_a_loop():
+    logs = agent().run_task('https://example.test', 'Do it')
+    assert logs == [threading.current_thread().name, 'https://example.test', 'Do it']
+
+
+def test_runs_on_a_worker_thread_inside_a_running_loop():
+    async def main():
+        return agent().run_task('https://example.test', 'Do it')
+
+    logs = asyncio.run(main())
+    assert logs[0].startswith('agent-task') and logs[1:] == ['https://example.test', 'Do it']
@@ -0,0 +1,119 @@
+"""Element signatures, encode/decode of actions, and eviction of the decision cache."""
+import pytest
+
+import decision_cache
+from decision_cache import (DecisionCache, MemoryBackend, SQLiteBackend, decode_action, element_signature, encode_action,
+                            page_fingerprint, url_pattern)
+
+LLM_CONFIG = {'provider': 'gemini', 'model': 'm'}
+
+
+def elem(index, tag='button', text=None, **extra):
+    return dict({'id': f'llm_elem_{index}', 'tag': tag, 'text': text}, **extra)
+
+
+def page(elements, url='https://shop.test/item/123?b=2&a=1'):
+    return {'current_url': url, 'interactive_elements': elements}
+
+
+def test_signature_ignores_id_position_value_and_whitespace():
+    first = elem(1, 'input', name='q', placeholder='Search', value='cats', is_visible_in_viewport=True)
+    second = elem(9, 'input', name='Q ', placeholder='  search', value='dogs', is_visible_in_viewport=False)
+    assert element_signature(first) == element_signature(second)
+    assert element_signature(first) != element_signature(elem(1, 'input', name='q', placeholder='Find'))
+
+
+def test_url_pattern_wildcards_volatile_segments_and_sorts_query_keys():
+    assert url_pattern('https://shop.test/item/123/deadbeefcafe?b=2&a=1') == 'https://shop.test/item/*/*?a&b'
+    assert url_pattern('https://shop.test/item/456/f00dfeedbead?a=9&b=') == 'https://shop.test/item/*/*?a&b'
+    assert url_pattern('https://shop.test/items') == 'https://shop.test/items'
+    assert url_pattern(None) == '://'
+
+
+def test_fingerprint_is_structural():
+    before = page([elem(0, text='Buy'), elem(1, text='Share')])
+    after = page([elem(5, text='Buy'), elem(6, text='Share')], url='https://shop.test/item/999?a=3&b=4')
+    assert page_fingerprint(before) == page_fingerprint(after)
+    assert page_fingerprint(before) != page_fingerprint(page([elem(0, text='Buy')]))
+
+
+@pytest.mark.parametrize('response', [
+    {'action': 'click_element', 'params': {'id': 'llm_elem_2'}},
+    {'action': 'type_text', 'params': {'id': 'llm_elem_0', 'text': 'red pandas'}},
+    {'action': 'navigate_to', 'params': {'url': 'https://shop.test/cart'}},
+])
+def test_round_trip_onto_renumbered_page(response):
+    original = page([elem(0, 'input', placeholder='Search'), elem(1, text='Add to cart'), elem(2, text='Add to cart')])
+    renumbered = page([elem(10, 'input', placeholder='Search'), elem(11, text='Add to cart'), elem(12, text='Add to cart')])
+    record = encode_action(response, original)
+    assert 'id' not in record['params']
+    decoded = decode_action(record, renumbered)
+    expected = dict(response['params'])
+    if 'id' in expected:
+        expected['id'] = 'llm_elem_1' + expected['id'][-1] # The same occurrence of a repeated signature
+    assert decoded == {'action': response['action'], 'params': expected}
+
+
+def test_encode_skips_uncacheable_actions_and_unknown_ids():
+    context = page([elem(0, text='Go')])
+    assert encode_action({'action': 'task_complete', 'params': {'message': 'done'}}, context) is None
+    assert encode_action({'action': 'click_element', 'params': {'id': 'llm_elem_7'}}, context) is None
+
+
+def test_decode_fails_when_the_element_is_gone():
+    record = encode_action({'action': 'click_element', 'params': {'id': 'llm_elem_1'}}, page([elem(0, text='A'), elem(1, text='A')]))
+    assert decode_action(record, page([elem(0, text='A')])) is None
+
+
+def test_cache_hit_miss_and_invalidation():
+    cache = DecisionCache()
+    context = page([elem(0, text='Accept')])
+    key = cache.make_key(context, 'Accept the cookies', LLM_CONFIG)
+    assert cache.lookup(key, context) is None
+    cache.store(key, {'action': 'click_element', 'params': {'id': 'llm_elem_0'}}, context)
+    assert cache.lookup(key, page([elem(4, text='Accept')])) == {'action': 'click_element', 'params': {'id': 'llm_elem_4'}}
+    assert key == cache.make_key(page([elem(4, text='Accept')]), '  accept THE cookies', LLM_CONFIG)
+    assert key != cache.make_key(context, 'Accept the cookies', dict(LLM_CONFIG, model='other'))
+    cache.invalidate(key)
+    assert cache.lookup(key, context) is None
+    assert cache.snapshot()['hits'] == 1 and cache.snapshot()['invalidations'] == 1
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(decision_cache.time, 'time', lambda: now[0])
+    cache = DecisionCache(ttl_seconds=60)
+    context = page([elem(0, text='Accept')])
+    cache.store('key', {'action': 'click_element', 'params': {'id': 'llm_elem_0'}}, context)
+    now[0] += 59
+    assert cache.lookup('key', context)
+    now[0] += 2
+    assert cache.lookup('key', context) is None
+    assert cache.snapshot()['expired'] == 1 and cache.snapshot()['size'] == 0
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryBackend(3)
+    return SQLiteBackend(str(tmp_path / 'cache.db'), 3, table='test_entries')
+
+
+def test_lru_eviction(backend, monkeypatch):
+    clock = iter(range(100, 200))
+    monkeypatch.setattr(decision_cache.time, 'time', lambda: next(clock))
+    evicted = [backend.put(key, {'key': key}, created_at) for key, created_at in zip('abc', (1, 2, 3))]
+    assert evicted == [0, 0, 0]
+    assert backend.get('a') == ({'key': 'a'}, 1) # Now the most recently used
+    assert backend.put('d', {'key': 'd'}, 4) == 1
+    assert backend.get('b') is None
+    assert [backend.get(key) is not None for key in 'acd'] == [True, True, True]
+    backend.delete('a')
+    assert len(backend) == 2
+
+
+def test_sqlite_cache_survives_restarts(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    context = page([elem(0, text='Accept')])
+    DecisionCache(sqlite_path=path).store('key', {'action': 'click_element', 'params': {'id': 'llm_elem_0'}}, context)
+    assert DecisionCache(sqlite_path=path).lookup('key', context) == {'action': 'click_element', 'params': {'id': 'llm_elem_0'}}
@@ -0,0 +1,76 @@
+"""FastPathPolicy.decide: when a consent or skip-ad click is certain enough to skip the LLM."""
+from decision_cache import element_signature
+from fast_path import FastPathPolicy
+
+COOKIE_TEXT = 'We use cookies to improve your experience.'
+
+
+def button(index, text, consent=False, skip_ad=False, visible=True, tag='button', **extra):
+    return dict({'id': f'llm_elem_{index}', 'tag': tag, 'text': text, 'is_visible_in_viewport': visible,
+                 'is_cookie_consent_button': consent, 'is_skip_ad_button': skip_ad}, **extra)
+
+
+def page(elements, text=COOKIE_TEXT, url='https://news.test/article'):
+    return {'current_url': url, 'text_content': text, 'interactive_elements': elements}
+
+
+def decide(context, task='Read the top story', policy=None, **kwargs):
+    return (policy or FastPathPolicy()).decide(context, task, **kwargs)
+
+
+def clicked(result):
+    return result[0]['params']['id'] if result else None
+
+
+def test_clicks_an_exact_consent_label():
+    result = decide(page([button(0, 'Manage options', consent=True), button(1, 'Accept all', consent=True)]))
+    assert result[0] == {'action': 'click_element', 'params': {'id': 'llm_elem_1'}}
+    assert 'cookie consent' in result[1]
+
+
+def test_leaves_uncertain_consent_to_the_llm():
+    assert decide(page([button(0, 'I accept these terms', consent=True)])) is None # 0.8 is below 0.85
+    assert decide(page([button(0, 'Accept all', consent=True)], text='Welcome')) is None # No cookie wording
+    assert decide(page([button(0, 'Accept all', consent=True, tag='a')])) is None # A link, usually the policy
+    assert decide(page([button(0, 'Accept all', consent=True, visible=False)])) is None
+
+
+def test_never_clicks_negative_labels():
+    assert decide(page([button(0, 'Reject all', consent=True), button(1, 'Cookie settings', consent=True)])) is None
+
+
+def test_consent_tasks_are_left_to_the_llm():
+    assert decide(page([button(0, 'Accept all', consent=True)]), task='Decline the cookie banner') is None
+
+
+def test_ambiguous_candidates_are_left_to_the_llm():
+    context = page([button(0, 'Accept all', consent=True), button(1, 'I agree', consent=True)])
+    assert decide(context) is None
+    # The same label twice is not ambiguous
+    assert clicked(decide(page([button(0, 'Accept all', consent=True), button(1, 'Accept all', consent=True)]))) == 'llm_elem_0'
+
+
+def test_keyword_noise_does_not_block_a_skip_ad_button():
+    context = page([button(0, 'Book', consent=True), button(1, 'Skip Ad', skip_ad=True)], text='Video')
+    result = decide(context, task='Play a video')
+    assert clicked(result) == 'llm_elem_1' and 'skip-ad' in result[1]
+
+
+def test_skip_ad_by_html_id_and_countdown_labels():
+    assert clicked(decide(page([button(0, '', skip_ad=True, original_html_id='ytp-ad-skip-button')]))) == 'llm_elem_0'
+    assert decide(page([button(0, 'Ad in 5', skip_ad=True)])) is None
+
+
+def test_already_clicked_buttons_are_not_clicked_again():
+    accept = button(0, 'Accept all', consent=True)
+    assert decide(page([accept]), clicked_signatures={element_signature(accept)}) is None
+
+
+def test_site_rules():
+    context = page([button(0, 'Okay', consent=True)], url='https://www.shop.test/')
+    assert decide(context) is None
+    assert clicked(decide(context, policy=FastPathPolicy(site_rules={'shop.test': {'consent_labels': ['okay']}}))) == 'llm_elem_0'
+    accept = page([button(0, 'Accept all', consent=True)], url='https://m.shop.test/')
+    assert decide(accept, policy=FastPathPolicy(site_rules={'shop.test': {'enabled': False}})) is None
+    assert clicked(decide(page([button(0, 'I accept these terms', consent=True)]),
+                          policy=FastPathPolicy(site_rules={'news.test': {'confidence_threshold': 0.75}}))) == 'llm_elem_0'
@@ -0,0 +1,126 @@
+"""LLMClient retries, backoff, timeouts and limits against MockLLMServer's injected faults."""
+import threading
+import time
+
+import pytest
+import requests
+
+from llm_client import LLMClient, TokenBucket
+from mock_servers import MockLLMServer
+
+PAYLOAD = {'contents': [{'role': 'user', 'parts': [{'text': 'Your task is: "test"'}]}]}
+
+
+@pytest.fixture
+def server():
+    with MockLLMServer() as server:
+        yield server
+
+
+def gemini_url(server):
+    return f"{server.url}/v1beta/models/mock:generateContent?key=secret-key"
+
+
+def post(client, server):
+    return client.post_json('gemini', gemini_url(server), {'Content-Type': 'application/json'}, PAYLOAD)
+
+
+def test_retries_429_and_5xx_then_succeeds(server):
+    server.inject([429, 503, 500])
+    client = LLMClient(max_retries=3, backoff_base=0.01)
+    response = post(client, server)
+    assert response.status_code == 200
+    assert response.attempts == 4
+    assert client.snapshot()['gemini'] == {'requests': 4, 'retries': 3, 'failures': 0, 'throttled_seconds': 0.0}
+
+
+def test_gives_up_after_max_retries(server):
+    server.inject([503] * 5)
+    client = LLMClient(max_retries=2, backoff_base=0.01)
+    with pytest.raises(requests.exceptions.HTTPError) as error:
+        post(client, server)
+    assert error.value.response.status_code == 503
+    assert server.stats['requests'] == 3
+    assert client.snapshot()['gemini']['failures'] == 1
+
+
+def test_does_not_retry_other_4xx(server):
+    server.inject([400, 400])
+    client = LLMClient(max_retries=3, backoff_base=0.01)
+    with pytest.raises(requests.exceptions.HTTPError) as error:
+        post(client, server)
+    assert error.value.response.status_code == 400
+    assert server.stats['requests'] == 1
+
+
+def test_error_messages_leave_out_the_api_key(server):
+    server.inject([400])
+    with pytest.raises(requests.exceptions.HTTPError) as error:
+        post(LLMClient(max_retries=0), server)
+    assert 'secret-key' not in str(error.value)
+
+
+@pytest.mark.parametrize('url', ['generativelanguage.googleapis.com/v1beta/models/mock?key=secret-key',
+                                 'https://[bad/v1beta/models/mock?key=secret-key'])
+def test_invalid_url_errors_leave_out_the_api_key(url):
+    client = LLMClient(max_retries=3, backoff_base=0.01)
+    with pytest.raises(requests.exceptions.RequestException) as error:
+        client.post_json('gemini', url, {}, PAYLOAD)
+    assert 'secret-key' not in str(error.value)
+    assert client.snapshot()['gemini'] == {'requests': 1, 'retries': 0, 'failures': 1, 'throttled_seconds': 0.0}
+
+
+def test_honors_retry_after(server):
+    server.inject([429], retry_after=0.3)
+    client = LLMClient(max_retries=1, backoff_base=10)
+    start = time.monotonic()
+    post(client, server)
+    # Retry-After wins over the (much longer) exponential backoff
+    assert 0.3 <= time.monotonic() - start < 2
+
+
+def test_retry_after_is_capped_by_backoff_max(server):
+    server.inject([503], retry_after=60)
+    client = LLMClient(max_retries=1, backoff_max=0.1)
+    start = time.monotonic()
+    post(client, server)
+    assert time.monotonic() - start < 2
+
+
+def test_read_timeout_is_retried_then_raised(server):
+    server.inject(delay=1.0)
+    client = LLMClient(read_timeout=0.2, max_retries=1, backoff_base=0.01)
+    start = time.monotonic()
+    with pytest.raises(requests.exceptions.Timeout):
+        post(client, server)
+    assert time.monotonic() - start < 1.5
+    assert client.snapshot()['gemini']['retries'] == 1
+
+
+def test_concurrency_limit(server):
+    server.inject(delay=0.2)
+    client = LLMClient(provider_limits={'gemini': {'max_concurrency': 2}})
+    threads = [threading.Thread(target=post, args=(client, server)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert server.stats['requests'] == 6
+    assert server.stats['max_active'] == 2
+
+
+def test_rate_limit_throttles_beyond_the_burst(server):
+    client = LLMClient(provider_limits={'gemini': {'requests_per_second': 10, 'burst': 2}})
+    start = time.monotonic()
+    for _ in range(4):
+        post(client, server)
+    # Two requests fit the burst; the other two wait for a token each
+    assert time.monotonic() - start >= 0.15
+    assert client.snapshot()['gemini']['throttled_seconds'] > 0
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=20, capacity=3)
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    waited = bucket.acquire()
+    assert 0 < waited <= 0.1
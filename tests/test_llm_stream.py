@@ -0,0 +1,132 @@
+"""JsonStreamParser over arbitrary chunk boundaries, SSE decoding and early dispatch of streamed actions."""
+import json
+import random
+import types
+
+import pytest
+
+from agent import AIAgent
+from llm_stream import JsonStreamParser, iter_sse_data, stream_text
+
+DOCUMENTS = [
+    {'action': 'click_element', 'params': {'id': 'llm_elem_3'}},
+    {'action': 'type_text', 'params': {'id': 'llm_elem_1', 'text': 'say "hi" \\ {not: json}, [ok]'}},
+    {'action': 'task_complete', 'params': {'message': 'Done ✓ – naïve café'}, 'reasoning': None},
+    {'plan': [{'action': 'click_element', 'params': {'target': 'Accept'}, 'expect': {'url_contains': '/a'}},
+              {'action': 'navigate_to', 'params': {'url': 'https://x.test/?q=a,b'}}], 'reasoning': ''},
+    {'n': -12.5e3, 'flags': [True, False, None], 'nested': {'empty': {}, 'list': [[], [1, [2, {'k': 3}]]]}},
+]
+
+
+def all_values(value, path=()):
+    """Every (path, value) the parser should record for a parsed document."""
+    yield path, value
+    items = value.items() if isinstance(value, dict) else enumerate(value) if isinstance(value, list) else ()
+    for key, child in items:
+        yield from all_values(child, path + (key,))
+
+
+def split_randomly(text, rng):
+    cuts = sorted(rng.sample(range(1, len(text)), min(len(text) - 1, rng.randint(0, 12))))
+    return [text[start:end] for start, end in zip([0] + cuts, cuts + [len(text)])]
+
+
+@pytest.mark.parametrize('document', DOCUMENTS)
+@pytest.mark.parametrize('indent', [None, 2])
+def test_any_chunking_parses_every_value(document, indent):
+    text = 'Sure, here is the JSON: ' + json.dumps(document, indent=indent, ensure_ascii=False) + '\ntrailing text'
+    rng = random.Random(f"{text}")
+    for _ in range(200):
+        parser = JsonStreamParser()
+        for piece in split_randomly(text, rng):
+            parser.feed(piece)
+        assert parser.complete
+        assert parser.values == dict(all_values(document))
+
+
+def test_one_character_at_a_time():
+    document = DOCUMENTS[1]
+    parser = JsonStreamParser()
+    for char in json.dumps(document):
+        parser.feed(char)
+    assert parser.get() == document
+    assert parser.get('params', 'text') == document['params']['text']
+
+
+def test_values_are_recorded_once_complete():
+    parser = JsonStreamParser()
+    parser.feed('{"action": "click_el')
+    assert not parser.has('action')
+    parser.feed('ement", "params": {"id": "llm_elem_7"')
+    assert parser.get('action') == 'click_element'
+    assert parser.get('params', 'id') == 'llm_elem_7'
+    assert not parser.has('params')
+    parser.feed(', "x": 12')
+    assert not parser.has('params', 'x') # A number may continue in the next piece
+    parser.feed('3}')
+    assert parser.get('params', 'x') == 123
+    assert not parser.complete
+
+
+def test_malformed_json_raises():
+    parser = JsonStreamParser()
+    with pytest.raises(json.JSONDecodeError):
+        parser.feed('{"action": tru}')
+
+
+def test_iter_sse_data():
+    lines = [': comment', 'event: message', 'data: {"a":', 'data: 1}', '', '', 'data:[DONE]']
+    assert list(iter_sse_data(lines)) == ['{"a":\n1}', '[DONE]']
+
+
+class FakeStream:
+    def __init__(self, lines):
+        self.lines = lines
+
+    def iter_lines(self, chunk_size=None, decode_unicode=False):
+        return iter(self.lines)
+
+
+@pytest.mark.parametrize('provider, events', [
+    ('gemini', [{'candidates': [{'content': {'parts': [{'text': piece}]}}]} for piece in ('{"ac', 'tion": 1}', '')]),
+    ('openai', [{'choices': [{'delta': {'content': piece}}]} for piece in ('{"ac', 'tion": 1}')] + [{'choices': [{'delta': {}}]}]),
+])
+def test_stream_text(provider, events):
+    lines = [line for event in events for line in (f"data: {json.dumps(event)}", '')] + ['data: [DONE]', '']
+    assert ''.join(stream_text(provider, FakeStream(lines))) == '{"action": 1}'
+
+
+def streamed_action(text, plan_mode=False):
+    """:return: (action dispatched early, characters fed before it was ready)."""
+    agent = types.SimpleNamespace(plan_mode=plan_mode)
+    parser = JsonStreamParser()
+    for fed, char in enumerate(text, 1):
+        parser.feed(char)
+        action = AIAgent._streamed_action(agent, parser)
+        if action:
+            return action, fed
+    return None, len(text)
+
+
+def test_dispatches_once_required_params_are_complete():
+    text = '{"action": "type_text", "params": {"id": "llm_elem_2", "text": "cats"}, "reasoning": "a long explanation"}'
+    action, fed = streamed_action(text)
+    assert action == {'action': 'type_text', 'params': {'id': 'llm_elem_2', 'text': 'cats'}}
+    assert fed == text.index('"text": "cats"') + len('"text": "cats"')
+
+
+def test_waits_for_missing_required_params():
+    text = '{"action": "type_text", "params": {"id": "llm_elem_2"'
+    assert streamed_action(text) == (None, len(text))
+
+
+def test_complete_params_dispatch_any_action():
+    text = '{"action": "scroll", "params": {"y": 1}, "reasoning": "..."}'
+    assert streamed_action(text) == ({'action': 'scroll', 'params': {'y': 1}}, text.index('}') + 1)
+
+
+def test_unknown_actions_and_plans_wait_for_the_whole_object():
+    text = '{"action": "scroll", "y": 1}'
+    assert streamed_action(text) == ({'action': 'scroll', 'y': 1}, len(text))
+    plan = '{"action": "click_element", "params": {"id": "a"}, "plan": []}'
+    assert streamed_action(plan, plan_mode=True)[1] == len(plan)
@@ -0,0 +1,65 @@
+"""Ranking and budgeting of page context elements."""
+from prompt_budget import compact_element, compact_page_context, estimate_tokens, task_terms, to_json
+
+
+def element(index, tag='a', text=None, visible=False, **extra):
+    return dict({'id': f'llm_elem_{index}', 'tag': tag, 'text': text, 'is_visible_in_viewport': visible}, **extra)
+
+
+def page(elements, text='Some page text'):
+    return {'current_url': 'https://x.test/', 'text_content': text, 'interactive_elements': elements}
+
+
+def test_task_terms_drop_stopwords_and_short_words():
+    assert task_terms('Click on the Search box and type "lofi beats" in it') == {'search', 'box', 'type', 'lofi', 'beats'}
+
+
+def test_compact_element_drops_redundant_keys():
+    elem = element(1, 'input', None, visible=True, placeholder='Search', aria_label='Search', name='q', type='text',
+                   is_cookie_consent_button=False, rect={'x': 1})
+    assert compact_element(elem) == {'id': 'llm_elem_1', 'tag': 'input', 'name': 'q', 'type': 'text', 'placeholder': 'Search',
+                                     'is_visible_in_viewport': True}
+    long_text = compact_element(element(2, text='x' * 200))['text']
+    assert long_text == 'x' * 80 + '...'
+
+
+def test_keeps_everything_within_budget_in_document_order():
+    elements = [element(i, text=f'Link {i}', visible=i % 2 == 0) for i in range(10)]
+    compact, stats = compact_page_context(page(elements), 'open a link')
+    assert [entry['id'] for entry in compact['interactive_elements']] == [elem['id'] for elem in elements]
+    assert stats == {'elements_total': 10, 'elements_kept': 10}
+    assert compact['current_url'] == 'https://x.test/' and compact['text_content'] == 'Some page text'
+
+
+def test_budget_keeps_the_most_relevant_elements():
+    filler = [element(i, text=f'Unrelated footer link number {i}') for i in range(200)]
+    target = element(500, 'button', 'Accept all cookies', visible=True, is_cookie_consent_button=True)
+    search = element(501, 'input', None, placeholder='Search videos')
+    compact, stats = compact_page_context(page(filler + [target, search]), 'Search for cat videos', max_tokens=400)
+    ids = [entry['id'] for entry in compact['interactive_elements']]
+    assert ids[-2:] == ['llm_elem_500', 'llm_elem_501'] # Kept, and still in document order
+    assert stats['elements_kept'] < stats['elements_total']
+    assert estimate_tokens(to_json(compact)) <= 400
+
+
+def test_max_elements_and_reserved_tokens():
+    elements = [element(i, text=f'Link {i}') for i in range(50)]
+    assert compact_page_context(page(elements), 'x', max_elements=5)[1]['elements_kept'] == 5
+    full = compact_page_context(page(elements), 'x')[1]['elements_kept']
+    reserved = compact_page_context(page(elements), 'x', max_tokens=600, reserved_tokens=300)[1]['elements_kept']
+    assert reserved < full
+
+
+def test_preferred_ids_are_kept_first():
+    elements = [element(i, text=f'Relevant search result {i}', visible=True) for i in range(100)]
+    elements.append(element(100, text='Far away link'))
+    compact, _ = compact_page_context(page(elements), 'search result', max_tokens=200, preferred_ids=['llm_elem_100'])
+    assert 'llm_elem_100' in [entry['id'] for entry in compact['interactive_elements']]
+    compact, _ = compact_page_context(page(elements), 'search result', max_tokens=200)
+    assert 'llm_elem_100' not in [entry['id'] for entry in compact['interactive_elements']]
+
+
+def test_empty_page():
+    compact, stats = compact_page_context({'current_url': None}, 'anything')
+    assert compact == {'current_url': None, 'text_content': '', 'interactive_elements': []}
+    assert stats == {'elements_total': 0, 'elements_kept': 0}
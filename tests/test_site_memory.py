@@ -0,0 +1,122 @@
+"""Task templates and slot extraction, step templating, and trajectory bookkeeping of SiteMemory."""
+import pytest
+
+from site_memory import SLOT, SiteMemory, fill_step, match_template, site_of, task_template, templatize_step
+
+START = 'https://www.video.test/'
+
+
+def step(url, action, **params):
+    return {'url': url, 'record': {'action': action, 'params': params}}
+
+
+def search_steps(query, encoded):
+    return [
+        step(START, 'type_text', text=query, element={'signature': 'input|||||search|', 'occurrence': 0}),
+        step(f'https://www.video.test/results?search_query={encoded}', 'click_element',
+             element={'signature': 'a||||||first video', 'occurrence': 0}),
+        step('https://www.video.test/watch', 'task_complete'),
+    ]
+
+
+def test_site_of():
+    assert site_of('https://WWW.Video.test:8080/x') == 'video.test'
+    assert site_of('https://m.video.test/') == 'm.video.test'
+    assert site_of(None) == ''
+
+
+@pytest.mark.parametrize('task, typed, template, value', [
+    ('Search for  Cats and play the first video', ['Cats'], 'search for {query} and play the first video', 'Cats'),
+    ('Play red pandas videos', ['ignored', 'Red  Pandas'], 'play {query} videos', 'Red Pandas'),
+    ('Open the cart', ['cart x'], 'open the cart', None),
+    ('Find a cat', ['a'], 'find a cat', None), # One-letter values are too likely to match by chance
+    ('Search for cats', ['cat'], 'search for cats', None), # Only whole words
+])
+def test_task_template(task, typed, template, value):
+    assert task_template(task, typed) == (template, value)
+
+
+@pytest.mark.parametrize('task, value', [
+    ('Search for dogs and play the first video', 'dogs'),
+    ('search  for Lofi Beats and play the FIRST video', 'Lofi Beats'),
+    ('Search for dogs and play the last video', None),
+    ('Search for  and play the first video', None),
+])
+def test_match_template_extracts_the_slot(task, value):
+    assert match_template('search for {query} and play the first video', task) == value
+
+
+def test_match_template_without_slot():
+    assert match_template('open the cart', ' Open the  CART ') == ''
+    assert match_template('open the cart', 'Open the basket') is None
+
+
+def test_templatize_and_fill_round_trip():
+    steps = search_steps('Red pandas', 'Red+pandas')
+    templated = [templatize_step(s, 'Red pandas') for s in steps]
+    assert templated[0]['record']['params']['text'] == SLOT
+    assert templated[1]['url'] == f'https://www.video.test/results?search_query={SLOT}'
+    filled = [fill_step(s, 'C++ & more') for s in templated]
+    assert filled[0]['record']['params']['text'] == 'C++ & more'
+    assert filled[1]['url'] == 'https://www.video.test/results?search_query=C%2B%2B+%26+more'
+    assert [fill_step(s, 'Red pandas') for s in templated] == steps
+
+
+def test_path_segments_use_percent_encoding():
+    templated = templatize_step(step('https://wiki.test/wiki/red%20pandas', 'task_complete'), 'red pandas')
+    assert templated['url'] == f'https://wiki.test/wiki/{SLOT}'
+    assert fill_step(templated, 'big cats')['url'] == 'https://wiki.test/wiki/big%20cats'
+
+
+def test_remembered_route_for_a_similar_task():
+    memory = SiteMemory()
+    memory.record(START, 'Search for cats and play the first video', search_steps('cats', 'cats'))
+    route = memory.find(START, 'Search for big dogs and play the first video')
+    assert route['value'] == 'big dogs'
+    assert route['jump'] == 1 and route['jump_url'] == 'https://www.video.test/results?search_query=big+dogs'
+    assert route['replayable'] == 2
+    assert memory.find(START, 'Upload a video') is None
+    assert memory.find('https://www.video.test/settings', 'Search for dogs and play the first video') is None
+    assert memory.snapshot()['hit_rate'] == round(1 / 3, 3)
+
+
+def test_alternative_trajectories_are_kept_and_ranked_by_successes():
+    memory = SiteMemory()
+    task = 'Search for cats and play the first video'
+    for _ in range(3):
+        memory.record(START, task, search_steps('cats', 'cats'))
+    shortcut = search_steps('cats', 'cats')[:1] + [step('https://www.video.test/results?search_query=cats', 'task_complete')]
+    memory.record(START, task, shortcut)
+    assert len(memory.find(START, task)['steps']) == 3 # The better proven route
+    route = memory.find(START, task)
+    memory.fail(route)
+    assert len(memory.find(START, task)['steps']) == 3 # One failure is tolerated
+    memory.fail(route)
+    assert len(memory.find(START, task)['steps']) == 2 # Dropped after max_failures; the other one remains
+    assert memory.snapshot()['invalidations'] == 1
+
+
+def test_min_successes_and_ttl(monkeypatch):
+    import site_memory
+    now = [1000.0]
+    monkeypatch.setattr(site_memory.time, 'time', lambda: now[0])
+    memory = SiteMemory(min_successes=2, ttl_seconds=100)
+    task = 'Search for cats and play the first video'
+    memory.record(START, task, search_steps('cats', 'cats'))
+    assert memory.find(START, task) is None
+    memory.record(START, task, search_steps('cats', 'cats'))
+    assert memory.find(START, task)
+    now[0] += 101
+    assert memory.find(START, task) is None
+    assert memory.snapshot()['expired'] == 1
+
+
+def test_hints_name_elements_on_the_current_page():
+    memory = SiteMemory()
+    memory.record(START, 'Search for cats and play the first video', search_steps('cats', 'cats'))
+    context = {'current_url': 'https://www.video.test/results?search_query=owls', 'interactive_elements': [
+        {'id': 'llm_elem_0', 'tag': 'input', 'placeholder': 'Search'},
+        {'id': 'llm_elem_1', 'tag': 'a', 'text': 'First video'},
+    ]}
+    assert memory.hints(context) == [('llm_elem_1', 'click_element')]
+    assert memory.hints(dict(context, current_url='https://other.test/results?search_query=owls')) == []
@@ -0,0 +1,270 @@
+"""
+Hierarchical timing spans for agent runs.
+
+run_task opens a root span and every stage inside it (page load, settle waits, page context,
+LLM calls, actions) opens a child span carrying attributes such as element counts, prompt size,
+provider, HTTP status and retries. Finished traces are handed to exporters (JSON lines, or
+OTLP/JSON that OpenTelemetry collectors read), and every span's duration feeds a per-stage latency
+summary with p50/p95, served by the Flask app on /metrics.
+"""
+import collections
+import contextvars
+import json
+import math
+import secrets
+import threading
+import time
+
+STATUS_UNSET = 'unset'
+STATUS_OK = 'ok'
+STATUS_ERROR = 'error'
+
+_OTLP_STATUS_CODES = {STATUS_UNSET: 0, STATUS_OK: 1, STATUS_ERROR: 2}
+
+
+class Span:
+    def __init__(self, tracer, name, parent, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.parent = parent
+        self.root = parent.root if parent else self
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.attributes = dict(attributes)
+        self.status = STATUS_UNSET
+        self.status_message = None
+        self.start_time_ns = time.time_ns()
+        self.end_time_ns = None
+        self.seconds = None
+        self._start = time.perf_counter()
+        self.finished_spans = [] # Finished spans of the whole trace, kept on the root only
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes):
+        self.attributes.update(attributes)
+
+    def set_status(self, status, message=None):
+        self.status = status
+        self.status_message = message
+
+    def end(self):
+        """Ends the span. Ending it again has no effect."""
+        if self.end_time_ns is not None:
+            return
+        self.seconds = time.perf_counter() - self._start
+        self.end_time_ns = self.start_time_ns + int(self.seconds * 1e9)
+        self.tracer._finish(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None and self.status == STATUS_UNSET:
+            self.set_status(STATUS_ERROR, f"{exc_type.__name__}: {exc}")
+        self.end()
+        return False
+
+    def stage_totals(self):
+        """
+        Time spent per span name in this trace, for a root span that has ended.
+        :return: {name: {'count': n, 'seconds': total}} ordered by total time, longest first.
+        """
+        totals = {}
+        for span in self.finished_spans:
+            if span is self:
+                continue
+            entry = totals.setdefault(span.name, {'count': 0, 'seconds': 0.0})
+            entry['count'] += 1
+            entry['seconds'] += span.seconds
+        return dict(sorted(totals.items(), key=lambda item: -item[1]['seconds']))
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_span_id': self.parent.span_id if self.parent else None,
+            'name': self.name,
+            'start_time_ns': self.start_time_ns,
+            'end_time_ns': self.end_time_ns,
+            'duration_ms': round(self.seconds * 1000, 3) if self.seconds is not None else None,
+            'status': self.status,
+            'status_message': self.status_message,
+            'attributes': self.attributes
+        }
+
+    def to_otlp(self):
+        """The span in OTLP/JSON encoding."""
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': 1, # SPAN_KIND_INTERNAL
+            'startTimeUnixNano': str(self.start_time_ns),
+            'endTimeUnixNano': str(self.end_time_ns),
+            'attributes': [{'key': key, 'value': _otlp_value(value)} for key, value in self.attributes.items()],
+            'status': {'code': _OTLP_STATUS_CODES[self.status]}
+        }
+        if self.parent:
+            span['parentSpanId'] = self.parent.span_id
+        if self.status_message:
+            span['status']['message'] = self.status_message
+        return span
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+class LatencyMetrics:
+    def __init__(self, window=1024):
+        """
+        :param window: Recent samples per stage used for the quantiles; counts and sums cover every sample.
+        """
+        self.window = window
+        self._samples = {}
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = collections.deque(maxlen=self.window)
+                self._totals[stage] = [0, 0.0]
+            samples.append(seconds)
+            self._totals[stage][0] += 1
+            self._totals[stage][1] += seconds
+
+    def snapshot(self):
+        """:return: {stage: {'count', 'sum', 'p50', 'p95', 'max'}} with durations in seconds."""
+        with self._lock:
+            copies = {stage: (sorted(samples), list(self._totals[stage])) for stage, samples in self._samples.items()}
+        stats = {}
+        for stage, (ordered, (count, total)) in sorted(copies.items()):
+            stats[stage] = {
+                'count': count,
+                'sum': round(total, 6),
+                'p50': round(_quantile(ordered, 0.5), 6),
+                'p95': round(_quantile(ordered, 0.95), 6),
+                'max': round(ordered[-1], 6)
+            }
+        return stats
+
+    def to_prometheus(self, metric='agent_stage_seconds'):
+        """The snapshot in Prometheus text exposition format, as a summary per stage."""
+        lines = [
+            f"# HELP {metric} Duration of agent stages in seconds (quantiles over the last {self.window} samples).",
+            f"# TYPE {metric} summary"
+        ]
+        for stage, stats in self.snapshot().items():
+            label = stage.replace('\\', '\\\\').replace('"', '\\"')
+            lines.append(f'{metric}{{stage="{label}",quantile="0.5"}} {stats["p50"]}')
+            lines.append(f'{metric}{{stage="{label}",quantile="0.95"}} {stats["p95"]}')
+            lines.append(f'{metric}_sum{{stage="{label}"}} {stats["sum"]}')
+            lines.append(f'{metric}_count{{stage="{label}"}} {stats["count"]}')
+        return '\n'.join(lines) + '\n'
+
+
+def _quantile(ordered, q):
+    """Nearest-rank quantile of a sorted list."""
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+class JsonLinesExporter:
+    def __init__(self, path, format='jsonl', service_name='ai-agent'):
+        """
+        Appends every finished trace to a file.
+        :param path: File to append to.
+        :param format: 'jsonl' writes one span per line (Span.to_dict); 'otlp' writes one OTLP/JSON
+                       ExportTraceServiceRequest per trace, as the OpenTelemetry collector file receiver reads.
+        :param service_name: 'service.name' resource attribute in the OTLP format.
+        """
+        if format not in ('jsonl', 'otlp'):
+            raise ValueError(f"Unsupported trace format: {format}")
+        self.path = path
+        self.format = format
+        self.service_name = service_name
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        if self.format == 'otlp':
+            request = {'resourceSpans': [{
+                'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': self.service_name}}]},
+                'scopeSpans': [{'scope': {'name': 'ai_agent'}, 'spans': [span.to_otlp() for span in spans]}]
+            }]}
+            lines = [json.dumps(request, separators=(',', ':'))]
+        else:
+            lines = [json.dumps(span.to_dict(), separators=(',', ':'), default=str) for span in spans]
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+
+
+class Tracer:
+    def __init__(self, exporters=None, metrics=None):
+        """
+        :param exporters: Objects with an export(spans) method, called with all spans of a trace once its root ends.
+        :param metrics: LatencyMetrics receiving the duration of every span by name. Defaults to a new one.
+        """
+        self.exporters = list(exporters or [])
+        self.metrics = metrics if metrics is not None else LatencyMetrics()
+        # Open spans per thread, and per asyncio task so agents sharing an event loop keep separate traces
+        self._stack = contextvars.ContextVar(f'tracer_stack_{id(self)}', default=())
+
+    def current_span(self):
+        stack = self._stack.get()
+        return stack[-1] if stack else None
+
+    def start_span(self, name, **attributes):
+        """
+        Starts a span as a child of the current span of this thread (or asyncio task) and makes it current
+        until it ends. Also usable as a context manager, which ends it and marks it as failed on an exception.
+        """
+        span = Span(self, name, self.current_span(), attributes)
+        self._stack.set(self._stack.get() + (span,))
+        return span
+
+    def _finish(self, span):
+        stack = self._stack.get()
+        if span in stack:
+            # Children left open (e.g. by an early return) end with their parent
+            while stack[-1] is not span:
+                stack[-1].end()
+                stack = self._stack.get()
+            self._stack.set(stack[:-1])
+        self.metrics.observe(span.name, span.seconds)
+        span.root.finished_spans.append(span)
+        if span is span.root:
+            for exporter in self.exporters:
+                try:
+                    exporter.export(span.finished_spans)
+                except Exception as e:
+                    print(f"Trace export failed: {e}")
+
+
+_default_tracer = None
+_default_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    """Returns the process-wide Tracer, creating one without exporters on first use."""
+    global _default_tracer
+    with _default_tracer_lock:
+        if _default_tracer is None:
+            _default_tracer = Tracer()
+        return _default_tracer
+
+
+def set_tracer(tracer):
+    """Replaces the process-wide Tracer, e.g. to add exporters at application start."""
+    global _default_tracer
+    with _default_tracer_lock:
+        _default_tracer = tracer